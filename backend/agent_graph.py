@@ -2,25 +2,54 @@
 LangGraph workflow definition for the shopping agent.
 Builds and compiles the state graph that orchestrates agent behavior.
 """
-from typing import Literal
+from typing import List, Literal, Union
 from langgraph.graph import StateGraph, END
 import structlog
 
 from agent_state import AgentState, should_stop, is_complete
-from agent_nodes import observer_node, reasoning_node, action_node
+from agent_nodes import (
+    observe_start_node,
+    get_url_node,
+    inject_markers_node,
+    screenshot_node,
+    reasoning_node,
+    action_node
+)
 
 logger = structlog.get_logger()
 
+# Compiled graph, built once per process (it holds no per-session state)
+_compiled_graph = None
+
 
 def create_agent_graph() -> StateGraph:
+    """
+    Get the compiled agent workflow graph, building it on first use
+    
+    Returns:
+        Compiled StateGraph ready for execution (shared, safe to reuse
+        across sessions since state is passed per run)
+    """
+    global _compiled_graph
+    
+    if _compiled_graph is None:
+        _compiled_graph = _build_agent_graph()
+    
+    return _compiled_graph
+
+
+def _build_agent_graph() -> StateGraph:
     """
     Build the agent workflow graph
     
     The graph follows this flow:
-    1. START -> observer (capture page state)
-    2. observer -> reasoning (analyze and decide)
-    3. reasoning -> action (execute decision)
-    4. action -> observer (loop) OR END (complete/error)
+    1. START -> observer (mark observation start, check observation cache)
+    2. observer -> get_url + inject_markers (run in parallel)
+       or observer -> reasoning (page unchanged since a cached observation)
+    3. get_url + inject_markers -> screenshot (join, capture page state)
+    4. screenshot -> reasoning (analyze and decide)
+    5. reasoning -> action (execute decision)
+    6. action -> observer (loop) OR END (complete/error)
     
     Returns:
         Compiled StateGraph ready for execution
@@ -31,15 +60,29 @@ def create_agent_graph() -> StateGraph:
     workflow = StateGraph(AgentState)
     
     # Add nodes
-    workflow.add_node("observer", observer_node)
+    workflow.add_node("observer", observe_start_node)
+    workflow.add_node("get_url", get_url_node)
+    workflow.add_node("inject_markers", inject_markers_node)
+    workflow.add_node("screenshot", screenshot_node)
     workflow.add_node("reasoning", reasoning_node)
     workflow.add_node("action", action_node)
     
     # Set entry point
     workflow.set_entry_point("observer")
     
+    # Fan out: URL fetch and marker injection are independent.
+    # An unchanged page reuses the cached observation and skips both.
+    workflow.add_conditional_edges(
+        "observer",
+        route_after_observe,
+        ["get_url", "inject_markers", "reasoning"]
+    )
+    
+    # Fan in: screenshot waits for both branches
+    workflow.add_edge(["get_url", "inject_markers"], "screenshot")
+    
     # Add edges
-    workflow.add_edge("observer", "reasoning")
+    workflow.add_edge("screenshot", "reasoning")
     workflow.add_edge("reasoning", "action")
     
     # Add conditional edge from action
@@ -60,6 +103,22 @@ def create_agent_graph() -> StateGraph:
     return graph
 
 
+def route_after_observe(state: AgentState) -> Union[str, List[str]]:
+    """
+    Determine whether the observation needs to run after the observer entry
+    
+    Args:
+        state: Current agent state
+    
+    Returns:
+        "reasoning" for a cached observation, otherwise both observer branches
+    """
+    if state.observation_cached:
+        return "reasoning"
+    
+    return ["get_url", "inject_markers"]
+
+
 def route_after_action(state: AgentState) -> Literal["continue", "end"]:
     """
     Determine whether to continue or end after an action
@@ -76,11 +135,11 @@ def route_after_action(state: AgentState) -> Literal["continue", "end"]:
         
         if is_complete(state):
             reason = "mission complete"
-        elif state["status"] == "error":
-            reason = f"error: {state.get('error')}"
-        elif state["iterations"] >= state["max_iterations"]:
+        elif state.status == "error":
+            reason = f"error: {state.error}"
+        elif state.iterations >= state.max_iterations:
             reason = "max iterations reached"
-        elif state["approval_required"]:
+        elif state.approval_required:
             reason = "waiting for approval"
         
         logger.info("Ending agent execution", reason=reason)
@@ -88,7 +147,7 @@ def route_after_action(state: AgentState) -> Literal["continue", "end"]:
     
     # Continue to next iteration
     logger.debug("Continuing to next iteration", 
-                iteration=state["iterations"])
+                iteration=state.iterations)
     return "continue"
 
 
@@ -107,16 +166,23 @@ def visualize_graph(graph: StateGraph) -> str:
     
     START
       ↓
-    [observer] ← ─ ─ ─ ─ ─ ─ ┐
-      ↓                      │
-    [reasoning]              │
-      ↓                      │
-    [action] ─ ─ ─ ─ ─ ─ ─ ─ ┘
+    [observer] ← ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ┐
+      ↓              ↓               │
+    [get_url]   [inject_markers]     │
+      ↓              ↓               │
+    [screenshot]                     │
+      ↓                              │
+    [reasoning]                      │
+      ↓                              │
+    [action] ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ┘
       ↓
     END (when complete/error/max iterations)
     
     Nodes:
-    - observer: Captures page state, injects markers, takes screenshot
+    - observer: Marks the start of an observation, reuses it if the page is unchanged
+    - get_url: Fetches the current URL (parallel branch)
+    - inject_markers: Injects numbered markers (parallel branch)
+    - screenshot: Joins the branches and takes the marked screenshot
     - reasoning: Analyzes screenshot with Gemini, decides next action
     - action: Executes the decided action (click/type/scroll)
     
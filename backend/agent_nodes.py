@@ -3,11 +3,14 @@ LangGraph nodes for the shopping agent workflow.
 Each node performs a specific step in the agent's reasoning loop.
 """
 import asyncio
-from typing import Dict, Any
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Tuple, Callable, Awaitable
 from langchain_core.messages import AIMessage
 import structlog
 
 from agent_state import (
+    Action,
     AgentState,
     add_message,
     add_action,
@@ -17,38 +20,78 @@ from agent_state import (
     get_recent_actions
 )
 from browser_controller import BrowserController
-from vision_utils import inject_markers, remove_markers, get_element_by_marker
+from config import Config
+from vision_utils import (
+    inject_markers,
+    get_element_by_marker,
+    get_marker_selector,
+    get_page_signature,
+    wait_for_page_change
+)
 from ai_vision import get_vision_analyzer
-from checkout_guard import check_before_click, extract_order_summary
+from checkout_guard import check_before_click, extract_order_summary, record_checkout_detection
 
 logger = structlog.get_logger()
 
 
-# Global browser instance (managed by agent service)
-_browser: BrowserController = None
+# Browser for the running session (set by the agent service); a ContextVar so
+# concurrent sessions, each in its own task, do not see each other's browser
+_browser_cv: ContextVar[BrowserController] = ContextVar("browser")
+
+
+# Click fallback that bypasses some overlays; the selector is passed as an argument
+JS_CLICK_SCRIPT = "selector => { const element = document.querySelector(selector); if (element) element.click(); return !!element; }"
+
+# Clicks: how long Playwright may wait, and how long the actionability check
+# gets before we stop waiting on it and fall back to the JavaScript click
+CLICK_TIMEOUT = 5000
+CLICK_HEDGE_DELAY = 1.5
+
+# Recent observations keyed by (session_id, page signature), so an unchanged
+# page (e.g. after a failed click) skips marker injection and the screenshot
+OBSERVATION_CACHE_SIZE = 32
+_observation_cache: "OrderedDict[Tuple[str, str], Tuple[bytes, Optional[Tuple[int, int]], Dict[int, Dict[str, Any]]]]" = OrderedDict()
+
+
+def _get_cached_observation(session_id: str, signature: str) -> Any:
+    """Look up a cached (screenshot, screenshot_size, markers_map) tuple"""
+    key = (session_id, signature)
+    cached = _observation_cache.get(key)
+    if cached is not None:
+        _observation_cache.move_to_end(key)
+    return cached
+
+
+def _cache_observation(session_id: str, signature: str, screenshot: bytes,
+                       screenshot_size: Optional[Tuple[int, int]],
+                       markers_map: Dict[int, Dict[str, Any]]) -> None:
+    """Store an observation, evicting the least recently used entry"""
+    _observation_cache[(session_id, signature)] = (screenshot, screenshot_size, markers_map)
+    _observation_cache.move_to_end((session_id, signature))
+    while len(_observation_cache) > OBSERVATION_CACHE_SIZE:
+        _observation_cache.popitem(last=False)
 
 
 def set_browser(browser: BrowserController) -> None:
-    """Set the global browser instance for nodes to use"""
-    global _browser
-    _browser = browser
+    """Set the browser for nodes run by the current task (and tasks it creates)"""
+    _browser_cv.set(browser)
 
 
 def get_browser() -> BrowserController:
-    """Get the global browser instance"""
-    global _browser
-    if _browser is None:
+    """Get the browser for the current task"""
+    browser = _browser_cv.get(None)
+    if browser is None:
         raise RuntimeError("Browser not initialized. Call set_browser() first.")
-    return _browser
+    return browser
 
 
 async def observer_node(state: AgentState) -> AgentState:
     """
     Observer Node: Captures the current state of the page
     
-    - Takes screenshot
-    - Injects visual markers
-    - Updates state with page information
+    Runs the observer sub-steps in a single call for callers that do not
+    go through the graph's fan-out. The URL fetch overlaps with marker
+    removal/injection; the screenshot waits until markers are on the page.
     
     Args:
         state: Current agent state
@@ -56,34 +99,159 @@ async def observer_node(state: AgentState) -> AgentState:
     Returns:
         Updated state with screenshot and markers
     """
-    logger.info("Observer node starting", iteration=state["iterations"])
+    state = await observe_start_node(state)
+    if state.observation_cached:
+        return state
+    
+    url_update, markers_update = await asyncio.gather(
+        get_url_node(state),
+        inject_markers_node(state)
+    )
+    state.update(url_update)
+    state.update(markers_update)
+    
+    return await screenshot_node(state)
+
+
+async def observe_start_node(state: AgentState) -> AgentState:
+    """
+    Observer entry: marks the start of an observation before fan-out
+    
+    If the page signature matches a cached observation for this session,
+    the cached screenshot and markers are reused and observation_cached is
+    set so the graph can skip straight to reasoning.
+    
+    Args:
+        state: Current agent state
+    
+    Returns:
+        Updated state with observing status
+    """
+    logger.debug("Observer node starting", iteration=state.iterations)
+    
+    set_status(state, "observing")
+    state.observation_cached = False
+    state.page_signature = ""
     
     try:
-        set_status(state, "observing")
-        
         browser = get_browser()
-        
-        # Get current URL
+        page_info = await get_page_signature(browser.page)
+        state.page_signature = page_info["signature"]
+        
+        cached = _get_cached_observation(state.session_id, page_info["signature"])
+        if cached is not None:
+            screenshot, screenshot_size, markers_map = cached
+            state.current_url = page_info["url"]
+            state.screenshot_bytes = screenshot
+            state.screenshot_size = screenshot_size
+            state.markers_map = markers_map
+            state.observation_cached = True
+            
+            add_message(state, AIMessage(
+                content=f"Observed page: {page_info['url']} (unchanged). Found {len(markers_map)} interactive elements."
+            ))
+            
+            logger.debug("Observer node complete (cached)",
+                        url=page_info["url"],
+                        markers=len(markers_map))
+            
+    except Exception as e:
+        # Fall back to a full observation; errors surface at the join
+        logger.warning("Page signature failed", error=str(e))
+    
+    return state
+
+
+async def get_url_node(state: AgentState) -> Dict[str, Any]:
+    """
+    Observer branch: fetches the current page URL
+    
+    Runs in parallel with inject_markers_node, so it only returns the
+    keys it owns.
+    
+    Args:
+        state: Current agent state
+    
+    Returns:
+        Partial state update with current_url
+    """
+    try:
+        browser = get_browser()
         current_url = await browser.get_url()
-        state["current_url"] = current_url
         
-        logger.info("Observing page", url=current_url)
+        logger.debug("Observing page", url=current_url)
         
-        # Remove old markers if any
-        try:
-            await remove_markers(browser.page)
-        except:
-            pass
+        return {"current_url": current_url, "url_error": None}
         
-        # Inject markers on interactive elements
-        markers_map = await inject_markers(browser.page)
-        state["markers_map"] = markers_map
+    except Exception as e:
+        # Reported by screenshot_node at the join
+        logger.warning("URL fetch failed", error=str(e))
+        return {"url_error": f"URL fetch failed: {str(e)}"}
+
+
+async def inject_markers_node(state: AgentState) -> Dict[str, Any]:
+    """
+    Observer branch: injects visual markers on interactive elements
+    
+    Runs in parallel with get_url_node, so it only returns the keys it owns.
+    
+    Args:
+        state: Current agent state
+    
+    Returns:
+        Partial state update with markers_map
+    """
+    try:
+        browser = get_browser()
+        
+        # Replace old markers with new ones in a single round-trip
+        markers_map = await inject_markers(browser.page, replace=True)
+        
+        logger.debug("Markers injected", count=len(markers_map))
         
-        logger.info("Markers injected", count=len(markers_map))
+        return {"markers_map": markers_map, "markers_error": None}
+        
+    except Exception as e:
+        # Reported by screenshot_node at the join
+        logger.warning("Marker injection failed", error=str(e))
+        return {"markers_error": f"Marker injection failed: {str(e)}"}
+
+
+async def screenshot_node(state: AgentState) -> AgentState:
+    """
+    Observer join: takes the screenshot once markers are on the page
+    
+    A failed branch sets the error state instead, so the previous page's
+    URL or markers are never paired with a new screenshot. Observations
+    without markers are not cached (inject_markers returns an empty map
+    when it fails).
+    
+    Args:
+        state: Current agent state (with URL and markers from the branches)
+    
+    Returns:
+        Updated state with screenshot
+    """
+    observe_error = state.url_error or state.markers_error
+    if observe_error:
+        logger.error("Observer node failed", error=observe_error)
+        set_error(state, f"Observation failed: {observe_error}")
+        return state
+    
+    try:
+        browser = get_browser()
         
         # Take screenshot with markers
-        screenshot = await browser.take_screenshot()
-        state["screenshot_base64"] = screenshot
+        screenshot = await browser.take_screenshot_bytes()
+        state.screenshot_bytes = screenshot
+        state.screenshot_size = browser.screenshot_size
+        
+        current_url = state.current_url
+        markers_map = state.markers_map
+        
+        if state.page_signature and markers_map:
+            _cache_observation(state.session_id, state.page_signature,
+                               screenshot, state.screenshot_size, markers_map)
         
         # Add observation message
         message = AIMessage(
@@ -91,9 +259,9 @@ async def observer_node(state: AgentState) -> AgentState:
         )
         add_message(state, message)
         
-        logger.info("Observer node complete", 
-                   url=current_url,
-                   markers=len(markers_map))
+        logger.debug("Observer node complete", 
+                    url=current_url,
+                    markers=len(markers_map))
         
         return state
         
@@ -117,7 +285,7 @@ async def reasoning_node(state: AgentState) -> AgentState:
     Returns:
         Updated state with planned action
     """
-    logger.info("Reasoning node starting", iteration=state["iterations"])
+    logger.debug("Reasoning node starting", iteration=state.iterations)
     
     try:
         set_status(state, "reasoning")
@@ -128,26 +296,44 @@ async def reasoning_node(state: AgentState) -> AgentState:
         # Get recent actions to avoid loops
         recent_actions = get_recent_actions(state, count=5)
         
-        logger.info("Analyzing page with vision AI",
-                   markers_count=len(state["markers_map"]),
-                   history_length=len(recent_actions))
-        
-        # Analyze page and get next action
-        action = await vision_analyzer.analyze_page(
-            screenshot_base64=state["screenshot_base64"],
-            markers_map=state["markers_map"],
-            user_goal=state["user_goal"],
-            action_history=recent_actions,
-            current_url=state.get("current_url", "")
-        )
-        
-        # Store planned action
-        state["last_action"] = action
+        logger.debug("Analyzing page with vision AI",
+                    markers_count=len(state.markers_map),
+                    history_length=len(recent_actions))
+        
+        if Config.VISION_COMBINED_ANALYSIS:
+            # One call for the action and checkout detection; the detection is
+            # cached so the safety check before a click doesn't call Gemini again
+            analysis = await vision_analyzer.analyze_all(
+                screenshot=state.screenshot_bytes,
+                markers_map=state.markers_map,
+                user_goal=state.user_goal,
+                action_history=recent_actions,
+                current_url=state.current_url,
+                screenshot_size=state.screenshot_size
+            )
+            action = analysis["action"]
+            if state.current_url and "error" not in analysis:
+                record_checkout_detection(state.current_url, state.screenshot_bytes,
+                                          analysis["checkout"])
+        else:
+            # Analyze page and get next action (returns once the action is decided)
+            action = await vision_analyzer.analyze_page_stream(
+                screenshot=state.screenshot_bytes,
+                markers_map=state.markers_map,
+                user_goal=state.user_goal,
+                action_history=recent_actions,
+                current_url=state.current_url,
+                screenshot_size=state.screenshot_size
+            )
+        
+        # Store planned action (converted from the vision dict once, here)
+        action = Action.from_dict(action)
+        state.last_action = action
         
         # Add reasoning message
-        reasoning = action.get("reasoning", "No reasoning provided")
-        action_type = action.get("action", "unknown")
-        target = action.get("target", "N/A")
+        reasoning = action.reasoning or "No reasoning provided"
+        action_type = action.action or "unknown"
+        target = action.target
         
         message = AIMessage(
             content=f"Reasoning: {reasoning}\nPlanned action: {action_type} on [{target}]"
@@ -186,33 +372,37 @@ async def action_node(state: AgentState) -> AgentState:
     Returns:
         Updated state after action execution
     """
-    logger.info("Action node starting", iteration=state["iterations"])
+    logger.debug("Action node starting", iteration=state.iterations)
     
     try:
         set_status(state, "executing")
         
         browser = get_browser()
-        action = state["last_action"]
+        action = state.last_action
         
         if not action:
             logger.warning("No action to execute")
             return state
         
-        action_type = action.get("action")
-        target = action.get("target")
-        value = action.get("value")
+        action_type = action.action
+        target = action.target
+        value = action.value
         
-        logger.info("Executing action",
-                   type=action_type,
-                   target=target,
-                   value=value[:50] if value else None)
+        logger.debug("Executing action",
+                    type=action_type,
+                    target=target,
+                    value=value[:50] if value else None)
+        
+        # Signature taken right before a click or Enter (None if nothing was
+        # sent), to wait for the page's reaction
+        before_signature = None
         
         # Execute based on action type
         if action_type == "click":
-            await execute_click(browser, state, target)
+            before_signature = await execute_click(browser, state, target)
         
         elif action_type == "type":
-            await execute_type(browser, state, target, value)
+            before_signature = await execute_type(browser, state, target, value)
         
         elif action_type == "scroll":
             await execute_scroll(browser, state)
@@ -230,14 +420,13 @@ async def action_node(state: AgentState) -> AgentState:
         # Increment iteration counter
         increment_iteration(state)
         
-        # Wait a bit for page to settle
-        await asyncio.sleep(1)
-        
-        # Remove markers before next observation
-        await remove_markers(browser.page)
+        # Wait for the navigation or DOM update the action triggered, so the
+        # next observation does not see (or reuse) the pre-action page
+        if before_signature is not None:
+            await wait_for_page_change(browser.page, before_signature, timeout=2000)
         
-        logger.info("Action node complete",
-                   iteration=state["iterations"])
+        logger.debug("Action node complete",
+                    iteration=state.iterations)
         
         return state
         
@@ -247,7 +436,24 @@ async def action_node(state: AgentState) -> AgentState:
         return state
 
 
-async def execute_click(browser: BrowserController, state: AgentState, target: int) -> None:
+async def capture_signature(browser: BrowserController) -> Optional[str]:
+    """
+    Get the page signature, or None if the page cannot be evaluated
+    
+    Args:
+        browser: Browser controller
+    
+    Returns:
+        Signature string from get_page_signature, or None
+    """
+    try:
+        return (await get_page_signature(browser.page))["signature"]
+    except Exception as e:
+        logger.debug("Page signature failed", error=str(e))
+        return None
+
+
+async def execute_click(browser: BrowserController, state: AgentState, target: int) -> Optional[str]:
     """
     Execute click action on target element
     
@@ -255,22 +461,24 @@ async def execute_click(browser: BrowserController, state: AgentState, target: i
         browser: Browser controller
         state: Current agent state
         target: Marker number to click
+    
+    Returns:
+        Page signature taken just before the click, or None if no click was
+        sent (approval required or failure)
     """
+    before_signature = None
     try:
-        # Get selector and element info for target
-        selector = await get_element_by_marker(browser.page, state["markers_map"], target)
-        
-        if not selector:
+        if target not in state.markers_map:
             raise ValueError(f"Could not find element for marker [{target}]")
         
         # Get element text for safety check
-        element_info = state["markers_map"].get(target, {})
+        element_info = state.markers_map.get(target, {})
         element_text = element_info.get('text', '') or element_info.get('aria_label', '')
         
         # Safety check before clicking
         safety_check = await check_before_click(
             browser.page,
-            state["screenshot_base64"],
+            state.screenshot_bytes,
             element_text
         )
         
@@ -280,7 +488,7 @@ async def execute_click(browser: BrowserController, state: AgentState, target: i
                          marker=target,
                          reason=safety_check.get('reason'))
             
-            state["approval_required"] = True
+            state.approval_required = True
             
             # Add approval request message
             checkout_info = safety_check.get('checkout_info')
@@ -291,48 +499,117 @@ async def execute_click(browser: BrowserController, state: AgentState, target: i
                 message = AIMessage(content=f"⚠️ APPROVAL REQUIRED\n\n{safety_check.get('reason')}")
             
             add_message(state, message)
-            return
+            return None
         
-        logger.info("Clicking element", marker=target, selector=selector)
+        logger.debug("Clicking element", marker=target)
         
-        # Wait for element to be stable (not animating)
-        await asyncio.sleep(0.5)
+        async def click(selector: str) -> None:
+            nonlocal before_signature
+            before_signature = await capture_signature(browser)
+            await click_element(browser, selector)
         
-        # Try multiple approaches
-        try:
-            # First try: Wait for element to be ready, then click
-            await browser.page.wait_for_selector(selector, state="visible", timeout=5000)
-            await browser.page.click(selector, timeout=5000)
-        except Exception as e1:
-            logger.warning(f"Direct click failed: {e1}, trying JavaScript click")
-            try:
-                # Second try: JavaScript click (bypasses some overlays)
-                await browser.page.evaluate(f"""
-                    const element = document.querySelector('{selector}');
-                    if (element) element.click();
-                """)
-            except Exception as e2:
-                logger.warning(f"JavaScript click failed: {e2}, trying force click")
-                try:
-                    # Third try: force click (ignores actionability checks)
-                    await browser.page.click(selector, force=True, timeout=5000)
-                except Exception as e3:
-                    logger.error(f"Force click failed: {e3}")
-                    raise
-        
-        logger.info("Click successful", marker=target)
+        selector = await run_on_marker(browser, state.markers_map, target, click)
+        
+        logger.debug("Click successful", marker=target, selector=selector)
         
         # Add success message
         message = AIMessage(content=f"✓ Clicked element [{target}]")
         add_message(state, message)
+        return before_signature
         
     except Exception as e:
         logger.error("Click failed", marker=target, error=str(e))
         message = AIMessage(content=f"✗ Failed to click element [{target}]: {str(e)}")
         add_message(state, message)
+        return None
 
 
-async def execute_type(browser: BrowserController, state: AgentState, target: int, value: str) -> None:
+async def run_on_marker(
+    browser: BrowserController,
+    markers_map: Dict[int, Dict[str, Any]],
+    target: int,
+    operation: Callable[[str], Awaitable[None]]
+) -> str:
+    """
+    Run an element operation on a marker's element
+    
+    Uses the selector tagged at injection time first, which needs no
+    lookup. If the operation fails with it (e.g. the page re-rendered the
+    element and dropped the tag), the selector is looked up again with
+    get_element_by_marker and the operation is retried once.
+    
+    Args:
+        browser: Browser controller
+        markers_map: Mapping of marker numbers to element info
+        target: Marker number
+        operation: Coroutine function taking the selector
+    
+    Returns:
+        Selector the operation succeeded with
+    """
+    selector = get_marker_selector(markers_map, target)
+    
+    if selector:
+        try:
+            await operation(selector)
+            return selector
+        except Exception as e:
+            logger.debug("Tagged selector failed, looking up marker",
+                        marker=target, error=str(e))
+    
+    selector = await get_element_by_marker(browser.page, markers_map, target)
+    
+    if not selector:
+        raise ValueError(f"Could not find element for marker [{target}]")
+    
+    await operation(selector)
+    return selector
+
+
+async def click_element(browser: BrowserController, selector: str) -> None:
+    """
+    Click an element, falling back quickly when it is not actionable
+    
+    Playwright's actionability check (a trial click, which does not click)
+    races a short hedge delay. If it passes, the element gets a normal
+    click; if it fails or is still waiting, it is cancelled and we use the
+    JavaScript click, then a force click if the element is not in the DOM
+    yet. Only one real click is ever sent, so the fallbacks cannot trigger
+    the same action twice.
+    
+    Args:
+        browser: Browser controller
+        selector: CSS selector of the element
+    """
+    page = browser.page
+    
+    trial = asyncio.create_task(page.click(selector, trial=True, timeout=CLICK_TIMEOUT))
+    done, _ = await asyncio.wait({trial}, timeout=CLICK_HEDGE_DELAY, return_when=asyncio.FIRST_COMPLETED)
+    
+    if trial in done and trial.exception() is None:
+        # First try: element is actionable, click it normally
+        await page.click(selector, timeout=CLICK_TIMEOUT)
+        return
+    
+    if trial not in done:
+        trial.cancel()
+        logger.warning("Element not actionable yet, trying JavaScript click", selector=selector)
+    else:
+        logger.warning("Direct click not possible, trying JavaScript click",
+                      selector=selector, error=str(trial.exception()))
+    
+    # Second try: JavaScript click (bypasses some overlays)
+    try:
+        if await page.evaluate(JS_CLICK_SCRIPT, selector):
+            return
+    except Exception as e:
+        logger.warning("JavaScript click failed, trying force click", error=str(e))
+    
+    # Third try: force click (ignores actionability checks, waits for the element)
+    await page.click(selector, force=True, timeout=CLICK_TIMEOUT)
+
+
+async def execute_type(browser: BrowserController, state: AgentState, target: int, value: str) -> Optional[str]:
     """
     Execute type action on input element
     
@@ -341,44 +618,39 @@ async def execute_type(browser: BrowserController, state: AgentState, target: in
         state: Current agent state
         target: Marker number of input field
         value: Text to type
+    
+    Returns:
+        Page signature taken after filling and just before Enter (the fill
+        itself changes the form values), or None if Enter was not pressed
     """
     try:
-        # Get selector for target
-        selector = await get_element_by_marker(browser.page, state["markers_map"], target)
-        
-        if not selector:
-            raise ValueError(f"Could not find element for marker [{target}]")
-        
-        logger.info("Typing into element", marker=target, selector=selector, value=value)
+        logger.debug("Typing into element", marker=target, value=value)
         
-        # Wait for element to be ready
-        await browser.page.wait_for_selector(selector, state="visible", timeout=5000)
-        
-        # Focus on the element first
-        await browser.page.focus(selector)
-        await asyncio.sleep(0.3)
-        
-        # Clear existing value first
-        await browser.page.fill(selector, "")
-        await asyncio.sleep(0.2)
+        async def type_into(selector: str) -> None:
+            # Wait for element to be ready
+            await browser.page.wait_for_selector(selector, state="visible", timeout=5000)
+            
+            # Replace the value in one step (fill fires the input event)
+            await browser.enter_text(selector, value)
         
-        # Type the text (human-like with delays)
-        await browser.page.type(selector, value, delay=50)
-        await asyncio.sleep(0.5)
+        selector = await run_on_marker(browser, state.markers_map, target, type_into)
         
         # Press Enter to submit (common for search boxes)
+        before_signature = await capture_signature(browser)
         await browser.page.press(selector, "Enter")
         
-        logger.info("Type successful", marker=target)
+        logger.debug("Type successful", marker=target, selector=selector)
         
         # Add success message
         message = AIMessage(content=f"✓ Typed '{value}' into element [{target}] and pressed Enter")
         add_message(state, message)
+        return before_signature
         
     except Exception as e:
         logger.error("Type failed", marker=target, error=str(e))
         message = AIMessage(content=f"✗ Failed to type into element [{target}]: {str(e)}")
         add_message(state, message)
+        return None
 
 
 async def execute_scroll(browser: BrowserController, state: AgentState) -> None:
@@ -390,12 +662,12 @@ async def execute_scroll(browser: BrowserController, state: AgentState) -> None:
         state: Current agent state
     """
     try:
-        logger.info("Scrolling page")
+        logger.debug("Scrolling page")
         
         # Scroll down 500 pixels
         await browser.scroll(direction="down", amount=500)
         
-        logger.info("Scroll successful")
+        logger.debug("Scroll successful")
         
         # Add success message
         message = AIMessage(content="✓ Scrolled down to see more content")
@@ -3,24 +3,42 @@ Agent Execution Service.
 Manages agent lifecycle, session state, and execution control.
 """
 import asyncio
-import sys
+import hashlib
+import heapq
+import time
 import uuid
-from typing import Dict, Any, Optional, AsyncGenerator
+from typing import Dict, Any, List, Optional, AsyncGenerator, Tuple
 from datetime import datetime, timedelta
 import structlog
 
-# CRITICAL FIX: Set event loop policy for Windows before ANY async operations
-if sys.platform == 'win32':
-    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+from event_loop import install_loop_policy
+
+# CRITICAL FIX: Set event loop policy before ANY async operations
+install_loop_policy()
 
 from config import Config
-from browser_controller import BrowserController
-from agent_state import AgentState, create_initial_state, format_state_summary
-from agent_graph import create_agent_graph
-from agent_nodes import set_browser
+from browser_controller import BrowserController, get_browser_pool
+from agent_state import Action, AgentState, create_initial_state, format_state_summary
+from agent_graph import create_agent_graph, route_after_action
+from agent_nodes import set_browser, observer_node, reasoning_node, action_node
+from checkpoint_store import get_checkpoint_store
 
 logger = structlog.get_logger()
 
+# Client-facing field -> state key, sent in state_delta events when changed
+DELTA_FIELDS = {
+    "status": "status",
+    "iteration": "iterations",
+    "last_action": "last_action",
+    "url": "current_url",
+}
+
+# Most messages sent in a single delta
+MAX_DELTA_MESSAGES = 3
+
+# Minimum spacing between updates, to avoid overwhelming clients (seconds)
+MIN_EMIT_INTERVAL = 0.1
+
 
 class AgentSession:
     """Represents an active agent session"""
@@ -30,8 +48,14 @@ class AgentSession:
         self.user_goal = user_goal
         self.initial_url = initial_url
         self.created_at = datetime.now()
+        self.created_at_iso = self.created_at.isoformat()
         self.browser: Optional[BrowserController] = None
         self.state: Optional[AgentState] = None
+        # What the client already has, so deltas only carry changes
+        self.sent_fields: Dict[str, Any] = {}
+        self.sent_message: Optional[Any] = None
+        self.sent_screenshot: Optional[bytes] = None
+        self.last_emit = 0.0
         self.is_running = False
         self.is_cancelled = False
     
@@ -46,6 +70,8 @@ class AgentExecutor:
     
     def __init__(self):
         self.sessions: Dict[str, AgentSession] = {}
+        # (created_at, session_id) min-heap, so cleanup only visits expired sessions
+        self._sessions_by_age: List[Tuple[datetime, str]] = []
         self.graph = create_agent_graph()
         logger.info("AgentExecutor initialized")
     
@@ -71,6 +97,7 @@ class AgentExecutor:
         
         session = AgentSession(session_id, user_goal, initial_url)
         self.sessions[session_id] = session
+        heapq.heappush(self._sessions_by_age, (session.created_at, session_id))
         
         logger.info("Session created", 
                    session_id=session_id,
@@ -138,12 +165,11 @@ class AgentExecutor:
                 "url": session.initial_url
             }
             
-            # Initialize browser
+            # Open an isolated context on the shared browser
             logger.info("Initializing browser", session_id=session_id)
-            session.browser = BrowserController(headless=Config.HEADLESS)
-            await session.browser.initialize()
+            session.browser = await get_browser_pool().new_controller()
             
-            # Set global browser for nodes
+            # Bind the browser for nodes run by this task
             set_browser(session.browser)
             
             # Navigate to initial URL
@@ -175,7 +201,18 @@ class AgentExecutor:
             # Execute graph
             logger.info("Starting agent execution", session_id=session_id)
             
-            async for update in self._run_graph(session):
+            run = self._run_direct if Config.AGENT_DIRECT_LOOP else self._run_graph
+            
+            # Each node's delta is checkpointed (step 0 holds the goal)
+            checkpoints = get_checkpoint_store()
+            step = 0
+            if checkpoints:
+                await checkpoints.append(session_id, step, "start", {
+                    "goal": session.user_goal,
+                    "url": session.initial_url
+                })
+            
+            async for update in run(session):
                 # Check if cancelled
                 if session.is_cancelled:
                     yield {
@@ -184,6 +221,11 @@ class AgentExecutor:
                     }
                     break
                 
+                if checkpoints and update.get("type") == "state_delta":
+                    step += 1
+                    # The screenshot frame is left out; its hash is in the delta
+                    await checkpoints.append(session_id, step, update["node"], update["delta"])
+                
                 yield update
             
             # Send completion event
@@ -212,7 +254,15 @@ class AgentExecutor:
                 await session.browser.close()
                 session.browser = None
             
-            logger.info("Mission execution ended", session_id=session_id)
+            # One summary line per session (per-iteration logs are DEBUG)
+            summary = {}
+            if session.state:
+                summary = {
+                    "status": session.state.status,
+                    "iterations": session.state.iterations,
+                    "actions": len(session.state.action_history)
+                }
+            logger.info("Mission execution ended", session_id=session_id, **summary)
     
     async def _run_graph(self, session: AgentSession) -> AsyncGenerator[Dict[str, Any], None]:
         """
@@ -228,33 +278,29 @@ class AgentExecutor:
             # Execute graph step by step
             state = session.state
             
-            # Run graph with streaming
-            async for event in self.graph.astream(state):
+            # Run graph with streaming. An iteration without a cache hit takes
+            # 5 supersteps (observer, get_url/inject_markers, screenshot,
+            # reasoning, action), so LangGraph's default limit of 25 would
+            # stop the run after about 5 iterations
+            config = {"recursion_limit": state.max_iterations * 5 + 5}
+            async for event in self.graph.astream(state.to_dict(), config=config):
                 # Extract state from event
                 # LangGraph returns dict with node name as key
                 if isinstance(event, dict):
                     # Get the latest state from any node
                     for node_name, node_state in event.items():
+                        if isinstance(node_state, AgentState):
+                            node_state = node_state.to_dict()
+                        
                         if isinstance(node_state, dict):
-                            # Update session state
+                            # Update session state (parallel branches
+                            # only return the keys they own)
                             session.state.update(node_state)
                             
-                            # Yield update
-                            yield {
-                                "type": "state_update",
-                                "node": node_name,
-                                "status": node_state.get("status"),
-                                "iteration": node_state.get("iterations"),
-                                "last_action": node_state.get("last_action"),
-                                "screenshot": node_state.get("screenshot_base64", ""),
-                                "url": node_state.get("current_url", ""),
-                                "messages": [
-                                    msg.content for msg in node_state.get("messages", [])[-3:]
-                                ]
-                            }
+                            # Space updates out only if they come too fast
+                            await self._pace(session)
                             
-                            # Small delay to avoid overwhelming clients
-                            await asyncio.sleep(0.1)
+                            yield self._state_delta(session, node_name)
                 
                 # Check for cancellation
                 if session.is_cancelled:
@@ -270,6 +316,128 @@ class AgentExecutor:
                 "message": f"Graph execution failed: {str(e)}"
             }
     
+    async def _run_direct(self, session: AgentSession) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Run the agent nodes in a plain async loop and stream state updates
+        
+        Same observe -> reason -> act cycle and stopping rule as the graph,
+        without LangGraph's per-node state copying and event dispatch.
+        
+        Args:
+            session: Agent session
+        
+        Yields:
+            State update dictionaries
+        """
+        nodes = (
+            ("observer", observer_node),
+            ("reasoning", reasoning_node),
+            ("action", action_node),
+        )
+        
+        try:
+            state = session.state
+            
+            while True:
+                for node_name, node in nodes:
+                    state = await node(state)
+                    session.state = state
+                    
+                    # Space updates out only if they come too fast
+                    await self._pace(session)
+                    
+                    yield self._state_delta(session, node_name)
+                    
+                    # Check for cancellation
+                    if session.is_cancelled:
+                        return
+                
+                if route_after_action(state) == "end":
+                    break
+        
+        except Exception as e:
+            logger.error("Agent loop error", 
+                        session_id=session.session_id,
+                        error=str(e))
+            
+            yield {
+                "type": "error",
+                "message": f"Agent execution failed: {str(e)}"
+            }
+    
+    async def _pace(self, session: AgentSession) -> None:
+        """
+        Keep at least MIN_EMIT_INTERVAL between updates sent to a client
+        
+        Sleeps only for what is left of the interval since the previous
+        update, so nodes that take longer than that are never delayed.
+        
+        Args:
+            session: Agent session
+        """
+        now = time.monotonic()
+        gap = MIN_EMIT_INTERVAL - (now - session.last_emit)
+        
+        if gap > 0:
+            await asyncio.sleep(gap)
+            now += gap
+        
+        session.last_emit = now
+    
+    def _state_delta(self, session: AgentSession, node_name: str) -> Dict[str, Any]:
+        """
+        Build the state_delta event sent to clients after a node runs
+        
+        Only fields that changed since the previous event are included, plus
+        the messages added since then. A new screenshot is attached as raw
+        JPEG bytes under "frame" (sent as a binary WebSocket frame, never
+        base64 encoded), with its content hash in the delta; the client
+        merges each delta into what it has.
+        
+        Args:
+            session: Agent session (holds the merged state)
+            node_name: Name of the node that just ran
+        
+        Returns:
+            State delta dictionary
+        """
+        current = session.state
+        delta: Dict[str, Any] = {}
+        
+        for field, state_key in DELTA_FIELDS.items():
+            value = getattr(current, state_key)
+            if isinstance(value, Action):
+                value = value.to_dict()
+            if field not in session.sent_fields or session.sent_fields[field] != value:
+                session.sent_fields[field] = value
+                delta[field] = value
+        
+        # Walk back to the last message already sent
+        new_messages = []
+        for msg in reversed(current.messages):
+            if msg is session.sent_message or len(new_messages) == MAX_DELTA_MESSAGES:
+                break
+            new_messages.append(msg)
+        
+        if new_messages:
+            session.sent_message = new_messages[0]
+            delta["messages"] = [msg.content for msg in reversed(new_messages)]
+        
+        event = {
+            "type": "state_delta",
+            "node": node_name,
+            "delta": delta
+        }
+        
+        screenshot = current.screenshot_bytes
+        if screenshot and screenshot is not session.sent_screenshot:
+            session.sent_screenshot = screenshot
+            delta["screenshot_hash"] = hashlib.blake2b(screenshot, digest_size=8).hexdigest()
+            # Raw JPEG, sent as a binary frame after the JSON event
+            event["frame"] = screenshot
+        
+        return event
+    
     async def cleanup_old_sessions(self, max_age_hours: int = 24) -> int:
         """
         Remove old inactive sessions
@@ -280,21 +448,35 @@ class AgentExecutor:
         Returns:
             Number of sessions cleaned up
         """
-        now = datetime.now()
-        cutoff = now - timedelta(hours=max_age_hours)
+        cutoff = datetime.now() - timedelta(hours=max_age_hours)
         
-        to_remove = []
-        for session_id, session in self.sessions.items():
-            if not session.is_running and session.created_at < cutoff:
-                to_remove.append(session_id)
+        removed = 0
+        still_running = []
         
-        for session_id in to_remove:
+        # Oldest first; stop at the first session that is new enough
+        while self._sessions_by_age and self._sessions_by_age[0][0] < cutoff:
+            entry = heapq.heappop(self._sessions_by_age)
+            created_at, session_id = entry
+            session = self.sessions.get(session_id)
+            
+            # Skip entries for sessions already gone or replaced under the same ID
+            if session is None or session.created_at != created_at:
+                continue
+            
+            if session.is_running:
+                still_running.append(entry)
+                continue
+            
             del self.sessions[session_id]
+            removed += 1
+        
+        for entry in still_running:
+            heapq.heappush(self._sessions_by_age, entry)
         
-        if to_remove:
-            logger.info("Cleaned up old sessions", count=len(to_remove))
+        if removed:
+            logger.info("Cleaned up old sessions", count=removed)
         
-        return len(to_remove)
+        return removed
     
     def get_active_sessions_count(self) -> int:
         """Get count of currently running sessions"""
@@ -312,7 +494,7 @@ class AgentExecutor:
             "initial_url": session.initial_url,
             "is_running": session.is_running,
             "is_cancelled": session.is_cancelled,
-            "created_at": session.created_at.isoformat(),
+            "created_at": session.created_at_iso,
             "state_summary": format_state_summary(session.state) if session.state else None
         }
 
@@ -2,31 +2,80 @@
 Agent State definition for LangGraph.
 Defines the state structure that flows through the agent workflow.
 """
-from typing import List, Dict, Any, Literal, Optional
-from typing_extensions import TypedDict
+from collections import deque
+from dataclasses import dataclass, fields
+from itertools import islice
+from typing import Deque, List, Dict, Any, Literal, Optional, Tuple, Union
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 import structlog
 
+from logging_setup import debug_enabled
+
 logger = structlog.get_logger()
 
+# Messages kept in state; older ones are dropped as new ones arrive
+MAX_MESSAGES = 50
+
+# Actions kept in history (same ring-buffer behaviour)
+MAX_ACTION_HISTORY = 200
+
+
+@dataclass(slots=True)
+class Action:
+    """
+    One agent action, as decided by the vision model
+    
+    A slots dataclass rather than a dict: histories hold many of these.
+    Vision results are converted once with from_dict().
+    """
+    action: str
+    target: Any = None
+    value: Any = None
+    reasoning: str = ""
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Action":
+        """Build an Action from a vision result dict (unknown keys are ignored)"""
+        return cls(
+            action=data.get("action") or "",
+            target=data.get("target"),
+            value=data.get("value"),
+            reasoning=data.get("reasoning") or ""
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict form, e.g. for JSON events"""
+        return {
+            "action": self.action,
+            "target": self.target,
+            "value": self.value,
+            "reasoning": self.reasoning
+        }
+
 
-class AgentState(TypedDict):
+@dataclass(slots=True)
+class AgentState:
     """
     State structure for the shopping agent workflow
     
-    This state flows through all nodes in the LangGraph workflow.
+    This state flows through all nodes in the LangGraph workflow. It is a
+    slots dataclass, so fields are plain attribute reads (state.iterations)
+    rather than dict lookups; use to_dict() where a mapping is needed.
     """
-    # Message history
-    messages: List[BaseMessage]
+    # Message history (ring buffer of the last MAX_MESSAGES)
+    messages: Deque[BaseMessage]
     
     # Browser state
     current_url: str
-    screenshot_base64: str
+    screenshot_bytes: bytes
+    screenshot_size: Optional[Tuple[int, int]]
     markers_map: Dict[int, Dict[str, Any]]
+    page_signature: str
+    observation_cached: bool
     
     # Action tracking
-    last_action: Optional[Dict[str, Any]]
-    action_history: List[Dict[str, Any]]
+    last_action: Optional[Action]
+    action_history: Deque[Action]
     
     # Mission context
     user_goal: str
@@ -39,10 +88,23 @@ class AgentState(TypedDict):
     
     # Error handling
     error: Optional[str]
+    # Failures of the parallel observer branches (one key each, so the
+    # branches never write the same key), checked at the screenshot join
+    url_error: Optional[str]
+    markers_error: Optional[str]
     
     # Safety
     approval_required: bool
     approval_granted: bool
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Shallow field -> value mapping (e.g. as graph input or for checkpoints)"""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+    
+    def update(self, values: Dict[str, Any]) -> None:
+        """Apply a partial update, e.g. the keys returned by a graph node"""
+        for key, value in values.items():
+            setattr(self, key, value)
 
 
 def create_initial_state(
@@ -61,23 +123,29 @@ def create_initial_state(
         max_iterations: Maximum iterations before stopping
     
     Returns:
-        Initial AgentState dictionary
+        Initial AgentState
     """
     return AgentState(
-        messages=[
-            HumanMessage(content=f"Goal: {user_goal}")
-        ],
+        messages=deque(
+            [HumanMessage(content=f"Goal: {user_goal}")],
+            maxlen=MAX_MESSAGES
+        ),
         current_url=initial_url,
-        screenshot_base64="",
+        screenshot_bytes=b"",
+        screenshot_size=None,
         markers_map={},
+        page_signature="",
+        observation_cached=False,
         last_action=None,
-        action_history=[],
+        action_history=deque(maxlen=MAX_ACTION_HISTORY),
         user_goal=user_goal,
         session_id=session_id,
         status="planning",
         iterations=0,
         max_iterations=max_iterations,
         error=None,
+        url_error=None,
+        markers_error=None,
         approval_required=False,
         approval_granted=False
     )
@@ -87,6 +155,9 @@ def add_message(state: AgentState, message: BaseMessage) -> AgentState:
     """
     Add a message to the state
     
+    Only the last MAX_MESSAGES are kept, so long missions use bounded
+    memory; the oldest message is dropped in O(1) once the cap is hit.
+    
     Args:
         state: Current agent state
         message: Message to add
@@ -94,23 +165,28 @@ def add_message(state: AgentState, message: BaseMessage) -> AgentState:
     Returns:
         Updated state
     """
-    state["messages"].append(message)
+    state.messages.append(message)
     return state
 
 
-def add_action(state: AgentState, action: Dict[str, Any]) -> AgentState:
+def add_action(state: AgentState, action: Union[Action, Dict[str, Any]]) -> AgentState:
     """
     Add an action to the history
     
+    Only the last MAX_ACTION_HISTORY actions are kept.
+    
     Args:
         state: Current agent state
-        action: Action dictionary to add
+        action: Action (or action dictionary) to add
     
     Returns:
         Updated state
     """
-    state["last_action"] = action
-    state["action_history"].append(action)
+    if isinstance(action, dict):
+        action = Action.from_dict(action)
+    
+    state.last_action = action
+    state.action_history.append(action)
     return state
 
 
@@ -126,11 +202,11 @@ def is_complete(state: AgentState) -> bool:
     """
     # Mission is complete if:
     # 1. Status is explicitly set to complete
-    if state["status"] == "complete":
+    if state.status == "complete":
         return True
     
     # 2. Last action was "done"
-    if state["last_action"] and state["last_action"].get("action") == "done":
+    if state.last_action is not None and state.last_action.action == "done":
         return True
     
     return False
@@ -151,19 +227,19 @@ def should_stop(state: AgentState) -> bool:
         return True
     
     # Stop if max iterations reached
-    if state["iterations"] >= state["max_iterations"]:
+    if state.iterations >= state.max_iterations:
         logger.warning("Max iterations reached", 
-                      iterations=state["iterations"],
-                      max_iterations=state["max_iterations"])
+                      iterations=state.iterations,
+                      max_iterations=state.max_iterations)
         return True
     
     # Stop if error occurred
-    if state["status"] == "error":
-        logger.error("Error status detected", error=state.get("error"))
+    if state.status == "error":
+        logger.error("Error status detected", error=state.error)
         return True
     
     # Stop if waiting for approval
-    if state["approval_required"] and not state["approval_granted"]:
+    if state.approval_required and not state.approval_granted:
         logger.info("Waiting for user approval")
         return True
     
@@ -180,10 +256,11 @@ def increment_iteration(state: AgentState) -> AgentState:
     Returns:
         Updated state
     """
-    state["iterations"] += 1
-    logger.debug("Iteration incremented", 
-                iteration=state["iterations"],
-                max_iterations=state["max_iterations"])
+    state.iterations += 1
+    if debug_enabled():
+        logger.debug("Iteration incremented", 
+                    iteration=state.iterations,
+                    max_iterations=state.max_iterations)
     return state
 
 
@@ -198,13 +275,14 @@ def set_status(state: AgentState, status: str) -> AgentState:
     Returns:
         Updated state
     """
-    old_status = state["status"]
-    state["status"] = status
+    old_status = state.status
+    state.status = status
     
-    logger.info("Status changed", 
-               from_status=old_status,
-               to_status=status,
-               iteration=state["iterations"])
+    if debug_enabled():
+        logger.debug("Status changed", 
+                    from_status=old_status,
+                    to_status=status,
+                    iteration=state.iterations)
     
     return state
 
@@ -220,15 +298,15 @@ def set_error(state: AgentState, error: str) -> AgentState:
     Returns:
         Updated state
     """
-    state["error"] = error
-    state["status"] = "error"
+    state.error = error
+    state.status = "error"
     
     logger.error("Error set in state", error=error)
     
     return state
 
 
-def get_recent_actions(state: AgentState, count: int = 3) -> List[Dict[str, Any]]:
+def get_recent_actions(state: AgentState, count: int = 3) -> List[Action]:
     """
     Get the most recent actions
     
@@ -237,9 +315,12 @@ def get_recent_actions(state: AgentState, count: int = 3) -> List[Dict[str, Any]
         count: Number of recent actions to return
     
     Returns:
-        List of recent action dictionaries
+        List of recent actions, oldest first
     """
-    return state["action_history"][-count:] if state["action_history"] else []
+    # Walk back from the newest entry, so only `count` items are visited
+    recent = list(islice(reversed(state.action_history), count))
+    recent.reverse()
+    return recent
 
 
 def format_state_summary(state: AgentState) -> str:
@@ -252,23 +333,16 @@ def format_state_summary(state: AgentState) -> str:
     Returns:
         Formatted summary string
     """
-    summary_lines = [
-        f"Session: {state['session_id']}",
-        f"Goal: {state['user_goal']}",
-        f"Status: {state['status']}",
-        f"Iteration: {state['iterations']}/{state['max_iterations']}",
-        f"Current URL: {state['current_url']}",
-        f"Actions taken: {len(state['action_history'])}",
-    ]
-    
-    if state["last_action"]:
-        action = state["last_action"]
-        summary_lines.append(
-            f"Last action: {action.get('action')} on [{action.get('target')}]"
-        )
-    
-    if state["error"]:
-        summary_lines.append(f"Error: {state['error']}")
-    
-    return "\n".join(summary_lines)
+    last_action = state.last_action
+    
+    return (
+        f"Session: {state.session_id}\n"
+        f"Goal: {state.user_goal}\n"
+        f"Status: {state.status}\n"
+        f"Iteration: {state.iterations}/{state.max_iterations}\n"
+        f"Current URL: {state.current_url}\n"
+        f"Actions taken: {len(state.action_history)}"
+        + (f"\nLast action: {last_action.action} on [{last_action.target}]" if last_action else "")
+        + (f"\nError: {state.error}" if state.error else "")
+    )
 
@@ -2,21 +2,29 @@
 AI Vision Analyzer using Google Gemini for screenshot analysis.
 Implements vision-based decision making for the agent.
 """
+import asyncio
 import base64
+import hashlib
 import io
-import time
-from typing import Dict, List, Any, Optional
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple, Union
 from PIL import Image
 import google.generativeai as genai
+import orjson
 import structlog
 
 from config import Config
+from agent_state import Action
 from gemini_helper import (
     setup_gemini,
     get_generation_config,
     get_safety_settings,
     create_vision_prompt,
+    create_combined_analysis_prompt,
+    create_checkout_detection_prompt,
     parse_gemini_json,
+    parse_partial_json_fields,
     validate_action,
     GEMINI_FLASH,
     GEMINI_PRO,
@@ -26,6 +34,183 @@ from amazon_selectors import is_amazon_url, detect_amazon_page_type
 
 logger = structlog.get_logger()
 
+# Longest image edge and JPEG quality of the image sent to Gemini; smaller
+# than the UI screenshot, which keeps SCREENSHOT_MAX_SIZE
+MAX_IMAGE_SIZE = 896
+MODEL_IMAGE_QUALITY = 70
+
+# Checkout detection reads layout and large button text, so it gets a
+# smaller image (fewer input tokens on the call that blocks clicks)
+CHECKOUT_IMAGE_SIZE = 768
+
+# Checkout detection is a short yes/no classification that blocks clicks:
+# a fast model, deterministic, with a small output budget
+CHECKOUT_MODEL = GEMINI_FLASH
+CHECKOUT_MAX_TOKENS = 256
+
+# Decoded screenshots kept per analyzer, so the checkout check, product
+# extraction and page analysis of one iteration decode the frame only once
+IMAGE_CACHE_SIZE = 4
+
+# Screenshots travel as raw bytes inside the agent; API callers may pass base64
+Screenshot = Union[bytes, str]
+
+# Image content part for Gemini: JPEG bytes as {"mime_type", "data"}. Passing
+# encoded bytes avoids the SDK re-encoding a PIL image (as lossless WebP)
+ImagePart = Dict[str, Any]
+
+
+def _is_action_decided(fields: Dict[str, Any]) -> bool:
+    """Check whether streamed fields are enough to execute the action"""
+    action_type = fields.get("action")
+    
+    if action_type in ("scroll", "done"):
+        return True
+    if action_type == "click":
+        return "target" in fields
+    if action_type == "type":
+        return "target" in fields and "value" in fields
+    
+    return False
+
+
+async def _cancel_stream(response: Any, chunks: AsyncIterator[Any]) -> None:
+    """
+    Stop a streamed generation that is no longer being read
+    
+    Closes our iterator over the response, then cancels the underlying
+    call so the server stops generating and the connection is released
+    now rather than when the response is garbage collected.
+    
+    Args:
+        response: Streaming response from generate_content_async
+        chunks: Iterator over the response that was being read
+    """
+    try:
+        await chunks.aclose()
+    except Exception as e:
+        logger.debug("Closing response stream failed", error=str(e))
+    
+    call = getattr(response, "_iterator", None)
+    cancel = getattr(call, "cancel", None)
+    if callable(cancel):
+        cancel()
+
+
+BATCH_PROMPT_HEADER = """You will receive {count} independent requests, each with its own screenshot.
+Answer every request separately, following the JSON format that request asks for.
+
+Return ONLY valid JSON with this EXACT structure:
+{{
+  "results": [<answer to request 0>, <answer to request 1>, ...]
+}}
+
+The "results" list must contain exactly {count} answers, in request order.
+"""
+
+
+class VisionBatcher:
+    """
+    Coalesces vision requests from concurrent sessions into one Gemini call
+    
+    Requests arriving within max_wait seconds of each other (up to max_batch)
+    are sent as a single multi-image prompt. If the combined answer cannot be
+    matched back to the requests, each request is retried on its own.
+    """
+    
+    def __init__(self, model: Any, max_batch: int = 8, max_wait: float = 0.05):
+        """
+        Initialize batcher
+        
+        Args:
+            model: Gemini GenerativeModel used for the calls
+            max_batch: Maximum requests per combined call
+            max_wait: Seconds to wait for more requests after the first one
+        """
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._dispatching: set = set()
+    
+    async def submit(self, prompt: str, image: ImagePart) -> str:
+        """
+        Queue a request and wait for its response text
+        
+        Args:
+            prompt: Text prompt
+            image: JPEG image part
+        
+        Returns:
+            Raw response text for this request
+        """
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((prompt, image, future))
+        return await future
+    
+    async def _run(self) -> None:
+        """Drain the queue into batches and dispatch them"""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Dispatch without blocking the next batch from forming
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatching.add(task)
+            task.add_done_callback(self._dispatching.discard)
+    
+    async def _dispatch(self, batch: List[Tuple[str, ImagePart, asyncio.Future]]) -> None:
+        """Send a batch to Gemini and resolve each request's future"""
+        if len(batch) == 1:
+            prompt, image, future = batch[0]
+            try:
+                response = await asyncio.to_thread(self.model.generate_content, [prompt, image])
+                if not future.done():
+                    future.set_result(response.text)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        parts: List[Any] = [BATCH_PROMPT_HEADER.format(count=len(batch))]
+        for index, (prompt, image, _) in enumerate(batch):
+            parts.append(f"=== REQUEST {index} ===\n{prompt}")
+            parts.append(image)
+        
+        try:
+            logger.debug("Sending batched vision request", batch_size=len(batch))
+            response = await asyncio.to_thread(self.model.generate_content, parts)
+            results = parse_gemini_json(response.text).get("results")
+            
+            if not isinstance(results, list) or len(results) != len(batch):
+                raise ValueError("Batched response does not match request count")
+            
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(orjson.dumps(result).decode())
+                    
+        except Exception as e:
+            logger.warning("Batched vision request failed, sending individually",
+                         batch_size=len(batch),
+                         error=str(e))
+            await asyncio.gather(*(self._dispatch([item]) for item in batch))
+
 
 class VisionAnalyzer:
     """Analyzes screenshots using Gemini vision models to determine next actions"""
@@ -39,6 +224,9 @@ class VisionAnalyzer:
         """
         self.model_name = model_name
         self.model = None
+        self.checkout_model = None
+        self._batcher: Optional[VisionBatcher] = None
+        self._image_cache: "OrderedDict[Tuple[bytes, int], ImagePart]" = OrderedDict()
         self._setup()
     
     def _setup(self) -> None:
@@ -56,66 +244,147 @@ class VisionAnalyzer:
                 safety_settings=get_safety_settings()
             )
             
-            logger.info("Vision analyzer initialized", model=self.model_name)
+            self.checkout_model = genai.GenerativeModel(
+                model_name=CHECKOUT_MODEL,
+                generation_config=get_generation_config(
+                    temperature=0.0,
+                    response_json=True,
+                    max_tokens=CHECKOUT_MAX_TOKENS
+                ),
+                safety_settings=get_safety_settings()
+            )
+            
+            if Config.VISION_BATCHING:
+                self._batcher = VisionBatcher(self.model)
+            
+            logger.info("Vision analyzer initialized",
+                       model=self.model_name,
+                       batching=self._batcher is not None)
             
         except Exception as e:
             logger.error("Failed to initialize vision analyzer", error=str(e))
             raise
     
-    def _base64_to_image(self, screenshot_base64: str) -> Image.Image:
+    def _decode_screenshot(
+        self,
+        screenshot: Screenshot,
+        dims: Optional[Tuple[int, int]] = None,
+        already_rgb: bool = False,
+        max_size: int = MAX_IMAGE_SIZE
+    ) -> ImagePart:
         """
-        Convert base64 string to PIL Image
+        Convert a screenshot to the JPEG image part sent to Gemini
         
         Args:
-            screenshot_base64: Base64 encoded image string
+            screenshot: Raw image bytes, or a base64 encoded image string
+            dims: Known (width, height) of the screenshot; if it already fits
+                max_size a JPEG screenshot is sent without decoding
+            already_rgb: Source is known to be RGB (e.g. our JPEG screenshots),
+                so the mode check is skipped
+            max_size: Longest edge of the image part
         
         Returns:
-            PIL Image object
+            Image part (shared with other callers; do not modify)
         """
         try:
-            # Decode base64
-            image_data = base64.b64decode(screenshot_base64)
-            
-            # Convert to PIL Image
-            image = Image.open(io.BytesIO(image_data))
-            
-            # Ensure RGB format
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Optimize size for Gemini (max 1024x1024 for best performance)
-            max_size = 1024
-            if image.width > max_size or image.height > max_size:
-                ratio = min(max_size / image.width, max_size / image.height)
-                new_size = (int(image.width * ratio), int(image.height * ratio))
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-                logger.debug("Image resized for optimization", 
-                           original=(image.width, image.height),
-                           new=new_size)
+            # Raw bytes are used as-is; base64 only comes from API callers
+            if isinstance(screenshot, str):
+                image_data = base64.b64decode(screenshot)
+            else:
+                image_data = screenshot
+            
+            # Hash the whole image: JPEG frames share their leading header bytes
+            key = (hashlib.blake2b(image_data, digest_size=16).digest(), max_size)
+            image = self._image_cache.get(key)
+            if image is not None:
+                self._image_cache.move_to_end(key)
+                return image
+            
+            image = self._open_image(image_data, dims, already_rgb, max_size)
+            
+            self._image_cache[key] = image
+            while len(self._image_cache) > IMAGE_CACHE_SIZE:
+                self._image_cache.popitem(last=False)
             
             return image
             
         except Exception as e:
-            logger.error("Failed to convert base64 to image", error=str(e))
+            logger.error("Failed to decode screenshot", error=str(e))
             raise
     
+    def _open_image(
+        self,
+        image_data: bytes,
+        dims: Optional[Tuple[int, int]],
+        already_rgb: bool,
+        max_size: int = MAX_IMAGE_SIZE
+    ) -> ImagePart:
+        """
+        Encode image bytes as a JPEG part that fits max_size
+        
+        Args:
+            image_data: Encoded image bytes
+            dims: Known (width, height) of the image, if any
+            already_rgb: Source is known to be an RGB JPEG (our screenshots)
+            max_size: Longest edge of the image part
+        
+        Returns:
+            Image part with JPEG bytes
+        """
+        # Our JPEG screenshot already fits: send its bytes without decoding
+        if already_rgb and dims and max(dims) <= max_size:
+            return {"mime_type": "image/jpeg", "data": image_data}
+        
+        # Convert to PIL Image (only the header is read at this point)
+        image = Image.open(io.BytesIO(image_data))
+        original_size = image.size
+        
+        # Optimize size for Gemini (fewer tiles and upload bytes)
+        ratio = min(max_size / image.width, max_size / image.height)
+        new_size = None
+        if ratio < 1:
+            new_size = (int(image.width * ratio), int(image.height * ratio))
+            
+            # JPEG: let libjpeg downscale by 1/2, 1/4 or 1/8 while decoding
+            # (never below new_size), leaving a much smaller final resize
+            if image.format == 'JPEG':
+                image.draft('RGB', new_size)
+        
+        # Ensure RGB format
+        if not already_rgb and image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        if new_size and image.size != new_size:
+            # Bilinear is plenty for a vision model and much cheaper than Lanczos
+            image = image.resize(new_size, Image.Resampling.BILINEAR)
+            logger.debug("Image resized for optimization", 
+                       original=original_size,
+                       new=new_size)
+        
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=MODEL_IMAGE_QUALITY)
+        return {"mime_type": "image/jpeg", "data": buffer.getvalue()}
+    
     async def analyze_page(
         self,
-        screenshot_base64: str,
+        screenshot: Screenshot,
         markers_map: Dict[int, Dict],
         user_goal: str,
-        action_history: List[Dict] = None,
-        current_url: str = ""
+        action_history: List[Action] = None,
+        current_url: str = "",
+        screenshot_size: Optional[Tuple[int, int]] = None
     ) -> Dict[str, Any]:
         """
         Analyze page screenshot and determine next action
         
         Args:
-            screenshot_base64: Base64 encoded screenshot
+            screenshot: Screenshot as raw image bytes or base64 string
             markers_map: Mapping of marker numbers to elements
             user_goal: User's stated goal
             action_history: List of previous actions
             current_url: Current page URL for context
+            screenshot_size: (width, height) of a JPEG screenshot from
+                BrowserController, if known; skips the decode size checks
         
         Returns:
             Action dictionary with keys: action, target, value, reasoning
@@ -123,25 +392,10 @@ class VisionAnalyzer:
         action_history = action_history or []
         
         try:
-            # Detect page context
-            page_context = ""
-            if current_url:
-                if is_amazon_url(current_url):
-                    page_type = detect_amazon_page_type(current_url)
-                    page_context = f"Amazon {page_type} page"
-                    logger.info("Detected Amazon page", page_type=page_type)
-            
-            logger.info("Analyzing page", 
-                       goal=user_goal,
-                       markers_count=len(markers_map),
-                       history_length=len(action_history),
-                       page_context=page_context)
-            
-            # Convert screenshot to PIL Image
-            image = self._base64_to_image(screenshot_base64)
-            
-            # Create prompt with page context
-            prompt = create_vision_prompt(markers_map, user_goal, action_history, page_context)
+            image, prompt = self._prepare_analysis(
+                screenshot, markers_map, user_goal, action_history, current_url,
+                screenshot_size
+            )
             
             # Retry logic with exponential backoff
             max_retries = 3
@@ -150,10 +404,14 @@ class VisionAnalyzer:
                     # Generate response
                     logger.debug(f"Sending request to Gemini (attempt {attempt + 1})")
                     
-                    response = await self._generate_with_retry(prompt, image)
+                    if self._batcher:
+                        response_text = await self._batcher.submit(prompt, image)
+                    else:
+                        response = await self._generate_with_retry(prompt, image)
+                        response_text = response.text
                     
                     # Parse JSON response
-                    action = parse_gemini_json(response.text)
+                    action = parse_gemini_json(response_text)
                     
                     # Validate action
                     if not validate_action(action):
@@ -173,7 +431,7 @@ class VisionAnalyzer:
                         # Exponential backoff
                         wait_time = 2 ** attempt
                         logger.info(f"Retrying in {wait_time} seconds...")
-                        time.sleep(wait_time)
+                        await asyncio.sleep(wait_time)
                     else:
                         raise
             
@@ -191,21 +449,266 @@ class VisionAnalyzer:
                 "reasoning": f"Error during analysis: {str(e)}"
             }
     
-    async def _generate_with_retry(self, prompt: str, image: Image.Image) -> Any:
+    async def analyze_page_stream(
+        self,
+        screenshot: Screenshot,
+        markers_map: Dict[int, Dict],
+        user_goal: str,
+        action_history: List[Action] = None,
+        current_url: str = "",
+        screenshot_size: Optional[Tuple[int, int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Analyze page screenshot, returning as soon as the action is decided
+        
+        Streams the response and stops reading once the fields needed to
+        execute the action (action, target, and value for "type") are
+        complete, so the trailing reasoning text is not waited for. Falls
+        back to analyze_page if streaming fails.
+        
+        Args:
+            screenshot: Screenshot as raw image bytes or base64 string
+            markers_map: Mapping of marker numbers to elements
+            user_goal: User's stated goal
+            action_history: List of previous actions
+            current_url: Current page URL for context
+            screenshot_size: (width, height) of a JPEG screenshot from
+                BrowserController, if known; skips the decode size checks
+        
+        Returns:
+            Action dictionary with keys: action, target, value, reasoning
+        """
+        action_history = action_history or []
+        
+        if self._batcher:
+            return await self.analyze_page(
+                screenshot, markers_map, user_goal, action_history, current_url,
+                screenshot_size
+            )
+        
+        try:
+            image, prompt = self._prepare_analysis(
+                screenshot, markers_map, user_goal, action_history, current_url,
+                screenshot_size
+            )
+            
+            response = await self.model.generate_content_async([prompt, image], stream=True)
+            
+            response_text = ""
+            action = None
+            chunks = response.__aiter__()
+            try:
+                async for chunk in chunks:
+                    response_text += chunk.text
+                    fields = parse_partial_json_fields(response_text)
+                    
+                    if _is_action_decided(fields):
+                        action = {
+                            "action": fields["action"],
+                            "target": fields.get("target"),
+                            "value": fields.get("value"),
+                            "reasoning": fields.get("reasoning", "")
+                        }
+                        # Stop reading; the rest of the stream is only reasoning text
+                        break
+            finally:
+                # Cancel the remaining generation once the action is decided
+                if action is not None:
+                    await _cancel_stream(response, chunks)
+            
+            if action is None:
+                action = parse_gemini_json(response_text)
+            
+            if not validate_action(action):
+                raise ValueError("Invalid action structure")
+            
+            logger.info("Vision analysis complete (streamed)",
+                       action=action.get('action'),
+                       target=action.get('target'),
+                       response_chars=len(response_text))
+            
+            return action
+            
+        except Exception as e:
+            logger.warning("Streamed analysis failed, retrying without streaming", error=str(e))
+            return await self.analyze_page(
+                screenshot, markers_map, user_goal, action_history, current_url,
+                screenshot_size
+            )
+    
+    async def analyze_all(
+        self,
+        screenshot: Screenshot,
+        markers_map: Dict[int, Dict],
+        user_goal: str,
+        action_history: List[Action] = None,
+        current_url: str = "",
+        screenshot_size: Optional[Tuple[int, int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Decide the next action, detect checkout and extract product info in one call
+        
+        Equivalent to analyze_page, detect_checkout_page and
+        extract_product_info on the same screenshot, but with a single
+        Gemini round trip and image upload.
+        
+        Args:
+            screenshot: Screenshot as raw image bytes or base64 string
+            markers_map: Mapping of marker numbers to elements
+            user_goal: User's stated goal
+            action_history: List of previous actions
+            current_url: Current page URL for context
+            screenshot_size: (width, height) of a JPEG screenshot from
+                BrowserController, if known; skips the decode size checks
+        
+        Returns:
+            Dictionary with keys: action (as from analyze_page), checkout (as
+            from detect_checkout_page) and product (None if not a product page);
+            plus error if the analysis failed and the fallbacks were returned
+        """
+        action_history = action_history or []
+        
+        try:
+            image, prompt = self._prepare_analysis(
+                screenshot, markers_map, user_goal, action_history, current_url,
+                screenshot_size, combined=True
+            )
+            
+            max_retries = 3
+            for attempt in range(max_retries):
+                try:
+                    if self._batcher:
+                        response_text = await self._batcher.submit(prompt, image)
+                    else:
+                        response = await self._generate_with_retry(prompt, image)
+                        response_text = response.text
+                    
+                    result = parse_gemini_json(response_text)
+                    
+                    action = result.get("action")
+                    if not isinstance(action, dict) or not validate_action(action):
+                        raise ValueError("Invalid action structure")
+                    
+                    checkout = result.get("checkout")
+                    if not isinstance(checkout, dict):
+                        checkout = {
+                            "is_checkout": False,
+                            "confidence": 0.0,
+                            "detected_keywords": [],
+                            "total_price": None,
+                            "reasoning": "Not reported by combined analysis"
+                        }
+                    
+                    product = result.get("product")
+                    if not isinstance(product, dict):
+                        product = None
+                    
+                    logger.info("Combined vision analysis complete",
+                               action=action.get('action'),
+                               target=action.get('target'),
+                               is_checkout=checkout.get('is_checkout'),
+                               product=bool(product))
+                    
+                    return {"action": action, "checkout": checkout, "product": product}
+                    
+                except Exception as e:
+                    logger.warning(f"Attempt {attempt + 1} failed", error=str(e))
+                    
+                    if attempt < max_retries - 1:
+                        wait_time = 2 ** attempt
+                        logger.info(f"Retrying in {wait_time} seconds...")
+                        await asyncio.sleep(wait_time)
+                    else:
+                        raise
+            
+            raise Exception("All retry attempts failed")
+            
+        except Exception as e:
+            logger.error("Combined vision analysis failed", error=str(e))
+            
+            return {
+                "action": {
+                    "action": "done",
+                    "target": None,
+                    "value": None,
+                    "reasoning": f"Error during analysis: {str(e)}"
+                },
+                "checkout": {
+                    "is_checkout": False,
+                    "confidence": 0.0,
+                    "detected_keywords": [],
+                    "total_price": None,
+                    "reasoning": f"Detection failed: {str(e)}"
+                },
+                "product": None,
+                "error": str(e)
+            }
+    
+    def _prepare_analysis(
+        self,
+        screenshot: Screenshot,
+        markers_map: Dict[int, Dict],
+        user_goal: str,
+        action_history: List[Action],
+        current_url: str,
+        screenshot_size: Optional[Tuple[int, int]] = None,
+        combined: bool = False
+    ) -> Tuple[ImagePart, str]:
+        """
+        Decode the screenshot and build the analysis prompt
+        
+        Args:
+            screenshot: Screenshot as raw image bytes or base64 string
+            markers_map: Mapping of marker numbers to elements
+            user_goal: User's stated goal
+            action_history: List of previous actions
+            current_url: Current page URL for context
+            screenshot_size: Known (width, height) of a JPEG screenshot
+            combined: Build the combined action/checkout/product prompt
+        
+        Returns:
+            Tuple of (image part, prompt string)
+        """
+        # Detect page context
+        page_context = ""
+        if current_url:
+            if is_amazon_url(current_url):
+                page_type = detect_amazon_page_type(current_url)
+                page_context = f"Amazon {page_type} page"
+                logger.info("Detected Amazon page", page_type=page_type)
+        
+        logger.info("Analyzing page", 
+                   goal=user_goal,
+                   markers_count=len(markers_map),
+                   history_length=len(action_history),
+                   page_context=page_context)
+        
+        # Convert screenshot to the (smaller) image sent to Gemini
+        image = self._decode_screenshot(
+            screenshot,
+            dims=screenshot_size,
+            already_rgb=screenshot_size is not None
+        )
+        
+        # Create prompt with page context
+        build_prompt = create_combined_analysis_prompt if combined else create_vision_prompt
+        prompt = build_prompt(markers_map, user_goal, action_history, page_context)
+        
+        return image, prompt
+    
+    async def _generate_with_retry(self, prompt: str, image: ImagePart) -> Any:
         """
         Generate content with Gemini, handling rate limits
         
         Args:
             prompt: Text prompt
-            image: PIL Image
+            image: JPEG image part
         
         Returns:
             Gemini response object
         """
         try:
             # Use asyncio to make synchronous call non-blocking
-            import asyncio
-            
             response = await asyncio.to_thread(
                 self.model.generate_content,
                 [prompt, image]
@@ -219,15 +722,14 @@ class VisionAnalyzer:
             # Handle specific Gemini errors
             if "ResourceExhausted" in error_str or "429" in error_str:
                 logger.warning("Rate limit hit, waiting before retry")
-                time.sleep(5)
+                await asyncio.sleep(5)
                 raise
             
             elif "InvalidArgument" in error_str:
                 logger.error("Invalid argument (possibly image format issue)")
-                # Try with smaller image
-                smaller_image = image.resize(
-                    (image.width // 2, image.height // 2),
-                    Image.Resampling.LANCZOS
+                # Try with smaller image (re-encoded from the part's JPEG bytes)
+                smaller_image = await asyncio.to_thread(
+                    self._open_image, image["data"], None, True, MAX_IMAGE_SIZE // 2
                 )
                 response = await asyncio.to_thread(
                     self.model.generate_content,
@@ -240,56 +742,39 @@ class VisionAnalyzer:
     
     async def detect_checkout_page(
         self,
-        screenshot_base64: str
+        screenshot: Screenshot
     ) -> Dict[str, Any]:
         """
         Detect if current page is a checkout/purchase page
         
+        Uses the fast checkout model directly (a click is waiting on the
+        result), never the batcher.
+        
         Args:
-            screenshot_base64: Base64 encoded screenshot
+            screenshot: Screenshot as raw image bytes or base64 string
         
         Returns:
-            Dictionary with is_checkout, confidence, and details
+            Dictionary with is_checkout, confidence, and details (plus error
+            if the detection failed)
         """
         try:
             logger.info("Detecting checkout page")
             
-            # Convert screenshot
-            image = self._base64_to_image(screenshot_base64)
+            # Convert screenshot (checkout detection works on a smaller image)
+            image = self._decode_screenshot(screenshot, max_size=CHECKOUT_IMAGE_SIZE)
             
             # Create checkout detection prompt
-            prompt = """You are analyzing a screenshot to determine if this is a checkout or order confirmation page.
-
-Look for these indicators:
-- "Place Order", "Complete Purchase", "Confirm Order" buttons
-- Payment information fields (credit card, billing address)
-- Order summary with total price
-- Shipping information forms
-- "Review Order" or "Checkout" in the page title
-- Cart total or order total displayed prominently
-- Terms and conditions checkboxes near purchase button
-
-Return ONLY valid JSON:
-{
-  "is_checkout": true | false,
-  "confidence": 0.0 to 1.0,
-  "detected_keywords": ["keyword1", "keyword2"],
-  "total_price": "price string" | null,
-  "reasoning": "brief explanation"
-}
-
-Be conservative: only return is_checkout=true if you're confident this is a checkout page.
-"""
+            prompt = create_checkout_detection_prompt()
             
             # Generate response
-            import asyncio
             response = await asyncio.to_thread(
-                self.model.generate_content,
+                self.checkout_model.generate_content,
                 [prompt, image]
             )
+            response_text = response.text
             
             # Parse result
-            result = parse_gemini_json(response.text)
+            result = parse_gemini_json(response_text)
             
             logger.info("Checkout detection complete",
                        is_checkout=result.get('is_checkout'),
@@ -304,18 +789,19 @@ Be conservative: only return is_checkout=true if you're confident this is a chec
                 "confidence": 0.0,
                 "detected_keywords": [],
                 "total_price": None,
-                "reasoning": f"Detection failed: {str(e)}"
+                "reasoning": f"Detection failed: {str(e)}",
+                "error": str(e)
             }
     
     async def extract_product_info(
         self,
-        screenshot_base64: str
+        screenshot: Screenshot
     ) -> Dict[str, Any]:
         """
         Extract product information from a product page
         
         Args:
-            screenshot_base64: Base64 encoded screenshot
+            screenshot: Screenshot as raw image bytes or base64 string
         
         Returns:
             Dictionary with product details
@@ -323,7 +809,7 @@ Be conservative: only return is_checkout=true if you're confident this is a chec
         try:
             logger.info("Extracting product information")
             
-            image = self._base64_to_image(screenshot_base64)
+            image = self._decode_screenshot(screenshot)
             
             prompt = """Analyze this product page and extract key information.
 
@@ -340,7 +826,6 @@ Return ONLY valid JSON:
 Extract only what you can clearly see in the screenshot.
 """
             
-            import asyncio
             response = await asyncio.to_thread(
                 self.model.generate_content,
                 [prompt, image]
@@ -363,13 +848,15 @@ Extract only what you can clearly see in the screenshot.
             }
 
 
-# Singleton instance
-_vision_analyzer: Optional[VisionAnalyzer] = None
+# One analyzer per model; the lock keeps concurrent first calls from each
+# building their own Gemini client
+_vision_analyzers: Dict[str, VisionAnalyzer] = {}
+_vision_analyzers_lock = threading.Lock()
 
 
 def get_vision_analyzer(model_name: str = GEMINI_FLASH) -> VisionAnalyzer:
     """
-    Get or create vision analyzer singleton
+    Get or create the vision analyzer for a model
     
     Args:
         model_name: Gemini model to use
@@ -377,10 +864,14 @@ def get_vision_analyzer(model_name: str = GEMINI_FLASH) -> VisionAnalyzer:
     Returns:
         VisionAnalyzer instance
     """
-    global _vision_analyzer
+    analyzer = _vision_analyzers.get(model_name)
+    if analyzer is not None:
+        return analyzer
     
-    if _vision_analyzer is None:
-        _vision_analyzer = VisionAnalyzer(model_name=model_name)
+    with _vision_analyzers_lock:
+        analyzer = _vision_analyzers.get(model_name)
+        if analyzer is None:
+            analyzer = VisionAnalyzer(model_name=model_name)
+            _vision_analyzers[model_name] = analyzer
     
-    return _vision_analyzer
-
+    return analyzer
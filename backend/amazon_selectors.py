@@ -2,70 +2,90 @@
 Amazon-specific selectors for reliable element detection.
 Provides stable, tested selectors for common Amazon page elements.
 """
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from urllib.parse import urlparse
 import structlog
 
 logger = structlog.get_logger()
 
 
-# Amazon-specific selectors with multiple fallbacks
-AMAZON_SELECTORS = {
-    "search_box": [
+# Amazon-specific selectors with multiple fallbacks (tuples: shared, never copied)
+AMAZON_SELECTORS: Dict[str, Tuple[str, ...]] = {
+    "search_box": (
         "#twotabsearchtextbox",
         "input[name='field-keywords']",
         "input[type='text'][aria-label*='Search']",
         "input#nav-search-keywords",
         "input.nav-input",
-    ],
-    "search_button": [
+    ),
+    "search_button": (
         "#nav-search-submit-button",
         "input[type='submit'][value='Go']",
         "input.nav-input[type='submit']",
         "button[type='submit'][aria-label*='Go']",
         "#nav-search-bar-form input[type='submit']",
-    ],
-    "product_link": [
+    ),
+    "product_link": (
         "h2 a.a-link-normal",
         ".s-result-item h2 a",
         "div[data-component-type='s-search-result'] h2 a",
         "a.s-no-outline",
         ".s-product-image-container a",
-    ],
-    "add_to_cart": [
+    ),
+    "add_to_cart": (
         "#add-to-cart-button",
         "input#add-to-cart-button",
         "button[name='submit.add-to-cart']",
         "#submit.add-to-cart-announce",
-    ],
-    "buy_now": [
+    ),
+    "buy_now": (
         "#buy-now-button",
         "input#buy-now-button",
         "button[name='submit.buy-now']",
-    ],
-    "price": [
+    ),
+    "price": (
         ".a-price-whole",
         "span.a-price",
         ".a-offscreen",
         "#priceblock_ourprice",
         "#priceblock_dealprice",
-    ],
-    "next_page": [
+    ),
+    "next_page": (
         ".s-pagination-next",
         "a:contains('Next')",
         "li.a-last a",
-    ],
-    "filter_options": [
+    ),
+    "filter_options": (
         "#s-refinements a",
         ".a-checkbox",
         "li.a-spacing-micro a",
-    ],
+    ),
 }
 
 
+# Amazon domains (including international); subdomains such as www. also match
+AMAZON_DOMAINS = frozenset({
+    'amazon.com',
+    'amazon.co.uk',
+    'amazon.ca',
+    'amazon.de',
+    'amazon.fr',
+    'amazon.it',
+    'amazon.es',
+    'amazon.in',
+    'amazon.co.jp',
+    'amazon.com.au',
+    'amazon.com.mx',
+    'amazon.com.br',
+})
+_AMAZON_DOMAIN_SUFFIXES = tuple('.' + domain for domain in AMAZON_DOMAINS)
+
+
+@lru_cache(maxsize=1024)
 def is_amazon_url(url: str) -> bool:
     """
-    Check if URL is an Amazon domain
+    Check if URL is an Amazon domain (cached; URLs repeat across iterations)
     
     Args:
         url: URL to check
@@ -73,41 +93,28 @@ def is_amazon_url(url: str) -> bool:
     Returns:
         True if Amazon domain
     """
-    try:
-        parsed = urlparse(url)
-        domain = parsed.netloc.lower()
-        
-        # Check for amazon domains (including international)
-        amazon_domains = [
-            'amazon.com',
-            'amazon.co.uk',
-            'amazon.ca',
-            'amazon.de',
-            'amazon.fr',
-            'amazon.it',
-            'amazon.es',
-            'amazon.in',
-            'amazon.co.jp',
-            'amazon.com.au',
-            'amazon.com.mx',
-            'amazon.com.br',
-        ]
-        
-        # Check if any Amazon domain is in the URL
-        is_amazon = any(domain.endswith(d) or domain == d for d in amazon_domains)
-        
-        logger.debug("Amazon URL check", url=url, is_amazon=is_amazon)
-        
-        return is_amazon
-        
-    except Exception as e:
-        logger.error("Error checking Amazon URL", url=url, error=str(e))
-        return False
+    domain = urlparse(url).hostname or ''
+    return domain in AMAZON_DOMAINS or domain.endswith(_AMAZON_DOMAIN_SUFFIXES)
 
 
+# URL fragment -> page type, checked in order (first match wins)
+_PAGE_TYPE_RULES = (
+    ('/cart', 'cart'),              # also covers /gp/cart/
+    ('/gp/buy/', 'checkout'),
+    ('/checkout', 'checkout'),
+    ('/ap/signin', 'checkout'),
+    ('/dp/', 'product'),
+    ('/gp/product/', 'product'),
+    ('/s?', 'search'),
+    ('field-keywords=', 'search'),
+)
+_HOME_SUFFIXES = ('amazon.com', 'amazon.com/')
+
+
+@lru_cache(maxsize=1024)
 def detect_amazon_page_type(url: str) -> str:
     """
-    Detect the type of Amazon page
+    Detect the type of Amazon page (cached; URLs repeat across iterations)
     
     Args:
         url: Current page URL
@@ -117,21 +124,13 @@ def detect_amazon_page_type(url: str) -> str:
     """
     url_lower = url.lower()
     
-    if '/gp/cart/' in url_lower or '/cart' in url_lower:
-        return 'cart'
-    elif '/gp/buy/' in url_lower or '/checkout' in url_lower or '/ap/signin' in url_lower:
-        return 'checkout'
-    elif '/dp/' in url_lower or '/gp/product/' in url_lower:
-        return 'product'
-    elif '/s?' in url_lower or 'field-keywords=' in url_lower:
-        return 'search'
-    elif url_lower.endswith('amazon.com') or url_lower.endswith('amazon.com/'):
-        return 'home'
-    else:
-        return 'unknown'
-
-
-def get_amazon_element_selectors(element_type: str) -> List[str]:
+    return next(
+        (page_type for fragment, page_type in _PAGE_TYPE_RULES if fragment in url_lower),
+        'home' if url_lower.endswith(_HOME_SUFFIXES) else 'unknown'
+    )
+
+
+def get_amazon_element_selectors(element_type: str) -> Tuple[str, ...]:
     """
     Get Amazon-specific selectors for an element type
     
@@ -139,9 +138,30 @@ def get_amazon_element_selectors(element_type: str) -> List[str]:
         element_type: Type of element (e.g., 'search_box', 'search_button')
     
     Returns:
-        List of CSS selectors to try, in order of preference
+        Tuple of CSS selectors to try, in order of preference
     """
-    return AMAZON_SELECTORS.get(element_type, [])
+    return AMAZON_SELECTORS.get(element_type, ())
+
+
+@lru_cache(maxsize=1024)
+def xpath_quote(value: str) -> str:
+    """
+    Quote a string as an XPath literal (cached; labels repeat across pages)
+    
+    XPath 1.0 has no escape sequences, so a value containing both quote
+    kinds is built with concat().
+    
+    Args:
+        value: Raw string
+    
+    Returns:
+        XPath string literal or concat() expression
+    """
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    return "concat('" + "', \"'\", '".join(value.split("'")) + "')"
 
 
 def build_xpath_selector(element_info: Dict[str, Any]) -> Optional[str]:
@@ -154,44 +174,80 @@ def build_xpath_selector(element_info: Dict[str, Any]) -> Optional[str]:
     Returns:
         XPath selector string or None
     """
+    # Only non-string attribute values can fail here; the rest cannot raise
     try:
-        element_type = element_info.get('type', '').lower()
-        text = element_info.get('text', '').strip()
-        aria_label = element_info.get('aria_label', '').strip()
-        placeholder = element_info.get('placeholder', '').strip()
-        
-        # Build XPath based on available attributes
-        xpath_parts = []
-        
-        # Start with element type
-        xpath = f"//{element_type}"
-        
-        # Add text matching if available (partial match)
-        if text and len(text) < 50:
-            xpath_parts.append(f"contains(text(), '{text[:30]}')")
-        
-        # Add aria-label matching
-        if aria_label:
-            xpath_parts.append(f"@aria-label='{aria_label}'")
-        
-        # Add placeholder matching
-        if placeholder:
-            xpath_parts.append(f"@placeholder='{placeholder}'")
-        
-        # Add name attribute if available
-        if element_info.get('name'):
-            xpath_parts.append(f"@name='{element_info['name']}'")
-        
-        # Combine xpath parts
-        if xpath_parts:
-            xpath += "[" + " or ".join(xpath_parts) + "]"
-            return xpath
-        
-        return None
-        
-    except Exception as e:
+        element_type = (element_info.get('type') or '').lower()
+        text = (element_info.get('text') or '').strip()
+        aria_label = (element_info.get('aria_label') or '').strip()
+        placeholder = (element_info.get('placeholder') or '').strip()
+        name = (element_info.get('name') or '').strip()
+    except (AttributeError, TypeError) as e:
         logger.error("Error building XPath", error=str(e))
         return None
+    
+    # Build XPath based on available attributes
+    xpath_parts = []
+    
+    # Add text matching if available (partial match)
+    if text and len(text) < 50:
+        xpath_parts.append(f"contains(text(), {xpath_quote(text[:30])})")
+    
+    # Add aria-label matching
+    if aria_label:
+        xpath_parts.append(f"@aria-label={xpath_quote(aria_label)}")
+    
+    # Add placeholder matching
+    if placeholder:
+        xpath_parts.append(f"@placeholder={xpath_quote(placeholder)}")
+    
+    # Add name attribute if available
+    if name:
+        xpath_parts.append(f"@name={xpath_quote(name)}")
+    
+    # Start with element type and combine xpath parts
+    if xpath_parts:
+        return f"//{element_type}[" + " or ".join(xpath_parts) + "]"
+    
+    return None
+
+
+# Element attributes used to recognise Amazon elements (compared lowercased)
+_ENHANCE_ATTRS = ('type', 'text', 'aria_label', 'placeholder', 'name', 'selector', 'input_type')
+
+
+def _input_purpose(attrs: Dict[str, str]) -> Optional[str]:
+    """Amazon element type of an <input>, if recognised"""
+    if 'search' in attrs['placeholder'] or 'search' in attrs['aria_label'] or 'field-keywords' in attrs['name']:
+        return 'search_box'
+    if attrs['input_type'] == 'submit' and ('search' in attrs['aria_label'] or 'go' in attrs['text']):
+        return 'search_button'
+    return None
+
+
+def _button_purpose(attrs: Dict[str, str]) -> Optional[str]:
+    """Amazon element type of a <button>, if recognised"""
+    if 'add to cart' in attrs['text'] or 'add-to-cart' in attrs['selector']:
+        return 'add_to_cart'
+    if 'buy now' in attrs['text']:
+        return 'buy_now'
+    if 'search' in attrs['aria_label'] or 'go' in attrs['text']:
+        return 'search_button'
+    return None
+
+
+def _link_purpose(attrs: Dict[str, str]) -> Optional[str]:
+    """Amazon element type of an <a>, if recognised"""
+    if 's-result-item' in attrs['selector']:
+        return 'product_link'
+    return None
+
+
+# Element tag -> function picking its Amazon element type
+_PURPOSE_HANDLERS = {
+    'input': _input_purpose,
+    'button': _button_purpose,
+    'a': _link_purpose,
+}
 
 
 def enhance_element_with_amazon_selectors(
@@ -212,61 +268,52 @@ def enhance_element_with_amazon_selectors(
         return element_info
     
     enhanced = element_info.copy()
-    selectors = [enhanced.get('selector', '')]
+    apply_amazon_selectors(enhanced)
+    return enhanced
+
+
+def apply_amazon_selectors(enhanced: Dict[str, Any]) -> None:
+    """
+    Add Amazon-specific selectors to element info in place
     
-    # Determine element purpose based on its attributes
-    element_type = enhanced.get('type', '').lower()
-    text = enhanced.get('text', '').lower()
-    aria_label = enhanced.get('aria_label', '').lower()
-    placeholder = enhanced.get('placeholder', '').lower()
-    name = enhanced.get('name', '').lower()
+    Same as enhance_element_with_amazon_selectors without the URL check or
+    the copy, for callers that own the dictionaries and already know the
+    page is on Amazon.
     
-    # Match against Amazon element types
-    if element_type == 'input':
-        if 'search' in placeholder or 'search' in aria_label or 'field-keywords' in name:
-            selectors = get_amazon_element_selectors('search_box') + selectors
-        elif enhanced.get('input_type') == 'submit':
-            if 'search' in aria_label or 'go' in text.lower():
-                selectors = get_amazon_element_selectors('search_button') + selectors
+    Args:
+        enhanced: Element information to update
+    """
+    # Lowercase the attributes the purpose checks look at, once
+    attrs = {key: (enhanced.get(key) or '').lower() for key in _ENHANCE_ATTRS}
     
-    elif element_type == 'button':
-        if 'add to cart' in text or 'add-to-cart' in enhanced.get('selector', ''):
-            selectors = get_amazon_element_selectors('add_to_cart') + selectors
-        elif 'buy now' in text:
-            selectors = get_amazon_element_selectors('buy_now') + selectors
-        elif 'search' in aria_label or 'go' in text:
-            selectors = get_amazon_element_selectors('search_button') + selectors
+    # Match against Amazon element types
+    handler = _PURPOSE_HANDLERS.get(attrs['type'])
+    purpose = handler(attrs) if handler else None
+    amazon_selectors = get_amazon_element_selectors(purpose) if purpose else ()
     
-    elif element_type == 'a':
-        if 's-result-item' in enhanced.get('selector', ''):
-            selectors = get_amazon_element_selectors('product_link') + selectors
+    # Amazon selectors first, then the original selector, then XPath as fallback
+    selectors: List[str] = []
+    selectors.extend(amazon_selectors)
+    selectors.append(enhanced.get('selector', ''))
     
-    # Build XPath as additional fallback
     xpath = build_xpath_selector(enhanced)
     if xpath:
         selectors.append(xpath)
     
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_selectors = []
-    for sel in selectors:
-        if sel and sel not in seen:
-            seen.add(sel)
-            unique_selectors.append(sel)
+    # Drop empty entries and duplicates, preserving order
+    unique_selectors = list(dict.fromkeys(filter(None, selectors)))
     
     # Store all selectors
     enhanced['selectors'] = unique_selectors
     enhanced['selector'] = unique_selectors[0] if unique_selectors else enhanced.get('selector', '')
-    
-    return enhanced
 
 
-def get_amazon_search_workflow_selectors() -> Dict[str, List[str]]:
+def get_amazon_search_workflow_selectors() -> Dict[str, Tuple[str, ...]]:
     """
     Get selectors for common Amazon search workflow
     
     Returns:
-        Dict of workflow step -> list of selectors
+        Dict of workflow step -> tuple of selectors
     """
     return {
         "search_input": get_amazon_element_selectors('search_box'),
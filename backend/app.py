@@ -3,38 +3,44 @@ FastAPI application entry point for SmartCart AI E-Commerce Agent.
 Provides REST API and WebSocket endpoints for agent control.
 """
 import asyncio
+import hashlib
 import sys
 from contextlib import asynccontextmanager
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, AsyncIterator, List, Optional
+from urllib.parse import urlsplit, urlunsplit
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel, HttpUrl
+import orjson
 import structlog
 
+try:
+    import msgpack
+except ImportError:
+    # Optional: clients asking for msgpack get JSON frames instead
+    msgpack = None
+
 from config import Config
-from browser_controller import BrowserController
-from vision_utils import inject_markers, remove_markers, format_markers_for_prompt
-from ai_vision import get_vision_analyzer
-from agent_service import get_agent_executor
-
-# Fix for Python 3.13 on Windows - Playwright subprocess issue
-if sys.platform == 'win32':
-    # Set event loop policy to WindowsProactorEventLoopPolicy for subprocess support
-    if sys.version_info >= (3, 13):
-        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-    # For older versions, explicitly set the policy if needed
-    elif not isinstance(asyncio.get_event_loop_policy(), asyncio.WindowsProactorEventLoopPolicy):
-        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-
-# Configure structured logging
-structlog.configure(
-    processors=[
-        structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.add_log_level,
-        structlog.processors.JSONRenderer()
-    ]
+from logging_setup import configure_logging
+from browser_controller import get_browser_pool, encode_screenshot, VIEWPORT
+from vision_utils import (
+    inject_markers,
+    remove_markers,
+    format_markers_for_prompt,
+    markers_fingerprint
 )
+from checkpoint_store import close_checkpoint_store
+from ttl_cache import TTLCache
+from event_loop import install_loop_policy
+
+# Fix for Python 3.13 on Windows - Playwright subprocess issue: use a loop
+# with subprocess support (winloop/uvloop when installed)
+install_loop_policy()
+
+# Configure structured logging (written from a background thread)
+configure_logging()
 
 logger = structlog.get_logger()
 
@@ -59,22 +65,70 @@ class AgentResponse(BaseModel):
     data: Dict[str, Any] = {}
 
 
+# Recent /navigate and /analyze responses; repeats within the TTL skip the
+# browser (and Gemini) entirely. Pass ?refresh=1 to bypass.
+RESPONSE_CACHE_TTL = 30.0
+_navigate_cache = TTLCache(maxsize=128, ttl=RESPONSE_CACHE_TTL)
+_analyze_cache = TTLCache(maxsize=128, ttl=RESPONSE_CACHE_TTL)
+
+# Next actions keyed by page URL, goal and marked-element fingerprint; a
+# page whose interactive elements are unchanged skips the full analysis.
+# Only the action is cached: the fingerprint ignores prices and most text,
+# so checkout state and product details are always taken from a fresh check
+ACTION_CACHE_TTL = RESPONSE_CACHE_TTL
+_action_by_dom = TTLCache(maxsize=256, ttl=ACTION_CACHE_TTL)
+
+
 # Lifespan context manager
+
+
+def _page_cache_key(url: str, *extra: Any) -> str:
+    """
+    Cache key for a page response: normalized URL, viewport and extra parts
+    
+    Args:
+        url: Requested URL
+        extra: Other inputs the response depends on (e.g. the goal)
+    
+    Returns:
+        Hex digest key
+    """
+    parts = urlsplit(url.strip())
+    normalized = urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        parts.path or '/',
+        parts.query,
+        ''
+    ))
+    key = repr((normalized, VIEWPORT['width'], VIEWPORT['height']) + extra)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown logic"""
     # Startup
     logger.info("Starting SmartCart AI Agent API")
+    Config.ensure_dirs()
     try:
         Config.validate()
         logger.info("Configuration validated successfully")
     except ValueError as e:
         logger.error("Configuration validation failed", error=str(e))
     
+    # Launch the shared browser and context now, so the first request doesn't pay for it
+    try:
+        await get_browser_pool().get_shared_context()
+    except Exception as e:
+        logger.error("Failed to launch shared browser", error=str(e))
+    
     yield
     
     # Shutdown
     logger.info("Shutting down SmartCart AI Agent API")
+    await get_browser_pool().close()
+    close_checkpoint_store()
 
 
 # Initialize FastAPI app
@@ -82,7 +136,9 @@ app = FastAPI(
     title="SmartCart AI - E-Commerce Agent API",
     description="AI agent for autonomous e-commerce browsing and shopping",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson for every JSON response (screenshots and markers make them large)
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware for frontend access
@@ -95,15 +151,42 @@ app.add_middleware(
 )
 
 
+# Bodies of the constant endpoints, serialized once. /health and /api/config
+# are keyed on the settings they report, so a changed Config gets a new body.
+_ROOT_BODY = orjson.dumps({
+    "service": "SmartCart AI Agent",
+    "status": "running",
+    "version": "1.0.0"
+})
+
+
+@lru_cache(maxsize=4)
+def _health_body(gemini_configured: bool, debug_mode: bool) -> bytes:
+    """Serialized healthy /health response"""
+    return orjson.dumps({
+        "status": "healthy",
+        "gemini_configured": gemini_configured,
+        "debug_mode": debug_mode
+    })
+
+
+@lru_cache(maxsize=4)
+def _config_body(headless: bool, debug: bool, max_iterations: int,
+                 gemini_configured: bool) -> bytes:
+    """Serialized /api/config response"""
+    return orjson.dumps({
+        "headless": headless,
+        "debug": debug,
+        "max_iterations": max_iterations,
+        "gemini_configured": gemini_configured
+    })
+
+
 # Health check endpoint
 @app.get("/")
 async def root():
     """Root endpoint - health check"""
-    return {
-        "service": "SmartCart AI Agent",
-        "status": "running",
-        "version": "1.0.0"
-    }
+    return Response(content=_ROOT_BODY, media_type="application/json")
 
 
 @app.get("/health")
@@ -111,13 +194,12 @@ async def health_check():
     """Detailed health check"""
     try:
         Config.validate()
-        return {
-            "status": "healthy",
-            "gemini_configured": bool(Config.GOOGLE_API_KEY),
-            "debug_mode": Config.DEBUG
-        }
+        return Response(
+            content=_health_body(bool(Config.GOOGLE_API_KEY), Config.DEBUG),
+            media_type="application/json"
+        )
     except Exception as e:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=503,
             content={
                 "status": "unhealthy",
@@ -140,12 +222,8 @@ async def start_agent(request: StartAgentRequest):
     logger.info("Starting agent", url=request.url, goal=request.goal)
     
     try:
-        # Initialize browser
-        browser = BrowserController(headless=Config.HEADLESS)
-        
-        try:
-            await browser.initialize()
-            
+        # New page in the shared, already warm context
+        async with get_browser_pool().acquire_page() as browser:
             # Navigate to URL
             nav_result = await browser.navigate(request.url)
             
@@ -173,9 +251,6 @@ async def start_agent(request: StartAgentRequest):
                 }
             )
             
-        finally:
-            await browser.close()
-            
     except Exception as e:
         logger.error("Failed to start agent", error=str(e))
         raise HTTPException(
@@ -185,20 +260,28 @@ async def start_agent(request: StartAgentRequest):
 
 
 @app.post("/api/agent/navigate")
-async def navigate_page(request: StartAgentRequest):
+async def navigate_page(request: StartAgentRequest, refresh: bool = False):
     """
     Navigate to a URL and return page info
     
     Args:
         request: Contains URL
+        refresh: Ignore a cached response for the same URL
     
     Returns:
         Page information and screenshot
     """
     logger.info("Navigating to page", url=request.url)
     
+    cache_key = _page_cache_key(request.url)
+    if not refresh:
+        cached = _navigate_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Using cached navigation", url=request.url)
+            return cached
+    
     try:
-        async with BrowserController(headless=Config.HEADLESS) as browser:
+        async with get_browser_pool().acquire_page() as browser:
             # Navigate
             nav_result = await browser.navigate(request.url)
             
@@ -211,12 +294,15 @@ async def navigate_page(request: StartAgentRequest):
             # Take screenshot
             screenshot = await browser.take_screenshot()
             
-            return {
+            result = {
                 "status": "success",
                 "url": nav_result["url"],
                 "title": nav_result["title"],
                 "screenshot": screenshot
             }
+            _navigate_cache.set(cache_key, result)
+            
+            return result
             
     except Exception as e:
         logger.error("Navigation failed", error=str(e))
@@ -227,20 +313,28 @@ async def navigate_page(request: StartAgentRequest):
 
 
 @app.post("/api/agent/analyze")
-async def analyze_page(request: AnalyzePageRequest):
+async def analyze_page(request: AnalyzePageRequest, refresh: bool = False):
     """
     Analyze a page with vision AI to determine next action
     
     Args:
         request: Contains URL and goal
+        refresh: Ignore a cached analysis for the same URL and goal
     
     Returns:
         Analysis result with suggested action, screenshot, and markers
     """
     logger.info("Analyzing page", url=request.url, goal=request.goal)
     
+    cache_key = _page_cache_key(request.url, request.goal)
+    if not refresh:
+        cached = _analyze_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Using cached analysis", url=request.url)
+            return cached
+    
     try:
-        async with BrowserController(headless=Config.HEADLESS) as browser:
+        async with get_browser_pool().acquire_page() as browser:
             # Navigate to URL
             nav_result = await browser.navigate(request.url)
             
@@ -253,34 +347,66 @@ async def analyze_page(request: AnalyzePageRequest):
             # Inject markers
             markers_map = await inject_markers(browser.page)
             
-            # Take screenshot with markers
-            screenshot = await browser.take_screenshot()
+            # Take screenshot with markers (raw bytes for Gemini; base64 only
+            # for the response)
+            screenshot_bytes = await browser.take_screenshot_bytes()
             
-            # Analyze with Gemini
+            dom_key = _page_cache_key(nav_result["url"], request.goal,
+                                      markers_fingerprint(markers_map))
+            cached_action = None if refresh else _action_by_dom.get(dom_key)
+            
+            # Imported on first use: pulls in the Gemini SDK
+            from ai_vision import get_vision_analyzer
             vision_analyzer = get_vision_analyzer()
-            action = await vision_analyzer.analyze_page(
-                screenshot_base64=screenshot,
-                markers_map=markers_map,
-                user_goal=request.goal,
-                action_history=[]
-            )
             
-            # Remove markers
-            await remove_markers(browser.page)
+            if cached_action is not None:
+                # Reuse the action, but check the current screenshot for
+                # checkout and product details (markers come off meanwhile)
+                action, was_product_page = cached_action
+                logger.debug("Using cached action for unchanged page", url=nav_result["url"])
+                checkout, product, _ = await asyncio.gather(
+                    vision_analyzer.detect_checkout_page(screenshot_bytes),
+                    vision_analyzer.extract_product_info(screenshot_bytes)
+                    if was_product_page else asyncio.sleep(0),
+                    remove_markers(browser.page)
+                )
+                analysis = {"action": action, "checkout": checkout, "product": product}
+            else:
+                # Analyze with Gemini, removing the markers while it runs (the
+                # screenshot already has them)
+                analysis, _ = await asyncio.gather(
+                    vision_analyzer.analyze_all(
+                        screenshot=screenshot_bytes,
+                        markers_map=markers_map,
+                        user_goal=request.goal,
+                        action_history=[],
+                        current_url=nav_result["url"],
+                        screenshot_size=browser.screenshot_size
+                    ),
+                    remove_markers(browser.page)
+                )
+                if "error" not in analysis:
+                    _action_by_dom.set(dom_key, (analysis["action"], analysis["product"] is not None))
+            action = analysis["action"]
             
             logger.info("Page analysis complete",
                        action=action.get('action'),
                        target=action.get('target'))
             
-            return {
+            result = {
                 "status": "success",
                 "url": nav_result["url"],
                 "title": nav_result["title"],
                 "action": action,
-                "screenshot": screenshot,
+                "checkout": analysis["checkout"],
+                "product": analysis["product"],
+                "screenshot": await encode_screenshot(screenshot_bytes),
                 "markers": markers_map,
                 "markers_formatted": format_markers_for_prompt(markers_map)
             }
+            _analyze_cache.set(cache_key, result)
+            
+            return result
             
     except Exception as e:
         logger.error("Page analysis failed", error=str(e))
@@ -290,15 +416,42 @@ async def analyze_page(request: AnalyzePageRequest):
         )
 
 
+@app.get("/api/agent/{session_id}/screenshot")
+async def get_session_screenshot(session_id: str):
+    """
+    Latest screenshot of an agent session as a JPEG image
+    
+    Args:
+        session_id: Agent session
+    
+    Returns:
+        image/jpeg response
+    """
+    from agent_service import get_agent_executor
+    
+    session = get_agent_executor().get_session(session_id)
+    if not session or not session.state or not session.state.screenshot_bytes:
+        raise HTTPException(status_code=404, detail="No screenshot for this session")
+    
+    return Response(content=session.state.screenshot_bytes, media_type="image/jpeg")
+
+
 @app.get("/api/config")
 async def get_config():
     """Get public configuration information"""
-    return {
-        "headless": Config.HEADLESS,
-        "debug": Config.DEBUG,
-        "max_iterations": Config.MAX_ITERATIONS,
-        "gemini_configured": bool(Config.GOOGLE_API_KEY)
-    }
+    body = _config_body(
+        Config.HEADLESS,
+        Config.DEBUG,
+        Config.MAX_ITERATIONS,
+        bool(Config.GOOGLE_API_KEY)
+    )
+    return Response(content=body, media_type="application/json")
+
+
+def _dumps(message: Any) -> str:
+    """Encode a WebSocket message with orjson (text frames; binary frames carry screenshots)"""
+    # Non-str keys (e.g. marker numbers) become strings, as with the json module
+    return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
 
 
 # WebSocket connection manager
@@ -307,6 +460,8 @@ class ConnectionManager:
     
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
+        # Sessions whose client asked for msgpack frames
+        self.msgpack_sessions: set = set()
     
     async def connect(self, session_id: str, websocket: WebSocket):
         """Accept and store WebSocket connection"""
@@ -316,34 +471,170 @@ class ConnectionManager:
     
     def disconnect(self, session_id: str):
         """Remove WebSocket connection"""
+        self.msgpack_sessions.discard(session_id)
         if session_id in self.active_connections:
             del self.active_connections[session_id]
             logger.info("WebSocket disconnected", session_id=session_id)
     
+    def set_protocol(self, session_id: str, proto: Optional[str]) -> None:
+        """
+        Choose the wire format requested by a client
+        
+        Args:
+            session_id: Session identifier
+            proto: "msgpack" for binary msgpack frames; anything else (or
+                msgpack not installed) keeps JSON text frames
+        """
+        if proto == "msgpack" and msgpack is not None:
+            self.msgpack_sessions.add(session_id)
+            logger.info("Using msgpack frames", session_id=session_id)
+    
     async def send_message(self, session_id: str, message: dict):
-        """Send message to specific session"""
+        """
+        Send message to specific session
+        
+        A screenshot attached under "frame" goes out as a binary frame
+        (raw JPEG) right after the JSON message it belongs to. msgpack
+        clients get one binary frame with the screenshot embedded as bin.
+        """
         if session_id in self.active_connections:
             try:
-                await self.active_connections[session_id].send_json(message)
+                websocket = self.active_connections[session_id]
+                if session_id in self.msgpack_sessions:
+                    await websocket.send_bytes(msgpack.packb(message, use_bin_type=True))
+                    return
+                
+                frame = message.get("frame")
+                if frame is not None:
+                    message = {k: v for k, v in message.items() if k != "frame"}
+                
+                await websocket.send_text(_dumps(message))
+                
+                if frame is not None:
+                    await websocket.send_bytes(frame)
             except Exception as e:
                 logger.error("Failed to send message", 
                            session_id=session_id, 
                            error=str(e))
     
+    async def send_batched(self, session_id: str, messages: List[dict]):
+        """
+        Send several messages to a session as one JSON array frame
+        
+        Only the newest attached screenshot is sent (as a binary frame after
+        the array); earlier ones in the batch would be replaced at once.
+        Raises if the send fails, so the caller can stop streaming. msgpack
+        clients get the array as one msgpack frame, screenshots included.
+        """
+        websocket = self.active_connections.get(session_id)
+        if websocket is None:
+            return
+        
+        if session_id in self.msgpack_sessions:
+            await websocket.send_bytes(msgpack.packb(messages, use_bin_type=True))
+            return
+        
+        frame = None
+        payload = []
+        for message in messages:
+            if message.get("frame") is not None:
+                frame = message["frame"]
+                message = {k: v for k, v in message.items() if k != "frame"}
+            payload.append(message)
+        
+        await websocket.send_text(_dumps(payload))
+        
+        if frame is not None:
+            await websocket.send_bytes(frame)
+    
     async def broadcast(self, message: dict):
-        """Broadcast message to all connected clients"""
-        for session_id, connection in self.active_connections.items():
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error("Failed to broadcast", 
-                           session_id=session_id, 
-                           error=str(e))
+        """Broadcast message to all connected clients (in each one's format)"""
+        for session_id in list(self.active_connections):
+            await self.send_message(session_id, message)
 
 
 manager = ConnectionManager()
 
 
+# Updates arriving within BATCH_WINDOW of the first are sent together
+BATCH_WINDOW = 0.02
+BATCH_MAX_MESSAGES = 8
+
+# Updates buffered for a slow client before state deltas are coalesced
+UPDATE_QUEUE_SIZE = 64
+
+
+def _merge_state_deltas(earlier: Dict[str, Any], later: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fold two consecutive state_delta events into one
+    
+    Later fields win, messages from both are kept in order, and the newest
+    screenshot frame (with its hash) is kept.
+    
+    Args:
+        earlier: First state_delta event
+        later: State_delta event that followed it
+    
+    Returns:
+        Combined state_delta event
+    """
+    delta = {**earlier["delta"], **later["delta"]}
+    messages = earlier["delta"].get("messages", []) + later["delta"].get("messages", [])
+    if messages:
+        delta["messages"] = messages
+    
+    merged = {"type": "state_delta", "node": later["node"], "delta": delta}
+    frame = later.get("frame", earlier.get("frame"))
+    if frame is not None:
+        merged["frame"] = frame
+    
+    return merged
+
+
+async def _batch_updates(updates: asyncio.Queue) -> AsyncIterator[List[dict]]:
+    """
+    Group queued updates into batches until a None sentinel arrives
+    
+    A batch is cut when BATCH_MAX_MESSAGES are collected or BATCH_WINDOW
+    has passed since its first update, so a lone update is never held
+    back for long.
+    
+    Args:
+        updates: Queue of update dicts, ending with None
+    
+    Yields:
+        Lists of updates
+    """
+    loop = asyncio.get_running_loop()
+    
+    while True:
+        first = await updates.get()
+        if first is None:
+            return
+        
+        batch = [first]
+        deadline = loop.time() + BATCH_WINDOW
+        done = False
+        
+        while len(batch) < BATCH_MAX_MESSAGES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                update = await asyncio.wait_for(updates.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if update is None:
+                done = True
+                break
+            batch.append(update)
+        
+        yield batch
+        
+        if done:
+            return
+
+
 @app.websocket("/ws/agent/{session_id}")
 async def websocket_agent(websocket: WebSocket, session_id: str):
     """
@@ -353,25 +644,25 @@ async def websocket_agent(websocket: WebSocket, session_id: str):
         websocket: WebSocket connection
         session_id: Unique session identifier
     """
-    # CRITICAL FIX: Ensure Windows event loop policy is set for this async context
-    if sys.platform == 'win32':
-        try:
-            loop = asyncio.get_event_loop()
-            if not isinstance(loop, asyncio.ProactorEventLoop):
-                asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-        except Exception:
-            pass
+    # CRITICAL FIX: Ensure the event loop policy is set for this async context
+    install_loop_policy()
+    
+    # Imported on first use: pulls in LangGraph, LangChain and the Gemini SDK
+    from agent_service import get_agent_executor
     
     await manager.connect(session_id, websocket)
     
     try:
         # Wait for start_mission message
-        data = await websocket.receive_json()
+        data = orjson.loads(await websocket.receive_text())
         
         logger.info("Received WebSocket message", 
                    session_id=session_id,
                    type=data.get("type"))
         
+        # Clients may ask for msgpack frames in their first message
+        manager.set_protocol(session_id, data.get("proto"))
+        
         if data.get("type") == "start_mission":
             user_goal = data.get("goal", "")
             initial_url = data.get("url", "")
@@ -393,15 +684,49 @@ async def websocket_agent(websocket: WebSocket, session_id: str):
                 session_id=session_id
             )
             
-            # Execute mission and stream updates
-            async for update in executor.execute_mission(session_id):
+            # Execute mission in its own task; updates produced close together
+            # are sent as one batch. The queue is bounded so a slow client
+            # never stalls the agent: once it is full, state deltas are folded
+            # together until there is room, while other events still wait
+            updates: asyncio.Queue = asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE)
+            
+            async def produce() -> None:
+                pending = None
                 try:
-                    await manager.send_message(session_id, update)
+                    async for update in executor.execute_mission(session_id):
+                        if update.get("type") == "state_delta":
+                            if pending is not None:
+                                update = _merge_state_deltas(pending, update)
+                            try:
+                                updates.put_nowait(update)
+                                pending = None
+                            except asyncio.QueueFull:
+                                pending = update
+                            continue
+                        
+                        if pending is not None:
+                            await updates.put(pending)
+                            pending = None
+                        await updates.put(update)
+                    
+                    if pending is not None:
+                        await updates.put(pending)
                 except Exception as e:
-                    logger.error("Failed to send update", 
-                               session_id=session_id,
-                               error=str(e))
-                    break
+                    logger.error("Mission failed", session_id=session_id, error=str(e))
+                
+                await updates.put(None)
+            
+            producer = asyncio.create_task(produce())
+            try:
+                async for batch in _batch_updates(updates):
+                    await manager.send_batched(session_id, batch)
+            except Exception as e:
+                logger.error("Failed to send update", 
+                           session_id=session_id,
+                           error=str(e))
+            finally:
+                # Stops the mission (and closes its browser) if sending failed
+                producer.cancel()
         
         elif data.get("type") == "cancel":
             executor = get_agent_executor()
@@ -436,8 +761,7 @@ if __name__ == "__main__":
     import uvicorn
     
     # CRITICAL: Set event loop policy BEFORE uvicorn creates its loop
-    if sys.platform == 'win32':
-        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    install_loop_policy()
     
     # CRITICAL: Disable reload on Windows - the reloader creates subprocesses that don't inherit event loop policy
     # This causes Playwright subprocess creation to fail with NotImplementedError
@@ -450,6 +774,9 @@ if __name__ == "__main__":
         host=Config.HOST,
         port=Config.PORT,
         reload=use_reload,
-        loop="asyncio"  # Use asyncio loop (which will use our policy)
+        # Reload runs a single process
+        workers=1 if use_reload else Config.WORKERS,
+        # Keep our policy (winloop/uvloop/Proactor) instead of uvicorn's choice
+        loop="none"
     )
 
@@ -3,85 +3,251 @@ Browser Controller using Playwright for web automation.
 Provides high-level interface for browser navigation, screenshots, and interactions.
 """
 import asyncio
-import sys
 import base64
-from typing import Optional, Dict, Any
-from playwright.async_api import async_playwright, Browser, Page, BrowserContext
+import io
+import re
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Optional, Dict, Any, AsyncIterator, Tuple
+from urllib.parse import urlsplit
+from playwright.async_api import async_playwright, Browser, Page, BrowserContext, Route
+from PIL import Image
 import structlog
 from config import Config
-from amazon_selectors import is_amazon_url
+from amazon_selectors import is_amazon_url, AMAZON_DOMAINS
+from event_loop import install_loop_policy
+from vision_utils import register_page_scripts, get_page_signature, wait_for_page_change
 
-# CRITICAL FIX: Set event loop policy for Windows before ANY async operations
-if sys.platform == 'win32':
-    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+# CRITICAL FIX: Set event loop policy before ANY async operations
+install_loop_policy()
 
 logger = structlog.get_logger()
 
+# Screenshots are JPEG, capped for the UI (the vision analyzer sends Gemini
+# a smaller copy, see ai_vision.MAX_IMAGE_SIZE)
+SCREENSHOT_QUALITY = 80
+SCREENSHOT_MAX_SIZE = 1024
+
+# Screenshots up to this size are base64 encoded inline; larger ones in a thread
+BASE64_INLINE_LIMIT = 256 * 1024
+
+# Scrolls, then resolves once the browser has painted the scrolled content
+# (two frames); one round-trip for both
+SCROLL_SCRIPT = "amount => { window.scrollBy(0, amount); return new Promise(resolve => requestAnimationFrame(() => requestAnimationFrame(resolve))); }"
+
+# Document URL and title in one round-trip
+PAGE_INFO_SCRIPT = "() => ({url: location.href, title: document.title})"
+
+# Keystroke delay when text has to be typed key by key (milliseconds)
+TYPING_DELAY = 20
+
+# Bare Amazon host at the start of a URL (www. is added when normalizing)
+_AMAZON_BARE_HOST_RE = re.compile(r'^(https?://)amazon\.', re.IGNORECASE)
+
+# Navigation wait strategy per site: host (subdomains included) ->
+# (wait_until, timeout in ms or None for Config.BROWSER_TIMEOUT). Sites with
+# continuous background traffic never reach networkidle.
+NAV_PROFILES: Dict[str, Tuple[str, Optional[int]]] = {
+    **{domain: ('domcontentloaded', 60000) for domain in AMAZON_DOMAINS},
+    'ebay.com': ('load', None),
+    'walmart.com': ('domcontentloaded', None),
+    'target.com': ('domcontentloaded', None),
+}
+DEFAULT_NAV_PROFILE: Tuple[str, Optional[int]] = ('networkidle', None)
+
+
+@lru_cache(maxsize=256)
+def _nav_profile(host: str) -> Tuple[str, Optional[int]]:
+    """Find the navigation profile for a host, trying parent domains too"""
+    while host:
+        profile = NAV_PROFILES.get(host)
+        if profile is not None:
+            return profile
+        _, _, host = host.partition('.')
+    return DEFAULT_NAV_PROFILE
+
+
+# Page viewport for every context (CSS pixels)
+VIEWPORT = {'width': 1280, 'height': 720}
+
+# Resource types aborted when asset blocking is on. Images and stylesheets
+# are kept because the agent reasons over screenshots.
+BLOCKED_RESOURCE_TYPES = frozenset({'font', 'media'})
+
+# Analytics/ad hosts aborted when asset blocking is on (subdomains included)
+BLOCKED_HOSTS = frozenset({
+    'google-analytics.com',
+    'googletagmanager.com',
+    'googlesyndication.com',
+    'doubleclick.net',
+    'facebook.net',
+    'connect.facebook.net',
+    'hotjar.com',
+    'segment.io',
+    'amazon-adsystem.com',
+    'scorecardresearch.com',
+})
+
+
+def _is_blocked_host(url: str) -> bool:
+    """Check whether a request URL belongs to a blocked tracker host"""
+    host = urlsplit(url).hostname or ''
+    while host:
+        if host in BLOCKED_HOSTS:
+            return True
+        _, _, host = host.partition('.')
+    return False
+
+
+async def _block_assets(route: Route) -> None:
+    """Route handler that aborts fonts, media and tracker requests"""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or _is_blocked_host(request.url):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+def _downscale_jpeg(image_data: bytes, max_size: int,
+                    quality: int) -> Tuple[bytes, Tuple[int, int]]:
+    """Shrink a JPEG so its longest edge is at most max_size (no-op if it fits)"""
+    image = Image.open(io.BytesIO(image_data))
+    if image.width <= max_size and image.height <= max_size:
+        return image_data, image.size
+    
+    image.thumbnail((max_size, max_size))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality, optimize=True)
+    return buffer.getvalue(), image.size
+
+
+async def encode_screenshot(screenshot_bytes: bytes) -> str:
+    """
+    Base64 encode a screenshot for a JSON response
+    
+    Large images (e.g. full page captures) are encoded in a worker thread so
+    the event loop keeps serving other sessions.
+    
+    Args:
+        screenshot_bytes: Image bytes
+    
+    Returns:
+        Base64 string
+    """
+    if len(screenshot_bytes) < BASE64_INLINE_LIMIT:
+        return base64.b64encode(screenshot_bytes).decode('ascii')
+    return await asyncio.to_thread(lambda: base64.b64encode(screenshot_bytes).decode('ascii'))
+
+
+def _ensure_windows_loop_policy() -> None:
+    """Re-check the loop policy right before Playwright spawns Chromium"""
+    try:
+        install_loop_policy()
+    except Exception:
+        pass
+
+
+async def _launch_browser(playwright, headless: bool) -> Browser:
+    """Launch Chromium with the agent's browser flags"""
+    return await playwright.chromium.launch(
+        headless=headless,
+        args=[
+            '--no-sandbox',
+            '--disable-setuid-sandbox',
+            '--disable-dev-shm-usage',
+            '--disable-blink-features=AutomationControlled'
+        ]
+    )
+
+
+async def _new_context(browser: Browser, use_persistent_context: bool,
+                       block_assets: bool) -> BrowserContext:
+    """Create a browser context with the agent's viewport, user agent and routing"""
+    context_options = {
+        'viewport': VIEWPORT,
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'java_script_enabled': True,
+    }
+    
+    if use_persistent_context:
+        # Load saved context if available
+        storage_path = f"{Config.BROWSER_CONTEXTS_DIR}/default_state.json"
+        try:
+            context_options['storage_state'] = storage_path
+            logger.info("Loading persistent context", path=storage_path)
+        except Exception as e:
+            logger.warning("Could not load persistent context", error=str(e))
+    
+    context = await browser.new_context(**context_options)
+    await register_page_scripts(context)
+    
+    if block_assets:
+        await context.route("**/*", _block_assets)
+    
+    return context
+
 
 class BrowserController:
     """Manages browser lifecycle and provides automation methods"""
     
-    def __init__(self, headless: bool = True, use_persistent_context: bool = False):
+    def __init__(
+        self,
+        headless: bool = True,
+        use_persistent_context: bool = False,
+        browser: Optional[Browser] = None,
+        block_assets: bool = False,
+        context: Optional[BrowserContext] = None
+    ):
         """
         Initialize browser controller
         
         Args:
             headless: Run browser in headless mode
             use_persistent_context: Use saved browser context with cookies/auth
+            browser: Already running browser to open the context in (e.g. from
+                BrowserPool); it is left running on close()
+            block_assets: Abort font, media and tracker requests (images and
+                stylesheets still load); disables the context's HTTP cache and
+                routes every request through Python, so it only pays off on
+                pages heavy with blocked assets
+            context: Already open context to create the page in (e.g. the
+                pool's shared context); only the page is closed on close()
         """
         self.headless = headless
         self.use_persistent_context = use_persistent_context
+        self.block_assets = block_assets
         self.playwright = None
-        self.browser: Optional[Browser] = None
-        self.context: Optional[BrowserContext] = None
+        self.browser: Optional[Browser] = browser
+        self.context: Optional[BrowserContext] = context
         self.page: Optional[Page] = None
+        self._owns_browser = browser is None and context is None
+        self._owns_context = context is None
         self._initialized = False
+        # (width, height) of the last screenshot, when known
+        self.screenshot_size: Optional[Tuple[int, int]] = None
     
     async def initialize(self) -> None:
-        """Launch browser and create context"""
+        """Launch browser (unless shared) and create context"""
         if self._initialized:
             logger.warning("Browser already initialized")
             return
         
-        # CRITICAL: Force set event loop policy RIGHT BEFORE browser launch
-        if sys.platform == 'win32':
-            try:
-                asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-            except Exception:
-                pass
-        
         try:
-            logger.info("Launching browser", headless=self.headless)
-            self.playwright = await async_playwright().start()
-            
-            # Launch Chromium browser
-            self.browser = await self.playwright.chromium.launch(
-                headless=self.headless,
-                args=[
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-blink-features=AutomationControlled'
-                ]
-            )
-            
-            # Create browser context
-            context_options = {
-                'viewport': {'width': 1280, 'height': 720},
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'java_script_enabled': True,
-            }
-            
-            if self.use_persistent_context:
-                # Load saved context if available
-                storage_path = f"{Config.BROWSER_CONTEXTS_DIR}/default_state.json"
-                try:
-                    context_options['storage_state'] = storage_path
-                    logger.info("Loading persistent context", path=storage_path)
-                except Exception as e:
-                    logger.warning("Could not load persistent context", error=str(e))
+            if self._owns_browser:
+                # CRITICAL: Force set event loop policy RIGHT BEFORE browser launch
+                _ensure_windows_loop_policy()
+                
+                logger.info("Launching browser", headless=self.headless)
+                self.playwright = await async_playwright().start()
+                
+                # Launch Chromium browser
+                self.browser = await _launch_browser(self.playwright, self.headless)
             
-            self.context = await self.browser.new_context(**context_options)
+            # Create browser context (unless a shared one was given)
+            if self.context is None:
+                self.context = await _new_context(
+                    self.browser, self.use_persistent_context, self.block_assets
+                )
             
             # Create a new page
             self.page = await self.context.new_page()
@@ -105,7 +271,8 @@ class BrowserController:
             url: Target URL
             wait_until: When to consider navigation complete
                        Options: 'load', 'domcontentloaded', 'networkidle'
-                       If None, auto-detects based on URL (Amazon uses 'domcontentloaded')
+                       If None, taken from the site's NAV_PROFILES entry
+                       (e.g. Amazon uses 'domcontentloaded')
         
         Returns:
             Dict with status and URL info
@@ -114,39 +281,30 @@ class BrowserController:
             raise RuntimeError("Browser not initialized. Call initialize() first.")
         
         try:
-            # Auto-detect wait strategy for Amazon (never reaches networkidle)
+            is_amazon = is_amazon_url(url)
+            
+            # Per-site wait strategy, unless the caller chose one
+            timeout = Config.BROWSER_TIMEOUT
             if wait_until is None:
-                if is_amazon_url(url):
-                    wait_until = "domcontentloaded"  # Amazon has continuous network activity
-                    timeout = 60000  # 60 seconds for Amazon
-                    logger.info("Using Amazon-optimized navigation strategy", url=url)
-                else:
-                    wait_until = "networkidle"
-                    timeout = Config.BROWSER_TIMEOUT
-            else:
-                timeout = Config.BROWSER_TIMEOUT
+                wait_until, profile_timeout = _nav_profile(urlsplit(url).hostname or '')
+                timeout = profile_timeout or timeout
             
             # Normalize Amazon URLs (add www if missing)
             normalized_url = url
-            if is_amazon_url(url) and "www." not in url.lower():
-                # Handle both http:// and https://
-                if "https://amazon.com" in url.lower():
-                    normalized_url = url.replace("amazon.com", "www.amazon.com")
-                elif "http://amazon.com" in url.lower():
-                    normalized_url = url.replace("amazon.com", "www.amazon.com")
-                logger.info("Normalized Amazon URL", original=url, normalized=normalized_url)
+            if is_amazon:
+                normalized_url = _AMAZON_BARE_HOST_RE.sub(r'\1www.amazon.', url, count=1)
+                if normalized_url != url:
+                    logger.info("Normalized Amazon URL", original=url, normalized=normalized_url)
             
             logger.info("Navigating to URL", url=normalized_url, wait_until=wait_until, timeout=timeout)
             
             # Navigate to URL with appropriate timeout
             response = await self.page.goto(normalized_url, wait_until=wait_until, timeout=timeout)
             
-            # Wait a bit for dynamic content (longer for Amazon)
-            wait_time = 2 if is_amazon_url(url) else 1
-            await asyncio.sleep(wait_time)
-            
-            current_url = self.page.url
-            title = await self.page.title()
+            # goto() has already waited for wait_until; no extra settle delay
+            page_info = await self.page.evaluate(PAGE_INFO_SCRIPT)
+            current_url = page_info["url"]
+            title = page_info["title"]
             
             logger.info("Navigation complete", 
                        url=current_url, 
@@ -178,25 +336,49 @@ class BrowserController:
         Returns:
             Base64 encoded screenshot string
         """
+        screenshot_bytes = await self.take_screenshot_bytes(full_page=full_page)
+        return await encode_screenshot(screenshot_bytes)
+    
+    async def take_screenshot_bytes(
+        self,
+        full_page: bool = False,
+        max_size: Optional[int] = SCREENSHOT_MAX_SIZE
+    ) -> bytes:
+        """
+        Take a screenshot of the current page as raw image bytes
+        
+        Args:
+            full_page: Capture full scrollable page (default: visible viewport only)
+            max_size: Longest edge in pixels (None keeps the captured size)
+        
+        Returns:
+            JPEG image bytes
+        """
         if not self._initialized or not self.page:
             raise RuntimeError("Browser not initialized. Call initialize() first.")
         
         try:
             logger.debug("Taking screenshot", full_page=full_page)
             
-            # Take screenshot as bytes
+            # Take screenshot as bytes (CSS pixels, so HiDPI doesn't double it)
             screenshot_bytes = await self.page.screenshot(
                 full_page=full_page,
-                type='png'
+                type='jpeg',
+                quality=SCREENSHOT_QUALITY,
+                scale='css'
             )
             
-            # Encode to base64
-            screenshot_base64 = base64.b64encode(screenshot_bytes).decode('utf-8')
+            if max_size:
+                screenshot_bytes, self.screenshot_size = await asyncio.to_thread(
+                    _downscale_jpeg, screenshot_bytes, max_size, SCREENSHOT_QUALITY
+                )
+            else:
+                self.screenshot_size = None
             
             logger.debug("Screenshot captured", 
                         size_bytes=len(screenshot_bytes))
             
-            return screenshot_base64
+            return screenshot_bytes
             
         except Exception as e:
             logger.error("Screenshot failed", error=str(e))
@@ -218,8 +400,17 @@ class BrowserController:
         
         try:
             logger.info("Clicking element", selector=selector)
+            try:
+                before = (await get_page_signature(self.page))["signature"]
+            except Exception:
+                before = None
+            
             await self.page.click(selector, timeout=timeout or Config.BROWSER_TIMEOUT)
-            await asyncio.sleep(0.5)  # Wait for page response
+            
+            # Let the navigation or DOM update triggered by the click happen
+            if before is not None:
+                await wait_for_page_change(self.page, before, timeout=1000)
+            
             return True
         except Exception as e:
             logger.error("Click failed", selector=selector, error=str(e))
@@ -248,14 +439,36 @@ class BrowserController:
             logger.error("Fill failed", selector=selector, error=str(e))
             return False
     
-    async def type_text(self, selector: str, text: str, delay: int = 100) -> bool:
+    async def enter_text(self, selector: str, text: str, fast: bool = True,
+                         delay: int = TYPING_DELAY) -> None:
+        """
+        Replace an input's value with text (raises on failure)
+        
+        Args:
+            selector: CSS selector for input element
+            text: Text to enter
+            fast: Set the value in one step with fill() (fires the input
+                event); otherwise type it key by key for sites that need
+                real keystrokes
+            delay: Delay between keystrokes in milliseconds (slow path only)
+        """
+        if fast:
+            await self.page.fill(selector, text)
+        else:
+            await self.page.focus(selector)
+            await self.page.fill(selector, "")
+            await self.page.type(selector, text, delay=delay)
+    
+    async def type_text(self, selector: str, text: str, fast: bool = True,
+                        delay: int = TYPING_DELAY) -> bool:
         """
-        Type text character by character (simulates human typing)
+        Enter text into an input (instant by default, see enter_text)
         
         Args:
             selector: CSS selector for input element
             text: Text to type
-            delay: Delay between keystrokes in milliseconds
+            fast: Fill the value at once instead of typing key by key
+            delay: Delay between keystrokes in milliseconds (slow path only)
         
         Returns:
             True if successful
@@ -264,8 +477,8 @@ class BrowserController:
             raise RuntimeError("Browser not initialized")
         
         try:
-            logger.info("Typing text", selector=selector, text_length=len(text))
-            await self.page.type(selector, text, delay=delay)
+            logger.info("Typing text", selector=selector, text_length=len(text), fast=fast)
+            await self.enter_text(selector, text, fast=fast, delay=delay)
             return True
         except Exception as e:
             logger.error("Type failed", selector=selector, error=str(e))
@@ -287,8 +500,7 @@ class BrowserController:
         
         try:
             scroll_amount = amount if direction == "down" else -amount
-            await self.page.evaluate(f"window.scrollBy(0, {scroll_amount})")
-            await asyncio.sleep(0.5)
+            await self.page.evaluate(SCROLL_SCRIPT, scroll_amount)
             return True
         except Exception as e:
             logger.error("Scroll failed", error=str(e))
@@ -318,6 +530,7 @@ class BrowserController:
             return
         
         try:
+            Config.ensure_dirs()
             storage_path = f"{Config.BROWSER_CONTEXTS_DIR}/{name}_state.json"
             await self.context.storage_state(path=storage_path)
             logger.info("Context saved", path=storage_path)
@@ -331,9 +544,9 @@ class BrowserController:
         try:
             if self.page:
                 await self.page.close()
-            if self.context:
+            if self.context and self._owns_context:
                 await self.context.close()
-            if self.browser:
+            if self.browser and self._owns_browser:
                 await self.browser.close()
             if self.playwright:
                 await self.playwright.stop()
@@ -342,8 +555,10 @@ class BrowserController:
         finally:
             self._initialized = False
             self.page = None
-            self.context = None
-            self.browser = None
+            if self._owns_context:
+                self.context = None
+            if self._owns_browser:
+                self.browser = None
             self.playwright = None
     
     async def __aenter__(self):
@@ -355,3 +570,141 @@ class BrowserController:
         """Context manager exit"""
         await self.close()
 
+
+class BrowserPool:
+    """
+    One Chromium process shared by all agent sessions
+    
+    Each session gets its own BrowserContext, so cookies, storage and pages
+    stay isolated while the browser launch is paid once instead of per session.
+    """
+    
+    def __init__(self, headless: bool = True, block_assets: bool = False):
+        """
+        Initialize browser pool
+        
+        Args:
+            headless: Run the shared browser in headless mode
+            block_assets: Abort font, media and tracker requests in agent
+                contexts (not the shared context, whose HTTP cache routing
+                would disable)
+        """
+        self.headless = headless
+        self.block_assets = block_assets
+        self.playwright = None
+        self.browser: Optional[Browser] = None
+        # Long-lived context for one-off page requests; keeps its HTTP cache
+        # and connections warm across requests
+        self.shared_context: Optional[BrowserContext] = None
+        self._lock = asyncio.Lock()
+    
+    async def get_browser(self) -> Browser:
+        """Get the shared browser, launching it (again) if it is not running"""
+        async with self._lock:
+            if self.browser is None or not self.browser.is_connected():
+                if self.playwright is None:
+                    _ensure_windows_loop_policy()
+                    self.playwright = await async_playwright().start()
+                
+                logger.info("Launching shared browser", headless=self.headless)
+                self.browser = await _launch_browser(self.playwright, self.headless)
+            
+            return self.browser
+    
+    async def get_shared_context(self) -> BrowserContext:
+        """Get the shared context, creating it (again) if the browser changed"""
+        browser = await self.get_browser()
+        async with self._lock:
+            if self.shared_context is None or self.shared_context.browser is not browser:
+                logger.info("Creating shared browser context")
+                # Never routed: a route disables the HTTP cache this context is for
+                self.shared_context = await _new_context(browser, False, False)
+            
+            return self.shared_context
+    
+    async def new_controller(self, use_persistent_context: bool = False) -> BrowserController:
+        """
+        Create an initialized controller with its own context on the shared browser
+        
+        Args:
+            use_persistent_context: Use saved browser context with cookies/auth
+        
+        Returns:
+            BrowserController; close() it to release the context
+        """
+        browser = await self.get_browser()
+        controller = BrowserController(
+            headless=self.headless,
+            use_persistent_context=use_persistent_context,
+            browser=browser,
+            block_assets=self.block_assets
+        )
+        await controller.initialize()
+        return controller
+    
+    @asynccontextmanager
+    async def acquire(self, use_persistent_context: bool = False) -> AsyncIterator[BrowserController]:
+        """Context manager version of new_controller() that closes the context on exit"""
+        controller = await self.new_controller(use_persistent_context)
+        try:
+            yield controller
+        finally:
+            await controller.close()
+    
+    @asynccontextmanager
+    async def acquire_page(self) -> AsyncIterator[BrowserController]:
+        """
+        Get a controller with a fresh page in the shared context
+        
+        Cheaper than acquire() and reuses cached assets (the shared context
+        never blocks assets, since routing would disable its HTTP cache), but
+        cookies and storage are shared with other page requests. Use acquire() for
+        agent sessions.
+        """
+        context = await self.get_shared_context()
+        controller = BrowserController(
+            headless=self.headless,
+            browser=context.browser,
+            context=context
+        )
+        await controller.initialize()
+        try:
+            yield controller
+        finally:
+            await controller.close()
+    
+    async def close(self) -> None:
+        """Close the shared browser and stop Playwright"""
+        async with self._lock:
+            try:
+                if self.shared_context:
+                    await self.shared_context.close()
+                if self.browser:
+                    logger.info("Closing shared browser")
+                    await self.browser.close()
+                if self.playwright:
+                    await self.playwright.stop()
+            except Exception as e:
+                logger.error("Error closing shared browser", error=str(e))
+            finally:
+                self.shared_context = None
+                self.browser = None
+                self.playwright = None
+
+
+# Global browser pool instance
+_browser_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """Get or create the global browser pool"""
+    global _browser_pool
+    
+    if _browser_pool is None:
+        _browser_pool = BrowserPool(
+            headless=Config.HEADLESS,
+            block_assets=Config.BROWSER_BLOCK_ASSETS
+        )
+    
+    return _browser_pool
+
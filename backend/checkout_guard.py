@@ -2,35 +2,114 @@
 Checkout Detection and Safety Guards.
 Prevents accidental purchases by requiring human approval.
 """
-import time
-from typing import Dict, Any, Optional
+import asyncio
+import base64
+import hashlib
+import re
+from typing import Dict, Any, Optional, Tuple
 from playwright.async_api import Page
 import structlog
 
-from ai_vision import get_vision_analyzer
+from ai_vision import get_vision_analyzer, Screenshot
 from gemini_helper import create_checkout_detection_prompt
+from ttl_cache import TTLCache
 
 logger = structlog.get_logger()
 
 
-# Cache for checkout detection results
-_detection_cache: Dict[str, tuple[Dict[str, Any], float]] = {}
-CACHE_TTL = 5.0  # seconds
+# Checkout detection results keyed by (URL, screenshot digest): the same URL
+# rendered differently is detected again, while an unchanged screenshot is
+# never sent to Gemini twice. The TTL only bounds how long a result is kept.
+CACHE_TTL = 300.0  # seconds
+CACHE_SIZE = 256
+_detection_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+
+# Element texts that look like they complete a purchase
+HIGH_RISK_KEYWORDS = (
+    'place order',
+    'complete purchase',
+    'confirm order',
+    'buy now',
+    'complete order',
+    'submit order',
+    'pay now',
+    'confirm purchase',
+    'checkout',
+    'confirm payment'
+)
+
+# All keywords in one case-insensitive pattern: a single scan of the text.
+# Keywords must be whole words (any whitespace between them), so texts
+# like "checkouts" or "pay nowhere" are not flagged.
+_HIGH_RISK_RE = re.compile(
+    r'\b(?:' + '|'.join(
+        r'\s+'.join(map(re.escape, keyword.split())) for keyword in HIGH_RISK_KEYWORDS
+    ) + r')\b',
+    re.IGNORECASE
+)
+
+# Detections in progress, so concurrent checks of the same page share one
+# Gemini call instead of racing to fill the cache
+_pending_detections: Dict[Tuple[str, bytes], "asyncio.Task[Dict[str, Any]]"] = {}
+
+
+def _detection_key(url: str, screenshot: Screenshot) -> Tuple[str, bytes]:
+    """Cache key for a detection: URL plus a digest of the screenshot bytes"""
+    image_data = base64.b64decode(screenshot) if isinstance(screenshot, str) else screenshot
+    return url, hashlib.blake2b(image_data, digest_size=16).digest()
+
+
+def record_checkout_detection(url: str, screenshot: Screenshot,
+                              result: Dict[str, Any]) -> None:
+    """
+    Cache a checkout detection made elsewhere (e.g. VisionAnalyzer.analyze_all)
+    
+    A following is_checkout_page call for the same URL and screenshot
+    reuses it instead of making its own Gemini call.
+    
+    Args:
+        url: Page URL the screenshot was taken on
+        screenshot: Screenshot the detection was made on
+        result: Detection result in the detect_checkout_page format
+    """
+    _detection_cache.set(_detection_key(url, screenshot), result)
+
+
+async def _detect(url: str, screenshot: Screenshot,
+                  cache_key: Tuple[str, bytes]) -> Dict[str, Any]:
+    """Run a Gemini checkout detection and cache a successful result"""
+    logger.info("Detecting checkout page", url=url)
+    
+    # Use vision analyzer for detection
+    vision_analyzer = get_vision_analyzer()
+    result = await vision_analyzer.detect_checkout_page(screenshot)
+    
+    # Cache result (failures are retried on the next check)
+    if "error" not in result:
+        _detection_cache.set(cache_key, result)
+    
+    logger.info("Checkout detection complete",
+               is_checkout=result.get('is_checkout'),
+               confidence=result.get('confidence'),
+               url=url)
+    
+    return result
 
 
 async def is_checkout_page(
     page: Page,
-    screenshot_base64: str
+    screenshot: Screenshot
 ) -> Dict[str, Any]:
     """
     Detect if current page is a checkout/order confirmation page
     
     Uses Gemini vision to analyze the page and look for checkout indicators.
-    Results are cached for a few seconds to avoid duplicate API calls.
+    Results are cached per URL and screenshot, so an unchanged page is
+    never analyzed twice; concurrent checks of one page share a call.
     
     Args:
         page: Playwright page instance
-        screenshot_base64: Base64 encoded screenshot
+        screenshot: Screenshot as raw image bytes or base64 string
     
     Returns:
         Dictionary with detection results:
@@ -43,32 +122,27 @@ async def is_checkout_page(
         }
     """
     try:
-        # Generate cache key from URL
+        # Generate cache key from URL and screenshot content
         url = page.url
-        current_time = time.time()
+        cache_key = _detection_key(url, screenshot)
         
         # Check cache
-        if url in _detection_cache:
-            cached_result, cached_time = _detection_cache[url]
-            if current_time - cached_time < CACHE_TTL:
-                logger.debug("Using cached checkout detection", url=url)
-                return cached_result
-        
-        logger.info("Detecting checkout page", url=url)
-        
-        # Use vision analyzer for detection
-        vision_analyzer = get_vision_analyzer()
-        result = await vision_analyzer.detect_checkout_page(screenshot_base64)
+        cached_result = _detection_cache.get(cache_key)
+        if cached_result is not None:
+            logger.debug("Using cached checkout detection", url=url)
+            return cached_result
         
-        # Cache result
-        _detection_cache[url] = (result, current_time)
-        
-        logger.info("Checkout detection complete",
-                   is_checkout=result.get('is_checkout'),
-                   confidence=result.get('confidence'),
-                   url=url)
+        # Join a detection of the same page that is already running
+        task = _pending_detections.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(_detect(url, screenshot, cache_key))
+            _pending_detections[cache_key] = task
+            task.add_done_callback(lambda _: _pending_detections.pop(cache_key, None))
+        else:
+            logger.debug("Joining checkout detection in progress", url=url)
         
-        return result
+        # Shielded: a cancelled caller must not cancel the shared call
+        return await asyncio.shield(task)
         
     except Exception as e:
         logger.error("Checkout detection failed", error=str(e))
@@ -83,16 +157,21 @@ async def is_checkout_page(
 
 async def check_before_click(
     page: Page,
-    screenshot_base64: str,
-    element_text: str = ""
+    screenshot: Screenshot,
+    element_text: str = "",
+    force_check: bool = False
 ) -> Dict[str, Any]:
     """
     Check if a click action is safe (not a purchase button)
     
+    Checkout detection (a vision call) only runs for elements whose text
+    looks like a purchase action, unless force_check is set.
+    
     Args:
         page: Playwright page instance
-        screenshot_base64: Current page screenshot
+        screenshot: Current page screenshot
         element_text: Text of element about to be clicked
+        force_check: Run checkout detection even for safe-looking elements
     
     Returns:
         Dictionary with safety check results:
@@ -103,25 +182,20 @@ async def check_before_click(
             "checkout_info": dict (if checkout detected)
         }
     """
+    is_risky_element = _HIGH_RISK_RE.search(element_text) is not None
+    
+    if not is_risky_element and not force_check:
+        # Safe element text never needs approval, so skip the vision call
+        logger.debug("Safety check skipped detection", element_text=element_text[:50])
+        return {
+            "safe": True,
+            "requires_approval": False,
+            "reason": "Safe to proceed",
+            "checkout_info": None
+        }
+    
     # Check if current page is a checkout page
-    detection = await is_checkout_page(page, screenshot_base64)
-    
-    # High-risk keywords in element text
-    high_risk_keywords = [
-        'place order',
-        'complete purchase',
-        'confirm order',
-        'buy now',
-        'complete order',
-        'submit order',
-        'pay now',
-        'confirm purchase',
-        'checkout',
-        'confirm payment'
-    ]
-    
-    element_text_lower = element_text.lower()
-    is_risky_element = any(keyword in element_text_lower for keyword in high_risk_keywords)
+    detection = await is_checkout_page(page, screenshot)
     
     # Determine if approval is required
     requires_approval = False
@@ -157,7 +231,6 @@ async def check_before_click(
 
 def clear_detection_cache() -> None:
     """Clear the checkout detection cache"""
-    global _detection_cache
     _detection_cache.clear()
     logger.debug("Detection cache cleared")
 
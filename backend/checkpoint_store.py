@@ -0,0 +1,153 @@
+"""
+Per-step agent state checkpoints in SQLite.
+Each node run appends only what changed (the same delta sent to clients),
+so a checkpoint costs O(1) regardless of how long the session has run.
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional
+import orjson
+import structlog
+
+from config import Config
+
+logger = structlog.get_logger()
+
+
+class CheckpointStore:
+    """
+    Append-only store of state deltas, keyed by (session_id, step)
+    
+    Writes run in a worker thread so the agent loop never blocks on disk.
+    replay() folds a session's deltas back into its latest known state.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Open (or create) the checkpoint database
+        
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            " session_id TEXT NOT NULL,"
+            " step INTEGER NOT NULL,"
+            " node TEXT NOT NULL,"
+            " delta BLOB NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (session_id, step))"
+        )
+        self._conn.commit()
+        logger.info("Checkpoint store opened", path=path)
+    
+    def _write(self, session_id: str, step: int, node: str, delta: bytes) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                (session_id, step, node, delta, time.time())
+            )
+            self._conn.commit()
+    
+    async def append(self, session_id: str, step: int, node: str,
+                     delta: Dict[str, Any]) -> None:
+        """
+        Record the delta produced by one node run
+        
+        Args:
+            session_id: Agent session
+            step: Sequence number within the session
+            node: Node that produced the delta
+            delta: Changed fields (JSON serialisable)
+        """
+        try:
+            await asyncio.to_thread(self._write, session_id, step, node, orjson.dumps(delta))
+        except Exception as e:
+            # Checkpoints are best effort; never fail the mission over one
+            logger.warning("Checkpoint write failed", session_id=session_id, step=step, error=str(e))
+    
+    def load(self, session_id: str) -> List[Dict[str, Any]]:
+        """
+        Get a session's deltas in step order
+        
+        Args:
+            session_id: Agent session
+        
+        Returns:
+            List of {"step", "node", "delta"} dictionaries
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT step, node, delta FROM checkpoints WHERE session_id = ? ORDER BY step",
+                (session_id,)
+            ).fetchall()
+        
+        return [
+            {"step": step, "node": node, "delta": orjson.loads(delta)}
+            for step, node, delta in rows
+        ]
+    
+    def replay(self, session_id: str) -> Dict[str, Any]:
+        """
+        Rebuild the latest checkpointed state of a session
+        
+        Later deltas overwrite earlier fields; messages accumulate.
+        
+        Args:
+            session_id: Agent session
+        
+        Returns:
+            Merged state dictionary (empty if the session is unknown)
+        """
+        state: Dict[str, Any] = {}
+        messages: List[str] = []
+        
+        for entry in self.load(session_id):
+            delta = entry["delta"]
+            messages.extend(delta.get("messages", ()))
+            state.update(delta)
+        
+        if state:
+            state["messages"] = messages
+        
+        return state
+    
+    def close(self) -> None:
+        """Close the database"""
+        with self._lock:
+            self._conn.close()
+
+
+# Singleton instance (None when CHECKPOINT_DB is not set)
+_checkpoint_store: Optional[CheckpointStore] = None
+
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    """
+    Get the checkpoint store, opening it on first use
+    
+    Returns:
+        CheckpointStore, or None if checkpointing is disabled
+    """
+    global _checkpoint_store
+    
+    if _checkpoint_store is None and Config.CHECKPOINT_DB:
+        _checkpoint_store = CheckpointStore(Config.CHECKPOINT_DB)
+    
+    return _checkpoint_store
+
+
+def close_checkpoint_store() -> None:
+    """Close the checkpoint store if it was opened"""
+    global _checkpoint_store
+    
+    if _checkpoint_store is not None:
+        _checkpoint_store.close()
+        _checkpoint_store = None
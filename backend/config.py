@@ -4,20 +4,27 @@ Loads environment variables and provides centralized config access.
 """
 import os
 from pathlib import Path
-from dotenv import load_dotenv
 from typing import Optional
 
 # Get the directory where this config.py file is located (backend folder)
 BASE_DIR = Path(__file__).resolve().parent
 
-# Explicitly load .env file from backend directory
+# Explicitly load .env file from backend directory (its values win over the
+# process environment); python-dotenv is only imported when the file exists
 env_path = BASE_DIR / '.env'
-load_dotenv(dotenv_path=env_path, override=True)
+if env_path.is_file():
+    from dotenv import dotenv_values
+    os.environ.update({
+        key: value for key, value in dotenv_values(env_path).items() if value is not None
+    })
+
+# Environment snapshot the Config fields below are read from
+_ENV = dict(os.environ)
 
 # Debug: Print if .env was found and loaded
-if env_path.exists():
+if env_path.is_file():
     print(f"[OK] .env file found at: {env_path}")
-    print(f"[OK] API key loaded: {os.getenv('GOOGLE_API_KEY', 'NOT FOUND')[:20]}...")
+    print(f"[OK] API key loaded: {_ENV.get('GOOGLE_API_KEY', 'NOT FOUND')[:20]}...")
 else:
     print(f"[WARNING] .env file NOT found at: {env_path}")
     print(f"          Current directory: {os.getcwd()}")
@@ -27,19 +34,40 @@ class Config:
     """Application configuration class"""
     
     # Google Gemini API
-    GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
+    GOOGLE_API_KEY: str = _ENV.get("GOOGLE_API_KEY", "")
     
     # Server settings
-    HOST: str = os.getenv("HOST", "0.0.0.0")
-    PORT: int = int(os.getenv("PORT", "8000"))
-    DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
+    HOST: str = _ENV.get("HOST", "0.0.0.0")
+    PORT: int = int(_ENV.get("PORT", "8000"))
+    DEBUG: bool = _ENV.get("DEBUG", "True").lower() == "true"
+    # Server processes, each with its own browser (0 = half the CPU cores).
+    # Sessions live in one process, so more than one needs sticky routing.
+    WORKERS: int = int(_ENV.get("WORKERS", "1")) or max(1, (os.cpu_count() or 2) // 2)
     
     # Browser settings
-    HEADLESS: bool = os.getenv("HEADLESS", "True").lower() == "true"
-    BROWSER_TIMEOUT: int = int(os.getenv("BROWSER_TIMEOUT", "30000"))
+    HEADLESS: bool = _ENV.get("HEADLESS", "True").lower() == "true"
+    BROWSER_TIMEOUT: int = int(_ENV.get("BROWSER_TIMEOUT", "30000"))
+    # Abort font, media and tracker requests in agent browser contexts. Off by
+    # default: while a route is installed Playwright disables the HTTP cache
+    # and every request (even allowed ones) makes a round-trip through Python
+    BROWSER_BLOCK_ASSETS: bool = _ENV.get("BROWSER_BLOCK_ASSETS", "False").lower() == "true"
+    
+    # Logging settings (per-iteration agent logs are DEBUG)
+    LOG_LEVEL: str = _ENV.get("LOG_LEVEL", "INFO")
     
     # Agent settings
     MAX_ITERATIONS: int = 20
+    # Run nodes in a plain async loop; set False to go through LangGraph
+    AGENT_DIRECT_LOOP: bool = _ENV.get("AGENT_DIRECT_LOOP", "True").lower() == "true"
+    # SQLite file for per-step state checkpoints (empty disables checkpointing)
+    CHECKPOINT_DB: str = _ENV.get("CHECKPOINT_DB", "")
+    
+    # Vision settings
+    VISION_BATCHING: bool = _ENV.get("VISION_BATCHING", "False").lower() == "true"
+    # One Gemini call per step for the action, checkout detection and product
+    # info, instead of a streamed action call plus a checkout check only before
+    # risky clicks. Off by default: it generates more output every step.
+    VISION_COMBINED_ANALYSIS: bool = _ENV.get("VISION_COMBINED_ANALYSIS", "False").lower() == "true"
     
     # Directories
     BROWSER_CONTEXTS_DIR: str = "browser_contexts"
@@ -60,9 +88,10 @@ class Config:
         if not cls.GOOGLE_API_KEY:
             raise ValueError("GOOGLE_API_KEY not configured")
         return cls.GOOGLE_API_KEY
-
-
-# Create directories if they don't exist
-os.makedirs(Config.BROWSER_CONTEXTS_DIR, exist_ok=True)
-os.makedirs(Config.LOGS_DIR, exist_ok=True)
+    
+    @classmethod
+    def ensure_dirs(cls) -> None:
+        """Create the data directories if they don't exist (called at startup)"""
+        os.makedirs(cls.BROWSER_CONTEXTS_DIR, exist_ok=True)
+        os.makedirs(cls.LOGS_DIR, exist_ok=True)
 
@@ -0,0 +1,38 @@
+"""
+Event loop policy selection for the server.
+Uses winloop on Windows and uvloop elsewhere when installed; both keep the
+subprocess support Playwright needs to launch Chromium. Without them,
+Windows falls back to the Proactor loop (the selector loop cannot spawn
+subprocesses) and other platforms keep asyncio's default loop.
+"""
+import asyncio
+import sys
+from typing import Type
+
+
+def get_loop_policy_class() -> Type[asyncio.AbstractEventLoopPolicy]:
+    """
+    Get the preferred event loop policy for this platform
+    
+    Returns:
+        Event loop policy class
+    """
+    if sys.platform == 'win32':
+        try:
+            import winloop
+            return winloop.EventLoopPolicy
+        except ImportError:
+            return asyncio.WindowsProactorEventLoopPolicy
+    
+    try:
+        import uvloop
+        return uvloop.EventLoopPolicy
+    except ImportError:
+        return asyncio.DefaultEventLoopPolicy
+
+
+def install_loop_policy() -> None:
+    """Set the preferred event loop policy (no-op if it is already set)"""
+    policy_class = get_loop_policy_class()
+    if not isinstance(asyncio.get_event_loop_policy(), policy_class):
+        asyncio.set_event_loop_policy(policy_class())
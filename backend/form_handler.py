@@ -2,12 +2,111 @@
 Form Detection and Filling Utilities.
 Helps identify and fill form fields intelligently.
 """
-from typing import Dict, List, Any, Optional
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple
 from playwright.async_api import Page
 import structlog
 
+from logging_setup import debug_enabled
+
 logger = structlog.get_logger()
 
+# Categories reported by detect_form_fields
+FIELD_CATEGORIES = ("email", "password", "text", "search", "tel", "number", "submit", "button")
+
+# Marker element types treated as buttons (marker types are already lowercase)
+_BUTTON_TYPES = frozenset({'button', '[role="button"]'})
+
+# Button texts that submit a form
+_SUBMIT_TEXT_RE = re.compile('submit|search|go')
+
+
+# Sets [selector, value] pairs like a user edit would (native value setter,
+# then input and change events); returns null per filled field, else a reason
+FILL_FIELDS_SCRIPT = """
+fields => fields.map(([selector, value]) => {
+    let element;
+    try {
+        element = document.querySelector(selector);
+    } catch (e) {
+        return 'invalid selector';
+    }
+    if (!element || !('value' in element)) return 'not found';
+    if (element.disabled || element.readOnly) return 'not editable';
+    
+    element.focus();
+    const setter = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(element), 'value')?.set;
+    if (setter) {
+        setter.call(element, value);
+    } else {
+        element.value = value;
+    }
+    element.dispatchEvent(new Event('input', {bubbles: true}));
+    element.dispatchEvent(new Event('change', {bubbles: true}));
+    return null;
+})
+"""
+
+
+@dataclass(slots=True)
+class FormElement:
+    """One input or button marker, with the fields the form helpers test lowercased"""
+    marker: int
+    element_type: str
+    input_type: str
+    name: str
+    placeholder: str
+    aria_label: str
+    text: str
+    y: int
+
+
+# Last scanned markers map (kept referenced so its id stays unique), its size
+# and the extracted elements; the helpers below often run on the same map
+_last_scan: Optional[Tuple[Dict[int, Dict[str, Any]], int, List[FormElement]]] = None
+
+
+def form_elements(markers_map: Dict[int, Dict[str, Any]]) -> List[FormElement]:
+    """
+    Extract the input and button markers of a page in one pass
+    
+    Links and other elements are dropped, and each field is read and
+    lowercased once, so the helpers below scan flat records instead of
+    nested marker dictionaries. The result for the most recent map is
+    reused while that same map object is passed again unchanged in size.
+    
+    Args:
+        markers_map: Mapping of marker numbers to elements
+    
+    Returns:
+        List of FormElement in marker order (shared; do not modify)
+    """
+    global _last_scan
+    
+    if _last_scan is not None and _last_scan[0] is markers_map and _last_scan[1] == len(markers_map):
+        return _last_scan[2]
+    
+    elements = []
+    for marker_num, info in markers_map.items():
+        element_type = info.get('type', '').lower()
+        if element_type != 'input' and element_type not in _BUTTON_TYPES:
+            continue
+        
+        elements.append(FormElement(
+            marker=marker_num,
+            element_type=element_type,
+            input_type=info.get('input_type', '').lower(),
+            name=info.get('name', '').lower(),
+            placeholder=info.get('placeholder', '').lower(),
+            aria_label=info.get('aria_label', '').lower(),
+            text=info.get('text', '').lower(),
+            y=info.get('position', {}).get('y', 9999)
+        ))
+    
+    _last_scan = (markers_map, len(markers_map), elements)
+    return elements
+
 
 async def detect_form_fields(
     page: Page,
@@ -33,53 +132,32 @@ async def detect_form_fields(
     """
     logger.info("Detecting form fields", markers_count=len(markers_map))
     
-    categorized = {
-        "email": [],
-        "password": [],
-        "text": [],
-        "search": [],
-        "tel": [],
-        "number": [],
-        "submit": [],
-        "button": []
-    }
+    categorized = {category: [] for category in FIELD_CATEGORIES}
     
-    for marker_num, info in markers_map.items():
-        element_type = info.get('type', '').lower()
-        input_type = info.get('input_type', '').lower()
-        name = info.get('name', '').lower()
-        aria_label = info.get('aria_label', '').lower()
-        placeholder = info.get('placeholder', '').lower()
-        text = info.get('text', '').lower()
+    for element in form_elements(markers_map):
+        input_type = element.input_type
+        name = element.name
         
         # Categorize by input type
-        if element_type == 'input':
-            if input_type == 'email' or 'email' in name or 'email' in placeholder:
-                categorized['email'].append(marker_num)
-            
+        if element.element_type == 'input':
+            if input_type == 'email' or 'email' in name or 'email' in element.placeholder:
+                category = 'email'
             elif input_type == 'password' or 'password' in name:
-                categorized['password'].append(marker_num)
-            
+                category = 'password'
             elif input_type == 'tel' or 'phone' in name or 'tel' in name:
-                categorized['tel'].append(marker_num)
-            
+                category = 'tel'
             elif input_type == 'number':
-                categorized['number'].append(marker_num)
-            
-            elif input_type == 'search' or 'search' in name or 'search' in aria_label:
-                categorized['search'].append(marker_num)
-            
+                category = 'number'
+            elif input_type == 'search' or 'search' in name or 'search' in element.aria_label:
+                category = 'search'
             elif input_type == 'submit':
-                categorized['submit'].append(marker_num)
-            
+                category = 'submit'
             else:
-                categorized['text'].append(marker_num)
+                category = 'text'
+        else:
+            category = 'submit' if _SUBMIT_TEXT_RE.search(element.text) else 'button'
         
-        elif element_type == 'button' or element_type == '[role="button"]':
-            if 'submit' in text or 'search' in text or 'go' in text:
-                categorized['submit'].append(marker_num)
-            else:
-                categorized['button'].append(marker_num)
+        categorized[category].append(element.marker)
     
     logger.info("Form field detection complete",
                email=len(categorized['email']),
@@ -93,7 +171,8 @@ async def detect_form_fields(
 async def fill_form(
     page: Page,
     field_data: Dict[str, str],
-    simulate_human: bool = True
+    simulate_human: bool = True,
+    typing_delay: int = 0
 ) -> Dict[str, Any]:
     """
     Fill form fields with provided data
@@ -101,7 +180,11 @@ async def fill_form(
     Args:
         page: Playwright page instance
         field_data: Dictionary mapping field selectors to values
-        simulate_human: If True, types slowly to simulate human behavior
+        simulate_human: If True, focuses each field and enters the text as
+            one input (like a paste) instead of setting values directly
+        typing_delay: Milliseconds between keystrokes when simulate_human
+            is set; 0 inserts the text at once (use a delay only for sites
+            that check keystroke timing)
     
     Returns:
         Dictionary with fill results:
@@ -117,19 +200,34 @@ async def fill_form(
     filled_count = 0
     failed_fields = []
     errors = []
+    pending = list(field_data.items())
     
-    for selector, value in field_data.items():
+    if not simulate_human and pending:
+        # Set every value in one round-trip; fields the script cannot handle
+        # (e.g. Playwright-only selectors) go through page.fill below
         try:
-            logger.debug("Filling field", selector=selector, value_length=len(value))
-            
-            # Clear existing value
-            await page.fill(selector, "")
+            outcomes = await page.evaluate(FILL_FIELDS_SCRIPT, pending)
+            filled_count = outcomes.count(None)
+            pending = [field for field, error in zip(pending, outcomes) if error is not None]
+        except Exception as e:
+            logger.debug("Batch fill failed, filling fields one by one", error=str(e))
+    
+    # Typing goes through the page's single keyboard focus, so it stays sequential
+    log_fields = debug_enabled()
+    for selector, value in pending:
+        try:
+            if log_fields:
+                logger.debug("Filling field", selector=selector, value_length=len(value))
             
             if simulate_human:
-                # Type with human-like delays
-                await page.type(selector, value, delay=50)
+                # Focus and clear the field, then enter the text
+                await page.fill(selector, "")
+                if typing_delay:
+                    await page.type(selector, value, delay=typing_delay)
+                else:
+                    await page.keyboard.insert_text(value)
             else:
-                # Fill instantly
+                # Fill instantly (fill replaces the existing value)
                 await page.fill(selector, value)
             
             filled_count += 1
@@ -169,33 +267,23 @@ async def find_search_box(markers_map: Dict[int, Dict[str, Any]]) -> Optional[in
         Marker number of search box, or None if not found
     """
     search_indicators = ['search', 'query', 'q', 'find']
+    inputs = [element for element in form_elements(markers_map) if element.element_type == 'input']
     
     # First pass: look for explicit search inputs
-    for marker_num, info in markers_map.items():
-        if info.get('type') == 'input':
-            input_type = info.get('input_type', '').lower()
-            name = info.get('name', '').lower()
-            placeholder = info.get('placeholder', '').lower()
-            aria_label = info.get('aria_label', '').lower()
-            
-            if input_type == 'search':
-                return marker_num
-            
-            for indicator in search_indicators:
-                if indicator in name or indicator in placeholder or indicator in aria_label:
-                    return marker_num
+    for element in inputs:
+        if element.input_type == 'search':
+            return element.marker
+        
+        for indicator in search_indicators:
+            if indicator in element.name or indicator in element.placeholder or indicator in element.aria_label:
+                return element.marker
     
     # Second pass: look for any text input near top of page
-    text_inputs = [
-        (num, info) for num, info in markers_map.items()
-        if info.get('type') == 'input' and 
-        info.get('input_type', '') in ['text', '']
-    ]
+    text_inputs = [element for element in inputs if element.input_type in ('text', '')]
     
     if text_inputs:
         # Return the topmost text input
-        topmost = min(text_inputs, key=lambda x: x[1].get('position', {}).get('y', 9999))
-        return topmost[0]
+        return min(text_inputs, key=lambda element: element.y).marker
     
     return None
 
@@ -215,19 +303,16 @@ async def find_submit_button(markers_map: Dict[int, Dict[str, Any]], near_marker
     
     candidates = []
     
-    for marker_num, info in markers_map.items():
-        element_type = info.get('type', '').lower()
-        text = info.get('text', '').lower()
-        
-        if element_type in ['button', 'input']:
+    for element in form_elements(markers_map):
+        if element.element_type in ('button', 'input'):
             # Check if it's a submit button
-            if info.get('input_type') == 'submit':
-                candidates.append((marker_num, 100))  # High priority
+            if element.input_type == 'submit':
+                candidates.append((element.marker, 100))  # High priority
             
             # Check text content
             for keyword in submit_keywords:
-                if keyword in text:
-                    candidates.append((marker_num, 50))
+                if keyword in element.text:
+                    candidates.append((element.marker, 50))
                     break
     
     if not candidates:
@@ -3,14 +3,15 @@ Google Gemini API helper utilities.
 Provides functions for API setup, prompt creation, and response parsing.
 """
 import os
-import json
 import re
 from typing import Dict, List, Any, Optional
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
+import orjson
 import structlog
 
 from config import Config
+from agent_state import Action
 
 logger = structlog.get_logger()
 
@@ -76,72 +77,31 @@ def get_safety_settings() -> Dict[HarmCategory, HarmBlockThreshold]:
     }
 
 
-def create_vision_prompt(
-    markers_map: Dict[int, Dict],
-    user_goal: str,
-    action_history: List[Dict] = None,
-    page_context: str = ""
-) -> str:
-    """
-    Create comprehensive prompt for vision analysis
+def _describe_marker(number: int, info: Dict[str, Any]) -> str:
+    """Format one marker for the prompt, labelled by text, aria label or placeholder"""
+    desc = f"[{number}] {info.get('type', 'unknown').upper()}"
     
-    Args:
-        markers_map: Mapping of marker numbers to element info
-        user_goal: User's stated goal/objective
-        action_history: List of previous actions taken
-        page_context: Optional context about the current page (e.g., "Amazon homepage")
-    
-    Returns:
-        Formatted prompt string
-    """
-    action_history = action_history or []
+    text = info.get('text', '')[:60]
+    if text:
+        return f'{desc} - "{text}"'
     
-    # Format action history
-    history_str = "None (this is the first action)"
-    if action_history:
-        recent_actions = action_history[-3:]  # Last 3 actions
-        history_lines = []
-        for i, action in enumerate(recent_actions, 1):
-            action_type = action.get('action', 'unknown')
-            target = action.get('target', 'N/A')
-            value = action.get('value', '')
-            history_lines.append(f"  {i}. {action_type} on element [{target}]" + 
-                               (f" with value: {value}" if value else ""))
-        history_str = '\n'.join(history_lines)
-    
-    # Format markers
-    markers_str = ""
-    for number, info in sorted(markers_map.items()):
-        element_type = info.get('type', 'unknown')
-        text = info.get('text', '')[:60]
-        aria = info.get('aria_label', '')
-        placeholder = info.get('placeholder', '')
-        
-        desc = f"[{number}] {element_type.upper()}"
-        if text:
-            desc += f' - "{text}"'
-        elif aria:
-            desc += f' - (aria: "{aria}")'
-        elif placeholder:
-            desc += f' - (placeholder: "{placeholder}")'
-        
-        markers_str += desc + '\n'
+    aria = info.get('aria_label', '')
+    if aria:
+        return f'{desc} - (aria: "{aria}")'
     
-    # Add page context if available
-    context_note = ""
-    if page_context:
-        context_note = f"\nPAGE CONTEXT: {page_context}\n"
+    placeholder = info.get('placeholder', '')
+    if placeholder:
+        return f'{desc} - (placeholder: "{placeholder}")'
     
-    prompt = f"""You are a web automation assistant analyzing a screenshot with numbered interactive elements (red numbered labels).
+    return desc
 
-USER GOAL: {user_goal}
-{context_note}
-AVAILABLE INTERACTIVE ELEMENTS:
-{markers_str}
 
-PREVIOUS ACTIONS:
-{history_str}
+# Stable instructions come first and the per-step page details last, so
+# consecutive calls share a long identical prefix that Gemini can serve
+# from its implicit prompt cache (cached input tokens are billed at a discount)
+VISION_PROMPT_PREFIX = """You are a web automation assistant analyzing a screenshot with numbered interactive elements (red numbered labels).
 
+You will be given the USER GOAL, the AVAILABLE INTERACTIVE ELEMENTS and the PREVIOUS ACTIONS at the end of this prompt.
 Analyze the screenshot and determine the NEXT BEST ACTION to achieve the user's goal.
 
 RULES:
@@ -155,12 +115,12 @@ RULES:
 8. IMPORTANT: Look carefully at the red numbered labels in the screenshot - use those exact numbers!
 
 Return ONLY valid JSON with this EXACT structure:
-{{
+{
   "action": "click" | "type" | "scroll" | "done",
   "target": <marker_number>,
   "value": "<text_to_type>" | null,
   "reasoning": "<brief explanation of why this action>"
-}}
+}
 
 ACTION TYPES:
 - "click": Click on element at target marker number
@@ -170,8 +130,132 @@ ACTION TYPES:
 
 Remember: You must reference element numbers from the screenshot's red labels!
 """
+
+# Extra (also stable) instructions for the combined action/checkout/product call
+COMBINED_PROMPT_EXTRA = """
+ALSO ANALYZE THE SAME SCREENSHOT FOR:
+
+CHECKOUT: Is this a checkout or order confirmation page? Look for "Place Order",
+"Complete Purchase" or "Confirm Order" buttons, payment or shipping forms, and
+an order summary with a total price. Be conservative: only set is_checkout=true
+if you're confident.
+
+PRODUCT: If this is a product page, extract what you can clearly see;
+otherwise use null.
+
+Instead of the single object above, return ONLY valid JSON with this EXACT structure:
+{
+  "action": { <the action object described above> },
+  "checkout": {
+    "is_checkout": true | false,
+    "confidence": 0.0 to 1.0,
+    "detected_keywords": ["keyword1", "keyword2"],
+    "total_price": "price string" | null,
+    "reasoning": "brief explanation"
+  },
+  "product": {
+    "product_name": "product title",
+    "price": "price string",
+    "rating": "rating if visible" | null,
+    "availability": "in stock/out of stock" | null,
+    "description": "brief description" | null,
+    "image_url": "main product image if identifiable" | null
+  } | null
+}
+"""
+
+
+def _describe_page(
+    markers_map: Dict[int, Dict],
+    user_goal: str,
+    action_history: List[Action],
+    page_context: str
+) -> str:
+    """Format the per-step part of the prompt: goal, page context, elements and history"""
+    # Format action history
+    history_str = "None (this is the first action)"
+    if action_history:
+        recent_actions = action_history[-3:]  # Last 3 actions
+        history_str = '\n'.join(
+            f"  {i}. {action.action or 'unknown'} on element [{action.target}]"
+            + (f" with value: {action.value}" if action.value else "")
+            for i, action in enumerate(recent_actions, 1)
+        )
+    
+    # Format markers (one line each, newline-terminated)
+    markers_str = "".join(
+        _describe_marker(number, info) + '\n'
+        for number, info in sorted(markers_map.items())
+    )
+    
+    # Add page context if available
+    context_note = ""
+    if page_context:
+        context_note = f"\nPAGE CONTEXT: {page_context}\n"
     
-    return prompt
+    return f"""
+USER GOAL: {user_goal}
+{context_note}
+AVAILABLE INTERACTIVE ELEMENTS:
+{markers_str}
+
+PREVIOUS ACTIONS:
+{history_str}
+"""
+
+
+def create_vision_prompt(
+    markers_map: Dict[int, Dict],
+    user_goal: str,
+    action_history: List[Action] = None,
+    page_context: str = ""
+) -> str:
+    """
+    Create comprehensive prompt for vision analysis
+    
+    Args:
+        markers_map: Mapping of marker numbers to element info
+        user_goal: User's stated goal/objective
+        action_history: List of previous actions taken
+        page_context: Optional context about the current page (e.g., "Amazon homepage")
+    
+    Returns:
+        Formatted prompt string (stable instructions first, page details last)
+    """
+    return VISION_PROMPT_PREFIX + _describe_page(
+        markers_map, user_goal, action_history or [], page_context
+    )
+
+
+def create_combined_analysis_prompt(
+    markers_map: Dict[int, Dict],
+    user_goal: str,
+    action_history: List[Action] = None,
+    page_context: str = ""
+) -> str:
+    """
+    Create one prompt covering next action, checkout detection and product info
+    
+    Lets a single Gemini call (and a single image upload) replace separate
+    analyze_page, detect_checkout_page and extract_product_info calls.
+    
+    Args:
+        markers_map: Mapping of marker numbers to element info
+        user_goal: User's stated goal/objective
+        action_history: List of previous actions taken
+        page_context: Optional context about the current page
+    
+    Returns:
+        Formatted prompt string (stable instructions first, page details last)
+    """
+    return VISION_PROMPT_PREFIX + COMBINED_PROMPT_EXTRA + _describe_page(
+        markers_map, user_goal, action_history or [], page_context
+    )
+
+
+# Fallbacks for responses that are not bare JSON (rare with JSON output mode)
+_FENCED_JSON_RE = re.compile(r'```(?:json)?\s*(\{.*?\})\s*```', re.DOTALL)
+_NESTED_OBJECT_RE = re.compile(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', re.DOTALL)
 
 
 def parse_gemini_json(response_text: str) -> Dict[str, Any]:
@@ -188,34 +272,113 @@ def parse_gemini_json(response_text: str) -> Dict[str, Any]:
         ValueError: If response cannot be parsed as valid JSON
     """
     try:
-        # Try direct JSON parse first
-        result = json.loads(response_text)
+        # Try direct JSON parse first (orjson; fenced or wrapped JSON falls through)
+        result = orjson.loads(response_text)
         return result
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         pass
     
     # Try to extract JSON from markdown code blocks
-    json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
+    json_match = _FENCED_JSON_RE.search(response_text)
     if json_match:
         try:
-            result = json.loads(json_match.group(1))
+            result = orjson.loads(json_match.group(1))
             return result
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
+            pass
+    
+    # Try the span from the first "{" to the last "}" (prose around one object)
+    start = response_text.find('{')
+    end = response_text.rfind('}')
+    if 0 <= start < end:
+        try:
+            return orjson.loads(response_text[start:end + 1])
+        except orjson.JSONDecodeError:
             pass
     
     # Try to find any JSON object in the response
-    json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', response_text, re.DOTALL)
+    json_match = _NESTED_OBJECT_RE.search(response_text)
     if json_match:
         try:
-            result = json.loads(json_match.group(0))
+            result = orjson.loads(json_match.group(0))
             return result
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             pass
     
     logger.error("Could not parse JSON from response", response=response_text[:200])
     raise ValueError(f"Could not parse valid JSON from response: {response_text[:200]}")
 
 
+def parse_partial_json_fields(response_text: str) -> Dict[str, Any]:
+    """
+    Parse the completed top-level fields of a possibly truncated JSON object
+    
+    Used while streaming: a field is returned once the comma or closing
+    brace after its value has arrived, so values are never half-parsed.
+    
+    Args:
+        response_text: JSON text received so far
+    
+    Returns:
+        Dictionary of fields whose values are complete
+    """
+    fields: Dict[str, Any] = {}
+    
+    start = response_text.find('{')
+    if start < 0:
+        return fields
+    
+    def add_segment(segment: str) -> None:
+        if segment.strip():
+            try:
+                fields.update(orjson.loads('{' + segment + '}'))
+            except ValueError:
+                pass
+    
+    depth = 0
+    in_string = False
+    escape = False
+    segment_start = start + 1
+    
+    for i in range(start + 1, len(response_text)):
+        char = response_text[i]
+        
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            if depth == 0:
+                add_segment(response_text[segment_start:i])
+                break
+            depth -= 1
+        elif char == ',' and depth == 0:
+            add_segment(response_text[segment_start:i])
+            segment_start = i + 1
+    
+    return fields
+
+
+# Fields every action needs, and the per-action fields that must be non-empty
+# (the keys double as the set of valid action types)
+_ACTION_BASE_FIELDS = frozenset(('action', 'reasoning'))
+_ACTION_VALUE_FIELDS = {
+    'click': ('target',),
+    'type': ('value',),
+    'scroll': (),
+    'done': ()
+}
+
+
 def validate_action(action: Dict[str, Any]) -> bool:
     """
     Validate that an action dictionary has required fields
@@ -226,26 +389,21 @@ def validate_action(action: Dict[str, Any]) -> bool:
     Returns:
         True if valid, False otherwise
     """
-    required_fields = ['action', 'reasoning']
-    
-    if not all(field in action for field in required_fields):
+    if not _ACTION_BASE_FIELDS.issubset(action):
         logger.error("Action missing required fields", action=action)
         return False
     
-    valid_actions = ['click', 'type', 'scroll', 'done']
-    if action['action'] not in valid_actions:
-        logger.error("Invalid action type", action_type=action['action'])
+    action_type = action['action']
+    value_fields = _ACTION_VALUE_FIELDS.get(action_type) if isinstance(action_type, str) else None
+    if value_fields is None:
+        logger.error("Invalid action type", action_type=action_type)
         return False
     
-    # Type action requires value
-    if action['action'] == 'type' and not action.get('value'):
-        logger.error("Type action missing value")
-        return False
-    
-    # Click action requires target
-    if action['action'] == 'click' and not action.get('target'):
-        logger.error("Click action missing target")
-        return False
+    # Click needs a target, type needs a value
+    for field in value_fields:
+        if not action.get(field):
+            logger.error("Action missing required field", action_type=action_type, field=field)
+            return False
     
     return True
 
@@ -279,14 +437,8 @@ def format_action_for_log(action: Dict[str, Any]) -> str:
     return msg
 
 
-def create_checkout_detection_prompt() -> str:
-    """
-    Create prompt for detecting checkout/purchase pages
-    
-    Returns:
-        Formatted prompt string
-    """
-    prompt = """You are analyzing a screenshot to determine if this is a checkout or order confirmation page.
+# Fixed checkout detection prompt, sent unchanged with every screenshot
+CHECKOUT_DETECTION_PROMPT = """You are analyzing a screenshot to determine if this is a checkout or order confirmation page.
 
 Look for these indicators:
 - "Place Order", "Complete Purchase", "Confirm Order" buttons
@@ -308,6 +460,14 @@ Return ONLY valid JSON:
 
 Be conservative: only return is_checkout=true if you're confident this is a checkout page.
 """
+
+
+def create_checkout_detection_prompt() -> str:
+    """
+    Create prompt for detecting checkout/purchase pages
     
-    return prompt
+    Returns:
+        Formatted prompt string
+    """
+    return CHECKOUT_DETECTION_PROMPT
 
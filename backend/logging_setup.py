@@ -0,0 +1,218 @@
+"""
+Logging configuration for SmartCart AI.
+structlog renders events straight to JSON bytes with orjson, bypassing the
+stdlib logging dispatch. Rendered lines are queued and written by a
+background thread through a 4KB buffer, so logging never blocks on stdout
+and bursts of lines cost one write call.
+"""
+import atexit
+import io
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, Tuple
+import orjson
+import structlog
+
+from config import Config
+
+# Bytes buffered by the writer thread before a write to stdout
+LOG_BUFFER_SIZE = 4096
+
+# Rendered log lines waiting to be written (None stops the writer)
+_log_queue: "queue.SimpleQueue[Optional[bytes]]" = queue.SimpleQueue()
+_writer: Optional[threading.Thread] = None
+_listener: Optional[QueueListener] = None
+
+# Whether DEBUG events are emitted (set by configure_logging)
+_debug_enabled = False
+
+
+def debug_enabled() -> bool:
+    """
+    Check if DEBUG events are emitted
+    
+    Filtered logger calls are already no-ops, but their arguments are still
+    evaluated; hot loops check this first to skip building them.
+    
+    Returns:
+        True if the configured level includes DEBUG
+    """
+    return _debug_enabled
+
+
+def _open_log_stream() -> io.BufferedWriter:
+    """
+    Open a buffered binary stream on stdout for the writer thread
+    
+    Returns:
+        BufferedWriter over the stdout file descriptor, or over
+        sys.stdout.buffer when stdout has no real descriptor
+    """
+    try:
+        raw = io.FileIO(sys.stdout.fileno(), "wb", closefd=False)
+    except (AttributeError, OSError, ValueError):
+        raw = sys.stdout.buffer
+    return io.BufferedWriter(raw, buffer_size=LOG_BUFFER_SIZE)
+
+
+def _write_logs(stream) -> None:
+    """Writer thread: drain the queue into the stream, flushing when idle"""
+    while True:
+        line = _log_queue.get()
+        if line is None:
+            stream.flush()
+            return
+        
+        stream.write(line)
+        if _log_queue.empty():
+            stream.flush()
+
+
+def _stop_writer() -> None:
+    """Write out whatever is still queued at interpreter exit"""
+    if _listener is not None:
+        _listener.stop()
+    _log_queue.put(None)
+    if _writer is not None:
+        _writer.join(timeout=2)
+
+
+class QueuedBytesLogger:
+    """structlog logger that hands rendered lines to the writer thread"""
+    
+    def msg(self, message: bytes) -> None:
+        _log_queue.put_nowait(message + b"\n")
+    
+    log = debug = info = warn = warning = msg
+    error = err = critical = fatal = exception = failure = msg
+
+
+class QueuedBytesLoggerFactory:
+    """Logger factory for QueuedBytesLogger (one shared instance)"""
+    
+    def __init__(self):
+        self._logger = QueuedBytesLogger()
+    
+    def __call__(self, *args: Any) -> QueuedBytesLogger:
+        return self._logger
+
+
+class _QueueStream:
+    """File-like object so stdlib handlers write through the same queue"""
+    
+    def write(self, text: str) -> None:
+        _log_queue.put_nowait(text.encode("utf-8"))
+    
+    def flush(self) -> None:
+        pass
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread"""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in-process, so the record can be passed as is
+        return record
+
+
+class DropRepeatedEvents:
+    """
+    structlog processor that drops an event identical to one logged recently
+    
+    Protects against log storms, e.g. the same warning from every attempt of
+    a retry loop. Must run before processors that add varying keys such as
+    the timestamp.
+    """
+    
+    def __init__(self, window: float = 1.0, max_keys: int = 1024):
+        """
+        Args:
+            window: Seconds during which an identical event is dropped
+            max_keys: Number of recent events tracked before pruning
+        """
+        self.window = window
+        self.max_keys = max_keys
+        self._last_seen: Dict[Tuple[str, str], float] = {}
+    
+    def __call__(self, logger: Any, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.monotonic()
+        key = (method_name, repr(event_dict))
+        
+        last = self._last_seen.get(key)
+        if last is not None and now - last < self.window:
+            raise structlog.DropEvent
+        
+        if len(self._last_seen) >= self.max_keys:
+            self._last_seen = {
+                k: t for k, t in self._last_seen.items() if now - t < self.window
+            }
+        self._last_seen[key] = now
+        
+        return event_dict
+
+
+def configure_logging(level: Optional[str] = None) -> None:
+    """
+    Configure structlog and stdlib logging
+    
+    structlog events get a level and UTC timestamp, are rendered to JSON
+    bytes with orjson and queued for the writer thread, which writes them
+    through a buffered stream and flushes whenever the queue runs dry. Identical events
+    within a second are dropped. Calls below the configured level return
+    immediately. Safe to call more than once.
+    
+    Args:
+        level: Log level name (default: Config.LOG_LEVEL)
+    """
+    global _writer, _listener, _debug_enabled
+    
+    if _writer is not None:
+        return
+    
+    log_level = logging.getLevelName((level or Config.LOG_LEVEL).upper())
+    if not isinstance(log_level, int):
+        log_level = logging.INFO
+    _debug_enabled = log_level <= logging.DEBUG
+    
+    _writer = threading.Thread(
+        target=_write_logs,
+        args=(_open_log_stream(),),
+        name="log-writer",
+        daemon=True
+    )
+    _writer.start()
+    atexit.register(_stop_writer)
+    
+    shared_processors = [
+        structlog.processors.add_log_level,
+        structlog.processors.TimeStamper(fmt="iso", utc=True)
+    ]
+    
+    # Stdlib records: formatted on the listener thread, written by the writer
+    handler = logging.StreamHandler(_QueueStream())
+    handler.setFormatter(structlog.stdlib.ProcessorFormatter(
+        processor=structlog.processors.JSONRenderer(),
+        foreign_pre_chain=shared_processors
+    ))
+    
+    record_queue = queue.SimpleQueue()
+    _listener = QueueListener(record_queue, handler)
+    _listener.start()
+    
+    root = logging.getLogger()
+    root.handlers = [_DeferredQueueHandler(record_queue)]
+    root.setLevel(log_level)
+    
+    # structlog events: orjson bytes, no stdlib dispatch
+    structlog.configure(
+        processors=[DropRepeatedEvents()] + shared_processors + [
+            structlog.processors.JSONRenderer(serializer=orjson.dumps)
+        ],
+        logger_factory=QueuedBytesLoggerFactory(),
+        wrapper_class=structlog.make_filtering_bound_logger(log_level),
+        cache_logger_on_first_use=True
+    )
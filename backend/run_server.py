@@ -1,14 +1,13 @@
 """
 Startup wrapper for SmartCart AI that ensures proper Windows event loop policy
 """
-import sys
 import asyncio
 
-# CRITICAL: Set Windows event loop policy BEFORE anything else
-if sys.platform == 'win32':
-    # Force ProactorEventLoop for subprocess support
-    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-    print("[STARTUP] Windows ProactorEventLoop policy set")
+from event_loop import install_loop_policy
+
+# CRITICAL: Set event loop policy BEFORE anything else (subprocess support)
+install_loop_policy()
+print(f"[STARTUP] Event loop policy: {type(asyncio.get_event_loop_policy()).__name__}")
 
 # Now import and run the app
 if __name__ == "__main__":
@@ -24,7 +23,7 @@ if __name__ == "__main__":
         host=Config.HOST,
         port=Config.PORT,
         reload=Config.DEBUG,
-        loop="asyncio"  # Force asyncio loop
+        loop="none"  # keep the policy set above
     )
 
 
@@ -3,12 +3,12 @@ Start SmartCart AI backend in production mode (no reload)
 This ensures the Windows event loop policy is properly set
 """
 import asyncio
-import sys
 
-# CRITICAL: Set Windows event loop policy BEFORE any imports
-if sys.platform == 'win32':
-    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-    print("[FIX] Windows ProactorEventLoop policy set")
+from event_loop import install_loop_policy
+
+# CRITICAL: Set event loop policy BEFORE any imports (subprocess support)
+install_loop_policy()
+print(f"[FIX] Event loop policy: {type(asyncio.get_event_loop_policy()).__name__}")
 
 import uvicorn
 from config import Config
@@ -17,13 +17,15 @@ if __name__ == "__main__":
     print(f"Starting backend on {Config.HOST}:{Config.PORT}")
     print(f"Debug mode: {Config.DEBUG}")
     print(f"Headless browser: {Config.HEADLESS}")
+    print(f"Workers: {Config.WORKERS}")
     
     uvicorn.run(
         "app:app",
         host=Config.HOST,
         port=Config.PORT,
         reload=False,  # No reload to avoid subprocess issues
-        loop="asyncio",
+        loop="none",  # keep the policy set above
+        workers=Config.WORKERS,  # each worker runs its own shared browser
         log_level="info"
     )
 
@@ -2,132 +2,118 @@
 Vision utilities for Set-of-Marks marker injection.
 Injects numbered labels on interactive elements for AI vision analysis.
 """
-from typing import Dict, List, Any, Optional
-from playwright.async_api import Page
+import asyncio
+import hashlib
+import json
+from typing import Dict, List, Any, Optional, Tuple
+from playwright.async_api import Page, BrowserContext
+import orjson
 import structlog
 from amazon_selectors import (
     is_amazon_url,
     detect_amazon_page_type,
-    enhance_element_with_amazon_selectors
+    apply_amazon_selectors
 )
 
 logger = structlog.get_logger()
 
 
-async def inject_markers(page: Page) -> Dict[int, Dict[str, Any]]:
-    """
-    Inject numbered markers on all interactive elements
+# Elements that get a marker, as one selector list
+INTERACTIVE_SELECTOR = (
+    'a[href], button, input:not([type="hidden"]), select, textarea, '
+    '[role="button"], [role="link"], [role="textbox"], [onclick], .btn, .button'
+)
+
+# Injects numbered labels on visible interactive elements and returns their
+# details keyed by marker number (argument: remove existing labels first).
+# INTERACTIVE_SELECTOR is baked in as a string literal, so calls send nothing
+# but the flag and the page parses the selector as part of the script
+MARKERS_SCRIPT = """
+(replace) => {
+    // Remove existing markers if any
+    if (replace) {
+        document.querySelectorAll('.ai-marker-label').forEach(el => el.remove());
+    }
     
-    This implements the "Set-of-Marks" visual prompting technique where
-    interactive elements are labeled with numbers that the AI can reference.
+    // Marker tags from a previous injection no longer match the new numbers
+    document.querySelectorAll('[data-ai-marker]').forEach(el => el.removeAttribute('data-ai-marker'));
     
-    Args:
-        page: Playwright page instance
+    const markers = {};
+    let markerNumber = 1;
     
-    Returns:
-        Dictionary mapping marker numbers to element information:
-        {
-            1: {
-                "type": "button",
-                "text": "Add to Cart",
-                "selector": "#add-to-cart-btn",
-                "selectors": ["#add-to-cart-btn", "button.add-cart"],
-                "aria_label": "Add to cart",
-                "position": {"x": 100, "y": 200}
-            },
-            ...
-        }
-    """
-    # Get current URL to check if it's Amazon
-    current_url = page.url
-    is_amazon = is_amazon_url(current_url)
+    // Find all interactive elements: one selector list, so a single walk of
+    // the DOM returns each element once and in document order (which sets
+    // the marker numbers)
+    const elements = document.querySelectorAll(INTERACTIVE_SELECTOR);
     
-    logger.info("Injecting markers on page", url=current_url, is_amazon=is_amazon)
+    // Viewport and scroll offsets don't change during the scan
+    const viewportHeight = window.innerHeight;
+    const viewportWidth = window.innerWidth;
+    const scrollTop = window.pageYOffset || document.documentElement.scrollTop;
+    const scrollLeft = window.pageXOffset || document.documentElement.scrollLeft;
     
-    # JavaScript to inject markers and extract element information
-    markers_script = """
-    () => {
-        // Remove existing markers if any
-        document.querySelectorAll('.ai-marker-label').forEach(el => el.remove());
+    // Labels and marker tags are written after the scan: writing to the
+    // DOM between layout reads would force a reflow for every element
+    const labels = document.createDocumentFragment();
+    const tagged = [];
+    
+    // Label styling is parsed once; each label is a shallow clone
+    const labelTemplate = document.createElement('div');
+    labelTemplate.className = 'ai-marker-label';
+    labelTemplate.style.cssText = `
+        position: absolute;
+        background: rgba(255, 0, 0, 0.8);
+        color: white;
+        font-weight: bold;
+        font-size: 12px;
+        padding: 2px 6px;
+        border-radius: 3px;
+        z-index: 999999;
+        pointer-events: none;
+        font-family: Arial, sans-serif;
+        line-height: 1;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.3);
+        border: 1px solid rgba(255, 255, 255, 0.3);
+    `;
+    
+    elements.forEach(element => {
+        // Skip if not visible
+        const rect = element.getBoundingClientRect();
+        if (
+            rect.width <= 0 ||
+            rect.height <= 0 ||
+            rect.top >= viewportHeight ||
+            rect.bottom <= 0 ||
+            rect.left >= viewportWidth ||
+            rect.right <= 0
+        ) return;
         
-        const markers = {};
-        let markerNumber = 1;
+        const style = window.getComputedStyle(element);
+        if (style.visibility === 'hidden' || style.display === 'none') return;
         
-        // Find all interactive elements
-        const selectors = [
-            'a[href]',
-            'button',
-            'input:not([type="hidden"])',
-            'select',
-            'textarea',
-            '[role="button"]',
-            '[role="link"]',
-            '[role="textbox"]',
-            '[onclick]',
-            '.btn',
-            '.button'
-        ];
+        // Create marker label
+        const label = labelTemplate.cloneNode(false);
+        label.textContent = markerNumber;
         
-        const elements = document.querySelectorAll(selectors.join(', '));
-        const processedElements = new Set();
+        // Position at top-left of element
+        label.style.top = (rect.top + scrollTop) + 'px';
+        label.style.left = (rect.left + scrollLeft) + 'px';
         
-        elements.forEach(element => {
-            // Skip if already processed or not visible
-            if (processedElements.has(element)) return;
-            
-            const rect = element.getBoundingClientRect();
-            const isVisible = (
-                rect.width > 0 &&
-                rect.height > 0 &&
-                rect.top < window.innerHeight &&
-                rect.bottom > 0 &&
-                rect.left < window.innerWidth &&
-                rect.right > 0 &&
-                window.getComputedStyle(element).visibility !== 'hidden' &&
-                window.getComputedStyle(element).display !== 'none'
-            );
-            
-            if (!isVisible) return;
-            
-            processedElements.add(element);
-            
-            // Create marker label
-            const label = document.createElement('div');
-            label.className = 'ai-marker-label';
-            label.textContent = markerNumber;
-            label.style.cssText = `
-                position: absolute;
-                background: rgba(255, 0, 0, 0.8);
-                color: white;
-                font-weight: bold;
-                font-size: 12px;
-                padding: 2px 6px;
-                border-radius: 3px;
-                z-index: 999999;
-                pointer-events: none;
-                font-family: Arial, sans-serif;
-                line-height: 1;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.3);
-                border: 1px solid rgba(255, 255, 255, 0.3);
-            `;
-            
-            // Position at top-left of element
-            const scrollTop = window.pageYOffset || document.documentElement.scrollTop;
-            const scrollLeft = window.pageXOffset || document.documentElement.scrollLeft;
-            
-            label.style.top = (rect.top + scrollTop) + 'px';
-            label.style.left = (rect.left + scrollLeft) + 'px';
-            
-            document.body.appendChild(label);
-            
-            // Generate multiple selectors for robustness
-            const selectors = [];
-            
-            // Priority 1: ID selector (most stable)
-            if (element.id) {
-                selectors.push('#' + element.id);
-            }
-            
+        labels.appendChild(label);
+        
+        // Tag the element so it can be found by marker number without a search
+        tagged.push([element, markerNumber]);
+        
+        // Generate multiple selectors for robustness
+        const selectors = [];
+        
+        // Priority 1: ID selector (most stable). A plain identifier id is
+        // precise enough on its own, so the fallbacks are only built without one
+        if (element.id) {
+            selectors.push('#' + element.id);
+        }
+        
+        if (!/^[A-Za-z][\w-]*$/.test(element.id)) {
             // Priority 2: Name attribute (common in forms)
             if (element.name) {
                 selectors.push(`${element.tagName.toLowerCase()}[name="${element.name}"]`);
@@ -135,7 +121,7 @@ async def inject_markers(page: Page) -> Dict[int, Dict[str, Any]]:
             
             // Priority 3: Data attributes (stable)
             for (const attr of element.attributes) {
-                if (attr.name.startsWith('data-')) {
+                if (attr.name.startsWith('data-') && attr.name !== 'data-ai-marker') {
                     selectors.push(`${element.tagName.toLowerCase()}[${attr.name}="${attr.value}"]`);
                     break; // Just use the first data attribute
                 }
@@ -163,52 +149,140 @@ async def inject_markers(page: Page) -> Dict[int, Dict[str, Any]]:
             }
             
             // Priority 7: nth-child fallback
-            const parent = element.parentElement;
-            if (parent) {
-                const index = Array.from(parent.children).indexOf(element) + 1;
+            if (element.parentElement) {
+                let index = 1;
+                for (let sibling = element.previousElementSibling; sibling; sibling = sibling.previousElementSibling) {
+                    index++;
+                }
                 selectors.push(`${element.tagName.toLowerCase()}:nth-child(${index})`);
             }
-            
-            // Use the first available selector as primary
-            const selector = selectors[0] || element.tagName.toLowerCase();
-            
-            // Extract element information
-            markers[markerNumber] = {
-                type: element.tagName.toLowerCase(),
-                text: element.innerText?.trim().substring(0, 100) || element.value || '',
-                selector: selector,
-                selectors: selectors, // Store all selectors for fallback
-                aria_label: element.getAttribute('aria-label') || '',
-                placeholder: element.getAttribute('placeholder') || '',
-                href: element.getAttribute('href') || '',
-                name: element.getAttribute('name') || '',
-                input_type: element.getAttribute('type') || '',
-                position: {
-                    x: Math.round(rect.left + scrollLeft),
-                    y: Math.round(rect.top + scrollTop)
-                }
-            };
-            
-            markerNumber++;
-        });
+        }
         
-        return markers;
+        // Extract element information (selector and marker_selector follow
+        // from these and are filled in by inject_markers, not sent back). textContent skips innerText's
+        // rendered-text layout walk; whitespace is collapsed on a bounded
+        // prefix, since only the first 100 characters are kept
+        const text = (element.textContent || '').substring(0, 500).replace(/\s+/g, ' ').trim();
+        markers[markerNumber] = {
+            type: element.tagName.toLowerCase(),
+            text: text.substring(0, 100) || element.value || '',
+            selectors: selectors, // Store all selectors for fallback
+            aria_label: element.getAttribute('aria-label') || '',
+            placeholder: element.getAttribute('placeholder') || '',
+            href: element.getAttribute('href') || '',
+            name: element.getAttribute('name') || '',
+            input_type: element.getAttribute('type') || '',
+            position: {
+                x: Math.round(rect.left + scrollLeft),
+                y: Math.round(rect.top + scrollTop)
+            }
+        };
+        
+        markerNumber++;
+    });
+    
+    for (const [element, number] of tagged) {
+        element.setAttribute('data-ai-marker', number);
     }
+    document.body.appendChild(labels);
+    
+    return markers;
+}
+""".replace("INTERACTIVE_SELECTOR", json.dumps(INTERACTIVE_SELECTOR))
+
+# Defines MARKERS_SCRIPT as a page function in every document of a context,
+# so each injection sends a short call instead of the whole script
+# The page function returns the markers as a JSON string: one string crosses
+# the protocol instead of a nested object graph, and orjson decodes it
+MARKERS_INIT_SCRIPT = (
+    "window.__smartcartInjectMarkers = (() => {"
+    " const stringify = JSON.stringify;"  # captured before page scripts run
+    " const inject = " + MARKERS_SCRIPT + ";"
+    " return replace => stringify(inject(replace)); })();"
+)
+
+# MARKERS_SCRIPT with the same JSON string result, for pages without the
+# registered function
+MARKERS_JSON_SCRIPT = "(replace) => JSON.stringify((" + MARKERS_SCRIPT + ")(replace))"
+
+# Calls the registered function; null if the page predates the registration
+MARKERS_CALL_SCRIPT = """
+(replace) => typeof window.__smartcartInjectMarkers === 'function'
+    ? window.__smartcartInjectMarkers(replace)
+    : null
+"""
+
+
+async def register_page_scripts(context: BrowserContext) -> None:
     """
+    Register the marker script with a browser context
+    
+    Pages of the context then define it on every navigation, and
+    inject_markers only has to call it by name.
+    
+    Args:
+        context: Browser context to register with
+    """
+    await context.add_init_script(script=MARKERS_INIT_SCRIPT)
+
+
+async def inject_markers(page: Page, replace: bool = True) -> Dict[int, Dict[str, Any]]:
+    """
+    Inject numbered markers on all interactive elements
+    
+    This implements the "Set-of-Marks" visual prompting technique where
+    interactive elements are labeled with numbers that the AI can reference.
+    
+    Args:
+        page: Playwright page instance
+        replace: Remove existing markers first, in the same evaluate call
+            (no separate remove_markers round-trip needed)
+    
+    Returns:
+        Dictionary mapping marker numbers to element information:
+        {
+            1: {
+                "type": "button",
+                "text": "Add to Cart",
+                "selector": "#add-to-cart-btn",
+                "selectors": ["#add-to-cart-btn", "button.add-cart"],
+                "marker_selector": '[data-ai-marker="1"]',
+                "aria_label": "Add to cart",
+                "position": {"x": 100, "y": 200}
+            },
+            ...
+        }
+    """
+    # Get current URL to check if it's Amazon
+    current_url = page.url
+    is_amazon = is_amazon_url(current_url)
+    
+    logger.debug("Injecting markers on page", url=current_url, is_amazon=is_amazon)
     
     try:
-        # Execute script and get markers mapping
-        markers_map = await page.evaluate(markers_script)
+        # Execute script and get markers mapping (the full script only for
+        # pages without the registered function)
+        markers_json = await page.evaluate(MARKERS_CALL_SCRIPT, replace)
+        if markers_json is None:
+            markers_json = await page.evaluate(MARKERS_JSON_SCRIPT, replace)
+        markers_map = orjson.loads(markers_json)
         
-        # Enhance markers with Amazon-specific selectors if on Amazon
-        if is_amazon:
-            enhanced_markers = {}
-            for marker_num, element_info in markers_map.items():
-                enhanced_info = enhance_element_with_amazon_selectors(element_info, current_url)
-                enhanced_markers[int(marker_num)] = enhanced_info
-            markers_map = enhanced_markers
+        # JSON object keys come back as strings; marker numbers are ints
+        markers_map = {int(marker_num): info for marker_num, info in markers_map.items()}
         
-        logger.info("Markers injected successfully", count=len(markers_map), is_amazon=is_amazon)
+        for marker_num, element_info in markers_map.items():
+            # Derived fields the script leaves out of its payload: the first
+            # selector (or the tag) as primary, and the marker tag selector
+            selectors = element_info['selectors']
+            element_info['selector'] = selectors[0] if selectors else element_info['type']
+            element_info['marker_selector'] = f'[data-ai-marker="{marker_num}"]'
+            
+            # Enhance markers with Amazon-specific selectors if on Amazon (the
+            # dictionaries are fresh from the page, so they are updated in place)
+            if is_amazon:
+                apply_amazon_selectors(element_info)
+        
+        logger.debug("Markers injected successfully", count=len(markers_map), is_amazon=is_amazon)
         
         return markers_map
         
@@ -217,6 +291,128 @@ async def inject_markers(page: Page) -> Dict[int, Dict[str, Any]]:
         return {}
 
 
+async def inject_markers_many(pages: List[Page], replace: bool = True) -> List[Dict[int, Dict[str, Any]]]:
+    """
+    Inject markers on several pages (tabs) concurrently
+    
+    Each page evaluates in its own renderer, so the injections overlap
+    instead of running back to back. Use this rather than awaiting
+    inject_markers in a loop when working with more than one page.
+    
+    Args:
+        pages: Playwright pages to mark
+        replace: Remove existing markers first (see inject_markers)
+    
+    Returns:
+        Markers map per page, in the order of pages (empty for a page
+        where injection failed)
+    """
+    return list(await asyncio.gather(*(inject_markers(page, replace) for page in pages)))
+
+
+PAGE_SIGNATURE_SCRIPT = """
+() => {
+    // Count DOM mutations, ignoring our own marker labels and tags, so that
+    // changes that keep the element count (class toggles, text swaps) still show up
+    if (window.__smartcartMutations === undefined) {
+        window.__smartcartMutations = 0;
+        const isMarker = node => node.nodeType === 1 && node.classList.contains('ai-marker-label');
+        new MutationObserver(records => {
+            for (const record of records) {
+                if (record.type === 'childList' &&
+                    [...record.addedNodes, ...record.removedNodes].every(isMarker)) {
+                    continue;
+                }
+                if (record.type === 'attributes' && record.attributeName === 'data-ai-marker') {
+                    continue;
+                }
+                window.__smartcartMutations++;
+            }
+        }).observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    }
+    
+    // Element count and text length without our marker labels, so the
+    // signature is the same before and after marker injection
+    const markerLabels = document.querySelectorAll('.ai-marker-label');
+    let labelText = 0;
+    for (const label of markerLabels) {
+        labelText += label.textContent.length;
+    }
+    
+    let formState = '';
+    for (const el of document.querySelectorAll('input, textarea, select')) {
+        formState += (el.value || '').length + (el.checked ? '+' : '-');
+    }
+    
+    return {
+        url: location.href,
+        signature: [
+            location.href,
+            window.scrollX, window.scrollY,
+            window.innerWidth, window.innerHeight,
+            document.getElementsByTagName('*').length - markerLabels.length,
+            document.body ? document.body.textContent.length - labelText : 0,
+            window.__smartcartMutations,
+            formState
+        ].join('|')
+    };
+}
+"""
+
+
+async def get_page_signature(page: Page) -> Dict[str, str]:
+    """
+    Get a cheap signature of what the page currently shows
+    
+    The signature changes when the URL, scroll position, viewport, DOM
+    structure, text or form values change, so two equal signatures mean
+    a new screenshot would look the same.
+    
+    Args:
+        page: Playwright page instance
+    
+    Returns:
+        Dict with "url" and "signature" strings
+    """
+    return await page.evaluate(PAGE_SIGNATURE_SCRIPT)
+
+
+# True once the page signature differs from the one passed in
+SIGNATURE_CHANGED_SCRIPT = "(before) => (" + PAGE_SIGNATURE_SCRIPT + ")().signature !== before"
+
+
+async def wait_for_page_change(page: Page, before: str, timeout: int = 2000) -> bool:
+    """
+    Wait for the page to react to an action (click, Enter)
+    
+    Waits until the page signature differs from the one taken before the
+    action: a navigation, a DOM update or a scroll. If that was a
+    navigation, it then waits for the new document's DOM. Right after an
+    action the old document still counts as loaded, so a plain
+    wait_for_load_state would return before anything happened.
+    
+    Args:
+        page: Playwright page instance
+        before: Signature from get_page_signature taken before the action
+        timeout: Milliseconds to wait for a change (and for the new DOM)
+    
+    Returns:
+        True if the page changed within the timeout
+    """
+    try:
+        await page.wait_for_function(SIGNATURE_CHANGED_SCRIPT, arg=before, polling=100, timeout=timeout)
+        changed = True
+    except Exception:
+        changed = False
+    
+    try:
+        await page.wait_for_load_state("domcontentloaded", timeout=timeout)
+    except Exception:
+        pass
+    
+    return changed
+
+
 async def remove_markers(page: Page) -> None:
     """
     Remove all injected markers from the page
@@ -235,6 +431,55 @@ async def remove_markers(page: Page) -> None:
         logger.error("Failed to remove markers", error=str(e))
 
 
+def get_marker_selector(markers_map: Dict[int, Dict], marker_number: int) -> Optional[str]:
+    """
+    Get the selector of the element tagged with a marker number at injection time
+    
+    This is a plain dictionary lookup (no page round-trip). The tag is gone if
+    the page re-rendered the element, so callers fall back to
+    get_element_by_marker when the selector no longer matches.
+    
+    Args:
+        markers_map: Mapping of marker numbers to element info
+        marker_number: The marker number to look up
+    
+    Returns:
+        CSS selector for the tagged element, or None if not available
+    """
+    return markers_map.get(marker_number, {}).get("marker_selector")
+
+
+# Index of the first selector whose element is visible (non-empty box, not
+# visibility:hidden) and enabled, or -1; "//" and "(" selectors are XPath
+FIRST_USABLE_SELECTOR_SCRIPT = """
+(selectors) => {
+    for (let i = 0; i < selectors.length; i++) {
+        const selector = selectors[i];
+        let element;
+        try {
+            element = selector.startsWith('/') || selector.startsWith('(')
+                ? document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+                : document.querySelector(selector);
+        } catch (e) {
+            continue;
+        }
+        if (!element || !element.getBoundingClientRect) continue;
+        
+        const rect = element.getBoundingClientRect();
+        if (rect.width === 0 || rect.height === 0) continue;
+        if (window.getComputedStyle(element).visibility === 'hidden') continue;
+        if (element.matches(':disabled')) continue;
+        
+        return i;
+    }
+    return -1;
+}
+"""
+
+# Truthy (index + 1) once one of the selectors is usable, for wait_for_function
+WAIT_FOR_USABLE_SELECTOR_SCRIPT = "(selectors) => (" + FIRST_USABLE_SELECTOR_SCRIPT + ")(selectors) + 1"
+
+
 async def get_element_by_marker(page: Page, markers_map: Dict[int, Dict], marker_number: int) -> Optional[str]:
     """
     Get the selector for an element by its marker number with retry logic
@@ -247,8 +492,6 @@ async def get_element_by_marker(page: Page, markers_map: Dict[int, Dict], marker
     Returns:
         CSS selector for the element, or None if not found
     """
-    import asyncio
-    
     if marker_number not in markers_map:
         logger.warning("Marker number not found", marker=marker_number)
         return None
@@ -268,40 +511,25 @@ async def get_element_by_marker(page: Page, markers_map: Dict[int, Dict], marker
         logger.warning("No selectors available for marker", marker=marker_number)
         return None
     
-    logger.info("Trying selectors for marker", 
-               marker=marker_number,
-               selector_count=len(selectors))
+    logger.debug("Trying selectors for marker", 
+                marker=marker_number,
+                selector_count=len(selectors))
     
-    # Try each selector with timeout
-    for i, selector in enumerate(selectors):
-        try:
-            logger.debug(f"Trying selector {i+1}/{len(selectors)}", selector=selector)
-            
-            # Wait for element to be present and visible (max 3 seconds)
-            await page.wait_for_selector(selector, state="visible", timeout=3000)
-            
-            # Verify element is actually visible and interactable
-            element = await page.query_selector(selector)
-            if element:
-                is_visible = await element.is_visible()
-                is_enabled = await element.is_enabled()
-                
-                if is_visible and is_enabled:
-                    logger.info("Found element with selector", 
-                              marker=marker_number,
-                              selector=selector,
-                              attempt=i+1)
-                    return selector
-                else:
-                    logger.debug("Element found but not interactable",
-                               selector=selector,
-                               visible=is_visible,
-                               enabled=is_enabled)
-            
-        except Exception as e:
-            logger.debug(f"Selector {i+1} failed", selector=selector, error=str(e))
-            # Try next selector
-            continue
+    # One wait for whichever selector becomes usable first: the check runs
+    # immediately (usually enough) and is then repeated each frame, so the
+    # wait is bounded by 3 seconds in total rather than per selector
+    try:
+        handle = await page.wait_for_function(
+            WAIT_FOR_USABLE_SELECTOR_SCRIPT, arg=selectors, polling="raf", timeout=3000
+        )
+        index = await handle.json_value() - 1
+        logger.debug("Found element with selector",
+                    marker=marker_number,
+                    selector=selectors[index],
+                    attempt=index + 1)
+        return selectors[index]
+    except Exception as e:
+        logger.debug("No usable selector for marker", marker=marker_number, error=str(e))
     
     # If all selectors failed, try one more time with the first selector and force it
     logger.warning("All selectors failed, trying first selector without visibility check",
@@ -310,7 +538,7 @@ async def get_element_by_marker(page: Page, markers_map: Dict[int, Dict], marker
         first_selector = selectors[0]
         element = await page.query_selector(first_selector)
         if element:
-            logger.info("Found element without strict checks", selector=first_selector)
+            logger.debug("Found element without strict checks", selector=first_selector)
             return first_selector
     except Exception as e:
         logger.error("Final fallback failed", error=str(e))
@@ -321,6 +549,38 @@ async def get_element_by_marker(page: Page, markers_map: Dict[int, Dict], marker
     return None
 
 
+# Outlines an element for a moment; called with [selector, duration]
+HIGHLIGHT_SCRIPT = """
+([selector, duration]) => {
+    const element = document.querySelector(selector);
+    if (!element) return;
+    
+    const highlight = document.createElement('div');
+    highlight.style.cssText = `
+        position: absolute;
+        border: 3px solid #00ff00;
+        background: rgba(0, 255, 0, 0.1);
+        pointer-events: none;
+        z-index: 999998;
+        box-shadow: 0 0 10px rgba(0, 255, 0, 0.5);
+    `;
+    
+    const rect = element.getBoundingClientRect();
+    const scrollTop = window.pageYOffset || document.documentElement.scrollTop;
+    const scrollLeft = window.pageXOffset || document.documentElement.scrollLeft;
+    
+    highlight.style.top = (rect.top + scrollTop) + 'px';
+    highlight.style.left = (rect.left + scrollLeft) + 'px';
+    highlight.style.width = rect.width + 'px';
+    highlight.style.height = rect.height + 'px';
+    
+    document.body.appendChild(highlight);
+    
+    setTimeout(() => highlight.remove(), duration);
+}
+"""
+
+
 async def highlight_element(page: Page, selector: str, duration: int = 2000) -> None:
     """
     Temporarily highlight an element on the page
@@ -330,76 +590,85 @@ async def highlight_element(page: Page, selector: str, duration: int = 2000) ->
         selector: CSS selector for element
         duration: How long to show highlight in milliseconds
     """
-    highlight_script = f"""
-    (selector, duration) => {{
-        const element = document.querySelector(selector);
-        if (!element) return;
-        
-        const highlight = document.createElement('div');
-        highlight.style.cssText = `
-            position: absolute;
-            border: 3px solid #00ff00;
-            background: rgba(0, 255, 0, 0.1);
-            pointer-events: none;
-            z-index: 999998;
-            box-shadow: 0 0 10px rgba(0, 255, 0, 0.5);
-        `;
-        
-        const rect = element.getBoundingClientRect();
-        const scrollTop = window.pageYOffset || document.documentElement.scrollTop;
-        const scrollLeft = window.pageXOffset || document.documentElement.scrollLeft;
-        
-        highlight.style.top = (rect.top + scrollTop) + 'px';
-        highlight.style.left = (rect.left + scrollLeft) + 'px';
-        highlight.style.width = rect.width + 'px';
-        highlight.style.height = rect.height + 'px';
-        
-        document.body.appendChild(highlight);
-        
-        setTimeout(() => highlight.remove(), duration);
-    }}
-    """
-    
     try:
-        await page.evaluate(f"({highlight_script})('{selector}', {duration})")
+        await page.evaluate(HIGHLIGHT_SCRIPT, [selector, duration])
     except Exception as e:
         logger.error("Failed to highlight element", selector=selector, error=str(e))
 
 
+def markers_fingerprint(markers_map: Dict[int, Dict]) -> str:
+    """
+    Fingerprint the marked elements of a page
+    
+    Built from the marker count and each element's type and label, so it
+    stays the same while the page keeps the same interactive structure
+    (ads or prices changing elsewhere do not matter) and computing it needs
+    no page round-trip.
+    
+    Args:
+        markers_map: Dictionary of markers from inject_markers
+    
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.blake2b(str(len(markers_map)).encode(), digest_size=16)
+    for marker_num in sorted(markers_map):
+        info = markers_map[marker_num]
+        label = info.get('aria_label') or (info.get('text') or '')[:16]
+        digest.update(f"|{info.get('type', '')}:{label}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _format_marker(number: int, info: Dict[str, Any]) -> str:
+    """One line of format_markers_for_prompt: number, type, label and link"""
+    line = f"[{number}] {info.get('type', 'unknown').upper()}"
+    
+    text = info.get('text', '')[:50]  # Limit text length
+    if text:
+        line += f' "{text}"'
+    elif info.get('aria_label'):
+        line += f' (aria: "{info["aria_label"]}")'
+    elif info.get('placeholder'):
+        line += f' (placeholder: "{info["placeholder"]}")'
+    
+    href = info.get('href')
+    if href:
+        line += f" → {href[:30]}"
+    
+    return line
+
+
+# Last formatted markers map (kept referenced so its id stays unique), its
+# size and the formatted text
+_last_formatted: Optional[Tuple[Dict[int, Dict], int, str]] = None
+
+
 def format_markers_for_prompt(markers_map: Dict[int, Dict]) -> str:
     """
     Format markers map into a readable string for LLM prompt
     
+    The text for the most recent map is reused while that same map object
+    is passed again unchanged in size.
+    
     Args:
         markers_map: Mapping of marker numbers to element info
     
     Returns:
         Formatted string describing all markers
     """
+    global _last_formatted
+    
     if not markers_map:
         return "No interactive elements found on the page."
     
-    lines = []
-    for number, info in sorted(markers_map.items()):
-        element_type = info.get('type', 'unknown')
-        text = info.get('text', '')[:50]  # Limit text length
-        aria_label = info.get('aria_label', '')
-        placeholder = info.get('placeholder', '')
-        
-        description_parts = [f"[{number}]", element_type.upper()]
-        
-        if text:
-            description_parts.append(f'"{text}"')
-        elif aria_label:
-            description_parts.append(f'(aria: "{aria_label}")')
-        elif placeholder:
-            description_parts.append(f'(placeholder: "{placeholder}")')
-        
-        if info.get('href'):
-            description_parts.append(f"→ {info['href'][:30]}")
-        
-        lines.append(' '.join(description_parts))
+    if (_last_formatted is not None and _last_formatted[0] is markers_map
+            and _last_formatted[1] == len(markers_map)):
+        return _last_formatted[2]
     
-    return '\n'.join(lines)
+    formatted = '\n'.join(
+        _format_marker(number, info) for number, info in sorted(markers_map.items())
+    )
+    _last_formatted = (markers_map, len(markers_map), formatted)
+    return formatted
 
 
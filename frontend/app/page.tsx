@@ -26,6 +26,8 @@ export default function Home() {
   const [isRunning, setIsRunning] = useState(false)
   const [ws, setWs] = useState<WebSocket | null>(null)
   const messagesEndRef = useRef<HTMLDivElement>(null)
+  // Object URL of the current screenshot (revoked when the next one arrives)
+  const screenshotUrlRef = useRef<string | null>(null)
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
@@ -48,10 +50,7 @@ export default function Home() {
       addMessage('system', '🔗 Connected to agent')
     }
 
-    websocket.onmessage = (event) => {
-      const data = JSON.parse(event.data)
-      console.log('Received:', data)
-
+    const handleUpdate = (data: any) => {
       switch (data.type) {
         case 'started':
           addMessage('system', `🚀 Mission started: ${data.goal}`)
@@ -65,24 +64,26 @@ export default function Home() {
           }
           break
 
-        case 'state_update':
-          // Update agent state
-          setAgentState({
-            status: data.status || 'unknown',
-            iteration: data.iteration || 0,
-            url: data.url || '',
-            screenshot: data.screenshot || ''
-          })
-
-          // Add messages
-          if (data.messages && Array.isArray(data.messages)) {
-            data.messages.forEach((msg: string) => {
+        case 'state_delta': {
+          // Merge changed fields into agent state (unchanged ones are not resent)
+          const delta = data.delta || {}
+          setAgentState(prev => ({
+            status: delta.status ?? prev?.status ?? 'unknown',
+            iteration: delta.iteration ?? prev?.iteration ?? 0,
+            url: delta.url ?? prev?.url ?? '',
+            screenshot: prev?.screenshot ?? ''
+          }))
+
+          // Add new messages
+          if (delta.messages && Array.isArray(delta.messages)) {
+            delta.messages.forEach((msg: string) => {
               if (msg && msg.trim()) {
                 addMessage('agent', msg)
               }
             })
           }
           break
+        }
 
         case 'complete':
           addMessage('system', '✅ Mission complete!')
@@ -101,6 +102,31 @@ export default function Home() {
       }
     }
 
+    websocket.onmessage = (event) => {
+      // Binary frames are raw JPEG screenshots following their state_delta
+      if (event.data instanceof Blob) {
+        const frameUrl = URL.createObjectURL(new Blob([event.data], { type: 'image/jpeg' }))
+        if (screenshotUrlRef.current) {
+          URL.revokeObjectURL(screenshotUrlRef.current)
+        }
+        screenshotUrlRef.current = frameUrl
+        setAgentState(prev => ({
+          status: prev?.status ?? 'unknown',
+          iteration: prev?.iteration ?? 0,
+          url: prev?.url ?? '',
+          screenshot: frameUrl
+        }))
+        return
+      }
+
+      const parsed = JSON.parse(event.data)
+      console.log('Received:', parsed)
+
+      // Updates produced close together arrive batched as an array
+      const updates = Array.isArray(parsed) ? parsed : [parsed]
+      updates.forEach(handleUpdate)
+    }
+
     websocket.onerror = (error) => {
       console.error('WebSocket error:', error)
       addMessage('system', '❌ Connection error')
@@ -296,7 +322,7 @@ export default function Home() {
             <div className="flex-1 overflow-hidden flex items-center justify-center bg-gray-900">
               {agentState?.screenshot ? (
                 <img
-                  src={`data:image/png;base64,${agentState.screenshot}`}
+                  src={agentState.screenshot}
                   alt="Current page"
                   className="max-w-full max-h-full object-contain"
                 />